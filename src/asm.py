@@ -1,3 +1,4 @@
+from collections.abc import Callable
 from dataclasses import dataclass
 from enum import Enum, auto
 
@@ -5,12 +6,12 @@ import tacky
 from utility import Identifier
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Pseudo():
     identifier: Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Imm():
     val: int
 
@@ -30,12 +31,12 @@ class Size(Enum):
     Q = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Register():
     reg: Register_Enum
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Stack():
     val: int
 
@@ -43,19 +44,19 @@ class Stack():
 Operand = Imm | Register | Pseudo | Stack
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Ret():
     pass
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Mov():
     size: Size
     src: Operand
     dst: Operand
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Allocate_Stack():
     offset: int
 
@@ -76,14 +77,14 @@ class Bin_Op(Enum):
     XOR = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Unary:
     unary_operator: Unary_Operator
     size: Size
     operand: Operand
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Binary:
     binary_operator: Bin_Op
     size: Size
@@ -91,25 +92,25 @@ class Binary:
     right: Operand
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Cmp:
     size: Size
     left: Operand
     right: Operand
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Idiv:
     size: Size
     operand: Operand
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Cdq:
     pass
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Jmp:
     identifier: Identifier
 
@@ -123,19 +124,19 @@ class Cond_Code(Enum):
     LE = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class JmpCC:
     cond_code: Cond_Code
     identifier: Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SetCC:
     cond_code: Cond_Code
     operand: Operand
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Label:
     identifier: Identifier
 
@@ -154,13 +155,13 @@ Instruction = (Mov
                | Label)
 
 
-@dataclass
+@dataclass(slots=True)
 class Function():
     name: str
     instructions: list[Instruction]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Program():
     function_definition: Function
 
@@ -225,14 +226,20 @@ def convert_tacky_relational(node: tacky.Bin_Op) -> Cond_Code:
             raise RuntimeError(f'Unhandled relational operator {node}')
 
 
-def convert_tacky_instr(node: tacky.Instruction) -> tuple[Instruction, ...]:
+def convert_tacky_instr(
+        node: tacky.Instruction,
+        convert_val: Callable[[tacky.Val], Operand] = convert_tacky_val
+) -> tuple[Instruction, ...]:
+    """Converts one TACKY instruction, convert_val decides what
+       the operands become
+    """
     match node:
         case tacky.Return(val):
-            src = convert_tacky_val(val)
+            src = convert_val(val)
             return (Mov(Size.L, src, Register(Register_Enum.AX)), Ret())
         case tacky.Unary(operator, src, dst):
-            asm_src = convert_tacky_val(src)
-            asm_dst = convert_tacky_val(dst)
+            asm_src = convert_val(src)
+            asm_dst = convert_val(dst)
             match operator:
                 case tacky.Unary_Operator.NOT:
                     return (Cmp(Size.L, Imm(0), asm_src),
@@ -243,9 +250,9 @@ def convert_tacky_instr(node: tacky.Instruction) -> tuple[Instruction, ...]:
                     return (Mov(Size.L, asm_src, asm_dst),
                             Unary(asm_op, Size.L, asm_dst))
         case tacky.Binary(operator, src1, src2, dst):
-            asm_src1 = convert_tacky_val(src1)
-            asm_src2 = convert_tacky_val(src2)
-            asm_dst = convert_tacky_val(dst)
+            asm_src1 = convert_val(src1)
+            asm_src2 = convert_val(src2)
+            asm_dst = convert_val(dst)
             match operator:
                 case tacky.Bin_Op.DIVIDE:
                     return (Mov(Size.L, asm_src1, Register(Register_Enum.AX)),
@@ -274,16 +281,16 @@ def convert_tacky_instr(node: tacky.Instruction) -> tuple[Instruction, ...]:
         case tacky.Jump(target):
             return (Jmp(target),)
         case tacky.JumpIfZero(condtion, target):
-            asm_condition = convert_tacky_val(condtion)
+            asm_condition = convert_val(condtion)
             return ((Cmp(Size.L, Imm(0), asm_condition)),
                     JmpCC(Cond_Code.E, target))
         case tacky.JumpIfNotZero(condition, target):
-            asm_condition = convert_tacky_val(condition)
+            asm_condition = convert_val(condition)
             return ((Cmp(Size.L, Imm(0), asm_condition)),
                     JmpCC(Cond_Code.NE, target))
         case tacky.Copy(src, dst):
-            asm_src = convert_tacky_val(src)
-            asm_dst = convert_tacky_val(dst)
+            asm_src = convert_val(src)
+            asm_dst = convert_val(dst)
             return (Mov(Size.L, asm_src, asm_dst),)
         case tacky.Label(identifier):
             return (Label(identifier),)
@@ -367,76 +374,118 @@ def replace_psuedo(func: Function) -> int:
 def instruction_fixup(func: Function, alloc_count: int) -> None:
     """Mov can't have mem address as both src and dst"""
     modified_instr: list[Instruction] = [Allocate_Stack(alloc_count)]
-
     for instr in func.instructions:
-        match instr:
-            case Mov(size, Stack(a), Stack(b)):
-                # Currently using %R10 as a scratch register
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(Mov(size, scratch, Stack(b)))
-            case Binary(Bin_Op.ADD, size, Stack(a), Stack(b)):
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(
-                    Binary(Bin_Op.ADD, size, scratch, Stack(b)))
-            case Binary(Bin_Op.SUB, size, Stack(a), Stack(b)):
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(
-                    Binary(Bin_Op.SUB, size, scratch, Stack(b)))
-            case Binary(Bin_Op.MULT, size, src, Stack(a)):
-                # imul can't use a memory address as a dst
-                scratch = Register(Register_Enum.R11)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(Binary(Bin_Op.MULT, size, src, scratch))
-                modified_instr.append(Mov(size, scratch, Stack(a)))
-            case Binary(Bin_Op.AND, size, Stack(a), Stack(b)):
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(
-                    Binary(Bin_Op.AND, size, scratch, Stack(b)))
-            case Binary(Bin_Op.OR, size, Stack(a), Stack(b)):
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(
-                    Binary(Bin_Op.OR, size, scratch, Stack(b)))
-            case Binary(Bin_Op.XOR, size, Stack(a), Stack(b)):
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Stack(a), scratch))
-                modified_instr.append(
-                    Binary(Bin_Op.XOR, size, scratch, Stack(b)))
-            case Binary(Bin_Op.RIGHT_SHIFT, size, Stack() as op1, op2):
-                scratch = Register(Register_Enum.CX)
-                cl = Register(Register_Enum.CX)
-                modified_instr.extend(
-                    (Mov(size, op1, scratch),
-                     Binary(Bin_Op.RIGHT_SHIFT, size, cl, op2)))
-            case Binary(Bin_Op.LEFT_SHIFT, size, Stack() as op1, op2):
-                scratch = Register(Register_Enum.CX)
-                cl = Register(Register_Enum.CX)
-                modified_instr.extend(
-                    (Mov(size, op1, scratch),
-                     Binary(Bin_Op.LEFT_SHIFT, size, cl, op2)))
-            case Cmp(size, Stack() as left, Stack() as right):
-                scratch = Register(Register_Enum.R10)
-                modified_instr.extend((Mov(size, left, scratch),
-                                       Cmp(size, scratch, right)))
-            case Cmp(size, left, Imm() as right):
-                scratch = Register(Register_Enum.R11)
-                modified_instr.extend((Mov(size, right, scratch),
-                                       Cmp(size, left, scratch)))
-            case Idiv(size, Imm(a)):
-                # idiv can't use an immediate as an operand
-                scratch = Register(Register_Enum.R10)
-                modified_instr.append(Mov(size, Imm(a), scratch))
-                modified_instr.append(Idiv(size, scratch))
-            case _:
-                modified_instr.append(instr)
+        fixup_instr(instr, modified_instr)
     func.instructions = modified_instr
 
 
-def emit_asm_ast(node: tacky.Program) -> Program:
+def fixup_instr(instr: Instruction,
+                modified_instr: list[Instruction]) -> None:
+    """Appends instr, rewritten through scratch registers when its
+       operands are not legal together. Operands are reused as they are
+    """
+    match instr:
+        case Mov(size, Stack() as a, Stack() as b):
+            # Currently using %R10 as a scratch register
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(Mov(size, scratch, b))
+        case Binary(Bin_Op.ADD, size, Stack() as a, Stack() as b):
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(
+                Binary(Bin_Op.ADD, size, scratch, b))
+        case Binary(Bin_Op.SUB, size, Stack() as a, Stack() as b):
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(
+                Binary(Bin_Op.SUB, size, scratch, b))
+        case Binary(Bin_Op.MULT, size, src, Stack() as a):
+            # imul can't use a memory address as a dst
+            scratch = Register(Register_Enum.R11)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(Binary(Bin_Op.MULT, size, src, scratch))
+            modified_instr.append(Mov(size, scratch, a))
+        case Binary(Bin_Op.AND, size, Stack() as a, Stack() as b):
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(
+                Binary(Bin_Op.AND, size, scratch, b))
+        case Binary(Bin_Op.OR, size, Stack() as a, Stack() as b):
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(
+                Binary(Bin_Op.OR, size, scratch, b))
+        case Binary(Bin_Op.XOR, size, Stack() as a, Stack() as b):
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(
+                Binary(Bin_Op.XOR, size, scratch, b))
+        case Binary(Bin_Op.RIGHT_SHIFT, size, Stack() as op1, op2):
+            scratch = Register(Register_Enum.CX)
+            cl = Register(Register_Enum.CX)
+            modified_instr.extend(
+                (Mov(size, op1, scratch),
+                 Binary(Bin_Op.RIGHT_SHIFT, size, cl, op2)))
+        case Binary(Bin_Op.LEFT_SHIFT, size, Stack() as op1, op2):
+            scratch = Register(Register_Enum.CX)
+            cl = Register(Register_Enum.CX)
+            modified_instr.extend(
+                (Mov(size, op1, scratch),
+                 Binary(Bin_Op.LEFT_SHIFT, size, cl, op2)))
+        case Cmp(size, Stack() as left, Stack() as right):
+            scratch = Register(Register_Enum.R10)
+            modified_instr.extend((Mov(size, left, scratch),
+                                   Cmp(size, scratch, right)))
+        case Cmp(size, left, Imm() as right):
+            scratch = Register(Register_Enum.R11)
+            modified_instr.extend((Mov(size, right, scratch),
+                                   Cmp(size, left, scratch)))
+        case Idiv(size, Imm() as a):
+            # idiv can't use an immediate as an operand
+            scratch = Register(Register_Enum.R10)
+            modified_instr.append(Mov(size, a, scratch))
+            modified_instr.append(Idiv(size, scratch))
+        case _:
+            modified_instr.append(instr)
+
+
+def lower_function(node: tacky.Function) -> Function:
+    """Converts TACKY, assigns stack slots and fixes up operands in a
+       single walk. Each variable gets one Stack that all of its uses
+       share, and the frame size is patched in once it is known
+    """
+    slots: dict[Identifier, Stack] = {}
+
+    def convert_val(val: tacky.Val) -> Operand:
+        match val:
+            case tacky.Var(identifier):
+                slot = slots.get(identifier)
+                if slot is None:
+                    # Incrementing by four for ints
+                    slot = slots[identifier] = Stack(4 * (len(slots) + 1))
+                return slot
+            case _:
+                return convert_tacky_val(val)
+
+    instructions: list[Instruction] = [Allocate_Stack(0)]
+    for instr in node.body:
+        for asm_instr in convert_tacky_instr(instr, convert_val):
+            fixup_instr(asm_instr, instructions)
+    instructions[0] = Allocate_Stack(4 * len(slots))
+    return Function(node.identifier, instructions)
+
+
+def lower_program(node: tacky.Program) -> Program:
+    return Program(lower_function(node.function_definition))
+
+
+def emit_asm_ast(node: tacky.Program, fused: bool = True) -> Program:
+    """Lowers TACKY to assembly in one pass, or with fused=False as the
+       separate conversion, stack slot and fixup passes
+    """
+    if fused:
+        return lower_program(node)
     asm_ast = convert_tacky(node)
     blah = replace_psuedo(asm_ast.function_definition)
     instruction_fixup(asm_ast.function_definition, blah)
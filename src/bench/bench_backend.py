@@ -0,0 +1,73 @@
+"""Backend benchmark, the fused lowering against the separate passes.
+
+Lowers one large TACKY function both ways and reports the best time,
+the memory the result holds on to and the peak of what was allocated
+on top of it while lowering. Memory is measured with tracemalloc in a
+separate run.
+Run from src/ with: python -m bench.bench_backend [--size N ...]
+"""
+import argparse
+import time
+import tracemalloc
+
+import asm
+import lexer
+import parser
+import tacky
+from bench import synth
+from semantic import semantic
+from utility import NameContext, name_context
+
+
+def lower(n: int) -> tacky.Program:
+    with name_context(NameContext()):
+        ast = parser.parse_program(
+            lexer.tokenize_stream(synth.straight_line(n)), 0)
+        assert ast is not None
+        return tacky.emit_tack_program(semantic.resolve_program(ast))
+
+
+def best_of(program: tacky.Program, fused: bool, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asm.emit_asm_ast(program, fused)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def memory(program: tacky.Program, fused: bool) -> tuple[int, int]:
+    """The bytes held by the result and the transient peak"""
+    tracemalloc.start()
+    try:
+        # Held until measured, so it counts as retained
+        result = asm.emit_asm_ast(program, fused)
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+        return retained, peak - retained
+    finally:
+        tracemalloc.stop()
+
+
+def run(n: int, repeat: int) -> None:
+    program = lower(n)
+    print(f'  {len(program.function_definition.body)} TACKY instructions')
+    for name, fused in (('passes', False), ('fused', True)):
+        best = best_of(program, fused, repeat)
+        retained, transient = memory(program, fused)
+        print(f'    {name:<8} {best:8.3f}s {retained / 1e6:8.1f} MB result '
+              f'{transient / 1e6:8.1f} MB transient')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, nargs='+',
+                            default=[1000, 10000, 50000])
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    for n in args.size:
+        run(n, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Batch compilation throughput in files per second.
+
+Compares one driver process per file, the way a build used to call it,
+with a single invocation compiling every file sequentially and with a
+pool of worker processes.
+Run from src/ with: python -m bench.bench_batch [--files N] [--jobs N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import driver
+
+
+def program(i: int) -> str:
+    body = ' '.join(f'int v{j} = v{j-1} * {j} + {i} - (v{j-1} < {j});'
+                    for j in range(1, 20))
+    return (f'int main(void) {{ int v0 = {i}; {body}'
+            f' if (v19 > {i}) goto done; v0 = v19 ? v1 : v2;'
+            f' done: return v0 % 256; }}')
+
+
+def write_files(directory: str, count: int) -> list[str]:
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'p{i}.c')
+        with open(path, 'w') as f:
+            f.write(program(i))
+        paths.append(path)
+    return paths
+
+
+def report(name: str, files: int, elapsed: float) -> None:
+    print(f'  {name:<24} {elapsed:8.3f}s {files / elapsed:8.1f} files/s')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--files', type=int, default=200)
+    arg_parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    arg_parser.add_argument('--link', action='store_true',
+                            help='assemble and link too, '
+                            'otherwise stop after code generation')
+    arg_parser.add_argument('--process-files', type=int, default=50,
+                            help='files for the process per file run')
+    args = arg_parser.parse_args()
+    stage = [] if args.link else ['--codegen']
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(directory, args.files)
+        print(f'{args.files} files, {args.jobs} jobs')
+
+        some = paths[:args.process_files]
+        start = time.perf_counter()
+        for path in some:
+            subprocess.run([sys.executable, driver.__file__, *stage, path],
+                           check=True)
+        report('process per file', len(some), time.perf_counter() - start)
+
+        for jobs in sorted({1, args.jobs}):
+            start = time.perf_counter()
+            status = driver.handle_args([*stage, '-j', str(jobs), *paths])
+            assert status == 0
+            report(f'one invocation -j {jobs}', len(paths),
+                   time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
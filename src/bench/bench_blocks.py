@@ -0,0 +1,98 @@
+"""Block item parsing benchmark on declaration heavy blocks.
+
+Counts parse calls that fail and token reads as well as time, since
+backtracking shows up as failed attempts and re-reads of the same tokens.
+Run from src/ with: python -m bench.bench_blocks [--items N]
+"""
+import argparse
+import time
+
+import lexer
+import parser
+
+
+class CountingTokens(list):
+    """A token list that counts every indexed read"""
+
+    def __init__(self, tokens) -> None:
+        super().__init__(tokens)
+        self.reads = 0
+
+    def __getitem__(self, index):
+        self.reads += 1
+        return super().__getitem__(index)
+
+
+COUNTED = ('parse_statement', 'parse_declaration', 'parse_exprNode',
+           'parse_expr')
+
+
+def count_failures(counts: dict[str, int]) -> None:
+    """Wraps the parse functions so failed attempts are tallied.
+       The parser looks its functions up as module globals,
+       so internal calls go through the wrappers too
+    """
+    for name in COUNTED:
+        def wrapper(*args, _inner=getattr(parser, name), _name=name):
+            result = _inner(*args)
+            if result is None:
+                counts[_name] = counts.get(_name, 0) + 1
+            return result
+        setattr(parser, name, wrapper)
+
+
+def declarations(items: int) -> str:
+    body = ' '.join(f'int v{i} = v{i-1} + {i} * 2;' for i in range(1, items))
+    return f'int main(void) {{ int v0 = 1; {body} return v0; }}'
+
+
+def mixed(items: int) -> str:
+    """Declarations, labels and statements starting with an identifier"""
+    parts = ['int v0 = 1;']
+    for i in range(1, items):
+        match i % 4:
+            case 0:
+                parts.append(f'int v{i} = v{i-1};')
+            case 1:
+                parts.append(f'l{i}: v{i-1} = v{i-1} + 1; int v{i} = 2;')
+            case 2:
+                parts.append(f'int v{i}; v{i} = v{i-1} * 3;')
+            case 3:
+                parts.append(f'int v{i} = 0; {{ int v{i} = v{i-1}; }}')
+    return f'int main(void) {{ {" ".join(parts)} return v0; }}'
+
+
+def run(name: str, source: str, repeat: int,
+        counts: dict[str, int]) -> None:
+    tokens = CountingTokens(lexer.tokenize_buffer(source))
+    best = float('inf')
+    for _ in range(repeat):
+        tokens.reads = 0
+        counts.clear()
+        start = time.perf_counter()
+        result = parser.parse_program(tokens, 0)
+        best = min(best, time.perf_counter() - start)
+        assert result is not None
+    failed = sum(counts.values())
+    print(f'  {name:<13} {len(tokens):>8} tokens {best:8.3f}s '
+          f'{tokens.reads / len(tokens):6.2f} reads/token '
+          f'{failed:>8} failed attempts')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--items', type=int, default=20000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--count-failures', action='store_true',
+                            help='tally failed parse attempts, '
+                            'slows the parser down')
+    args = arg_parser.parse_args()
+    counts: dict[str, int] = {}
+    if args.count_failures:
+        count_failures(counts)
+    run('declarations', declarations(args.items), args.repeat, counts)
+    run('mixed', mixed(args.items), args.repeat, counts)
+
+
+if __name__ == '__main__':
+    main()
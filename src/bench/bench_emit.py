@@ -0,0 +1,134 @@
+"""Assembly emission benchmark on one large function.
+
+Compares writing the text an instruction at a time into a large
+buffered file with joining the chunks of process_node into one string.
+Peak memory is measured with tracemalloc in a separate run, since
+tracing slows everything down.
+
+The microbenchmark renders a generated mix of instructions on its own,
+leaving out code generation and the output file.
+Run from src/ with:
+python -m bench.bench_emit [--size N ...] [--instructions N]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from typing import Callable
+
+import asm
+import code_emit
+import compiler
+import lexer
+from bench import synth
+
+BUFFER_SIZE = 1 << 20
+
+
+def codegen(n: int) -> asm.Program:
+    options = compiler.CompileOptions(compiler.Stage.CODEGEN)
+    tokens = lexer.tokenize_stream(synth.straight_line(n))
+    program = compiler.Compilation(options).compile_tokens(tokens)
+    assert program is not None
+    return program
+
+
+def joined(program: asm.Program) -> None:
+    with open(os.devnull, 'w') as output:
+        output.write(''.join(code_emit.process_node(program)))
+
+
+def streamed(program: asm.Program) -> None:
+    with open(os.devnull, 'w', buffering=BUFFER_SIZE) as output:
+        code_emit.emit_program(program, output)
+
+
+def best_of(function: Callable[[asm.Program], None],
+            program: asm.Program, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(program)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(function: Callable[[asm.Program], None],
+                program: asm.Program) -> int:
+    tracemalloc.start()
+    try:
+        function(program)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def instruction_mix(count: int) -> list[asm.Instruction]:
+    """The kinds of instruction code generation emits most, over a
+       frame of a few hundred slots
+    """
+    r10 = asm.Register(asm.Register_Enum.R10)
+    ax = asm.Register(asm.Register_Enum.AX)
+    cx = asm.Register(asm.Register_Enum.CX)
+    size = asm.Size.L
+    mix = []
+    for i in range(count):
+        slot = asm.Stack(4 * (i % 300 + 1))
+        match i % 8:
+            case 0 | 1:
+                mix.append(asm.Mov(size, slot, r10))
+            case 2:
+                mix.append(asm.Mov(size, r10, slot))
+            case 3:
+                mix.append(asm.Binary(asm.Bin_Op.ADD, size, asm.Imm(i),
+                                      slot))
+            case 4:
+                mix.append(asm.Binary(asm.Bin_Op.LEFT_SHIFT, size, cx,
+                                      slot))
+            case 5:
+                mix.append(asm.Cmp(size, asm.Imm(0), slot))
+            case 6:
+                mix.append(asm.SetCC(asm.Cond_Code.GE, slot))
+            case 7:
+                mix.append(asm.Mov(size, slot, ax))
+    return mix
+
+
+def micro(count: int, repeat: int) -> None:
+    instructions = instruction_mix(count)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in map(code_emit.instruction_text, instructions):
+            pass
+        best = min(best, time.perf_counter() - start)
+    print(f'  render {count} instructions {best:8.3f}s '
+          f'{count / best / 1e6:6.2f} M instructions/s')
+
+
+def run(n: int, repeat: int) -> None:
+    program = codegen(n)
+    count = len(program.function_definition.instructions)
+    print(f'  {count} instructions')
+    for name, function in (('joined', joined), ('streamed', streamed)):
+        best = best_of(function, program, repeat)
+        peak = peak_memory(function, program)
+        print(f'    {name:<10} {best:8.3f}s '
+              f'{count / best / 1e6:6.2f} M instructions/s '
+              f'{peak / 1024:10.0f} KiB peak')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, nargs='+',
+                            default=[1000, 10000, 50000])
+    arg_parser.add_argument('--instructions', type=int, default=1000000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+    micro(args.instructions, args.repeat)
+    for n in args.size:
+        run(n, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Lexer throughput comparison.
+
+Run from src/ with: python -m bench.bench_lexer [--size-mb N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import lexer
+
+
+def generate_source(size: int, line_items: int) -> str:
+    """Builds a valid function body of roughly size bytes.
+       line_items statements are placed on each line, so a large value
+       gives the very long lines of machine generated sources
+    """
+    lines = ['int main(void) {', 'int v0 = 0;']
+    i = 1
+    total = 0
+    while total < size:
+        stmts = []
+        for _ in range(line_items):
+            stmts.append(f'int v{i} = v{i-1} * 3 + ({i} << 2) % 7;')
+            i += 1
+        line = ' '.join(stmts)
+        total += len(line) + 1
+        lines.append(line)
+    lines.append(f'return v{i-1};')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def per_line(path: str) -> int:
+    # The lexer as it was before the single pass scanner
+    with open(path, 'r') as f:
+        return len([t for line in f for t in lexer.tokenize_string(line)])
+
+
+def whole_buffer(path: str) -> int:
+    with open(path, 'r') as f:
+        return len(list(lexer.tokenize_buffer(f.read())))
+
+
+def text_stream(path: str) -> int:
+    return len(lexer.tokenize_file(path))
+
+
+def mmap_stream(path: str) -> int:
+    return len(lexer.tokenize_file(path, use_mmap=True))
+
+
+MODES = (('per-line tokenize_string', per_line),
+         ('whole buffer tokenize_buffer', whole_buffer),
+         ('text TokenStream (default)', text_stream),
+         ('mmap bytes TokenStream', mmap_stream))
+
+
+def run(size: int, line_items: int, repeat: int) -> None:
+    source = generate_source(size, line_items)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.i')
+        with open(path, 'w') as f:
+            f.write(source)
+        mb = len(source) / 1e6
+        print(f'{mb:.2f} MB, {line_items} statements per line')
+        for name, fn in MODES:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                count = fn(path)
+                best = min(best, time.perf_counter() - start)
+            print(f'  {name:<30} {count:>9} tokens '
+                  f'{best:8.3f}s {mb / best:8.2f} MB/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    size = int(args.size_mb * 1e6)
+    run(size, 1, args.repeat)
+    run(size, 200, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""IR node memory and pass speed benchmark.
+
+Reports the size of each parser, tacky and asm node type next to the
+same fields on a plain dict backed class, then times the passes over a
+large generated function with both kinds of node.
+Run from src/ with: python -m bench.bench_nodes [--items N]
+"""
+import argparse
+import dataclasses
+import importlib
+import sys
+import time
+import tracemalloc
+from types import ModuleType
+
+import asm
+import lexer
+import parser
+import tacky
+from semantic import semantic
+from utility import Identifier
+
+SAMPLES = (parser.Constant('1'),
+           parser.Var(Identifier('a')),
+           parser.Binary(parser.Bin_Op.ADD, None, None),
+           parser.Assignment(None, None),
+           parser.ExpNode(None),
+           parser.DeclareNode(Identifier('a'), None),
+           parser.D(None),
+           tacky.Var(Identifier('a')),
+           tacky.Constant(1),
+           tacky.Binary(tacky.Bin_Op.ADD, None, None, None),
+           tacky.Copy(None, None),
+           asm.Pseudo(Identifier('a')),
+           asm.Stack(4),
+           asm.Imm(1),
+           asm.Mov(asm.Size.L, None, None),
+           asm.Binary(asm.Bin_Op.ADD, asm.Size.L, None, None))
+
+
+def node_size(cls, args, count: int = 10000) -> float:
+    """Average traced bytes of count fresh instances"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = [cls(*args) for _ in range(count)]
+    size = (tracemalloc.get_traced_memory()[0] - before) / count
+    tracemalloc.stop()
+    del nodes
+    # Each instance also costs a pointer in the list
+    return size - 8
+
+
+def dict_backed(node) -> type:
+    """An unslotted, mutable dataclass with the same fields as node"""
+    return dataclasses.make_dataclass(
+        type(node).__name__, [f.name for f in dataclasses.fields(node)])
+
+
+def report_sizes() -> None:
+    print('per node size in bytes (node, dict backed, saved)')
+    for node in SAMPLES:
+        name = f'{type(node).__module__}.{type(node).__name__}'
+        args = [getattr(node, f.name) for f in dataclasses.fields(node)]
+        now = node_size(type(node), args)
+        before = node_size(dict_backed(node), args)
+        saved = before - now
+        print(f'  {name:<22} {now:>6.0f} {before:>6.0f} {saved:>6.0f}')
+
+
+def program(items: int) -> str:
+    body = ' '.join(f'int v{i} = v{i-1} * 3 + {i} - (v{i-1} < {i});'
+                    for i in range(1, items))
+    return f'int main(void) {{ int v0 = 1; {body} return v0; }}'
+
+
+# The modules that declare nodes, in the order they import each other
+NODE_MODULES = ('parser', 'semantic.semantic', 'tacky', 'asm')
+
+
+def dict_backed_modules() -> dict[str, ModuleType]:
+    """Separate imports of NODE_MODULES whose nodes are plain dict
+       backed dataclasses. Frozen nodes keep a field hash, the passes
+       use them as keys. The usual modules are left in place
+    """
+    decorator = dataclasses.dataclass
+
+    def unslotted(cls=None, /, **kwargs):
+        kwargs.pop('slots', None)
+        if kwargs.pop('frozen', False):
+            kwargs['unsafe_hash'] = True
+        return decorator(**kwargs) if cls is None else decorator(cls,
+                                                                 **kwargs)
+    saved = {name: sys.modules.pop(name) for name in NODE_MODULES}
+    dataclasses.dataclass = unslotted  # type: ignore[assignment]
+    try:
+        return {name: importlib.import_module(name)
+                for name in NODE_MODULES}
+    finally:
+        dataclasses.dataclass = decorator
+        sys.modules.update(saved)
+        # Importing a submodule also sets it on its package
+        sys.modules['semantic'].semantic = saved['semantic.semantic']
+
+
+def stage_costs(modules: dict[str, ModuleType],
+                source: str,
+                traced: bool) -> list[float]:
+    """Seconds, or bytes retained by the result, for each stage"""
+    parser, semantic, tacky, asm = (modules[x] for x in NODE_MODULES)
+    results = []
+    stages = (lambda: parser.parse_program(lexer.tokenize_stream(source), 0),
+              lambda: semantic.resolve_program(results[0]),
+              lambda: tacky.emit_tack_program(results[1]),
+              lambda: asm.emit_asm_ast(results[2]))
+    costs = []
+    if traced:
+        tracemalloc.start()
+    for stage in stages:
+        start = time.perf_counter()
+        memory = tracemalloc.get_traced_memory()[0]
+        results.append(stage())
+        elapsed = time.perf_counter() - start
+        if traced:
+            costs.append(tracemalloc.get_traced_memory()[0] - memory)
+        else:
+            costs.append(elapsed)
+    tracemalloc.stop()
+    return costs
+
+
+def report_passes(items: int) -> None:
+    print(f'passes over {items} declarations (node, dict backed)')
+    source = program(items)
+    variants = ({name: sys.modules[name] for name in NODE_MODULES},
+                dict_backed_modules())
+    names = ('parse', 'semantic', 'tacky', 'asm')
+    for traced in (False, True):
+        now, before = (stage_costs(x, source, traced) for x in variants)
+        for name, a, b in zip(names, now, before):
+            if traced:
+                print(f'  {name:<10} {a / 1e6:8.1f} {b / 1e6:8.1f} MB')
+            else:
+                print(f'  {name:<10} {a:8.3f} {b:8.3f} s')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--items', type=int, default=20000)
+    args = arg_parser.parse_args()
+    report_sizes()
+    report_passes(args.items)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Expression parser benchmark on operator heavy input.
+
+Run from src/ with: python -m bench.bench_parser [--terms N]
+"""
+import argparse
+import random
+import sys
+import time
+
+import lexer
+import parser
+
+BINARY = ('*', '/', '%', '+', '-', '<<', '>>', '<', '<=', '>', '>=',
+          '==', '!=', '&', '^', '|', '&&', '||')
+ASSIGN = ('=', '+=', '-=', '*=', '/=', '%=', '&=', '|=', '^=', '<<=', '>>=')
+
+
+def binary_chain(terms: int, rng: random.Random) -> str:
+    parts = ['a']
+    for i in range(terms):
+        parts.append(rng.choice(BINARY))
+        parts.append(rng.choice(('a', 'b', str(i))))
+    return ' '.join(parts)
+
+
+def mixed(terms: int, rng: random.Random) -> str:
+    """Binary chains broken up by ternaries and assignments"""
+    parts = ['a']
+    for i in range(terms):
+        roll = rng.random()
+        if roll < 0.05:
+            parts.append(f'? b{i} :')
+        elif roll < 0.10:
+            parts.append(f'{rng.choice(ASSIGN)} b{i} {rng.choice(BINARY)}')
+        else:
+            parts.append(rng.choice(BINARY))
+        parts.append(rng.choice(('a', 'b', str(i))))
+    return ' '.join(parts)
+
+
+def run(name: str, source: str, repeat: int) -> None:
+    tokens = list(lexer.tokenize_buffer(source))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parser.parse_expr(tokens, 0)
+        best = min(best, time.perf_counter() - start)
+        assert result is not None and result[1] == len(tokens)
+    operators = len(tokens) // 2
+    print(f'  {name:<14} {operators:>8} operators {best:8.3f}s '
+          f'{operators / best / 1e3:8.1f} k ops/s')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--terms', type=int, default=5000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+    # Random chains nest one call per precedence climb
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.terms))
+    rng = random.Random(0)
+    run('binary chain', binary_chain(args.terms, rng), args.repeat)
+    run('mixed', mixed(args.terms, rng), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
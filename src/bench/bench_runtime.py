@@ -0,0 +1,151 @@
+"""Runtime benchmark for the quality of the generated code.
+
+Builds each program in bench/programs with this compiler at -O0 and
+-O1 and with gcc -O0 and -O1, checks that all builds exit with the
+same status, and records for each build:
+- runtime, the best of --repeat runs
+- static instructions, counted from the assembly of main
+- stack frame, the bytes main reserves below %rbp
+--save-baseline writes the results as JSON and --baseline compares a
+run against such a file, so backend changes can be measured against
+the same reference.
+Run from src/ with: python -m bench.bench_runtime [--repeat N]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+
+import compiler
+import preprocessor
+
+PROGRAMS = os.path.join(os.path.dirname(__file__), 'programs')
+
+GCC_LEVELS = ('-O0', '-O1')
+
+# The unoptimized build keeps its plain name so older baselines match
+OUR_BUILDS = {'ours': 0, 'ours -O1': 1}
+
+FRAME_OFFSET = re.compile(r'-(\d+)\(%rbp\)')
+FRAME_RESERVE = re.compile(r'subq\s+\$(\d+),\s*%rsp')
+
+
+def static_metrics(assembly: str) -> tuple[int, int]:
+    """Instruction count and frame size of the assembly for main"""
+    instructions = 0
+    frame = 0
+    for line in assembly.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if not line or line.startswith('.') or line.endswith(':'):
+            continue
+        instructions += 1
+        for pattern in (FRAME_OFFSET, FRAME_RESERVE):
+            for m in pattern.finditer(line):
+                frame = max(frame, int(m.group(1)))
+    return instructions, frame
+
+
+def build(name: str, source_path: str, directory: str) -> dict[str, str]:
+    """Writes the assembly of every build and returns their paths"""
+    with open(source_path) as f:
+        text = preprocessor.preprocess_string(f.read())
+    paths = {}
+    for build_name, level in OUR_BUILDS.items():
+        path = os.path.join(directory, f'{name}.ours{level}.s')
+        with open(path, 'w') as f:
+            f.write(compiler.compile_source(
+                text, compiler.CompileOptions(opt_level=level)))
+        paths[build_name] = path
+    for level in GCC_LEVELS:
+        path = os.path.join(directory, f'{name}.gcc{level}.s')
+        # No unwind tables, so the listing holds just the code
+        subprocess.run(['gcc', level, '-S', '-fno-asynchronous-unwind-tables',
+                        '-o', path, source_path], check=True)
+        paths[f'gcc {level}'] = path
+    return paths
+
+
+def run_binary(binary: str, repeat: int) -> tuple[float, int]:
+    best = float('inf')
+    status = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        status = subprocess.run([binary]).returncode
+        best = min(best, time.perf_counter() - start)
+    return best, status
+
+
+def measure(name: str, source_path: str, directory: str,
+            repeat: int) -> dict[str, dict]:
+    results = {}
+    for build_name, asm_path in build(name, source_path, directory).items():
+        binary = asm_path[:-2]
+        subprocess.run(['gcc', '-o', binary, asm_path], check=True)
+        with open(asm_path) as f:
+            instructions, frame = static_metrics(f.read())
+        runtime, status = run_binary(binary, repeat)
+        results[build_name] = {'runtime': runtime,
+                               'instructions': instructions,
+                               'frame': frame,
+                               'status': status}
+    statuses = {r['status'] for r in results.values()}
+    if len(statuses) != 1:
+        raise RuntimeError(f'{name}: builds disagree on the result, '
+                           f'{ {k: r["status"] for k, r in results.items()} }')
+    return results
+
+
+def report(results: dict[str, dict[str, dict]],
+           baseline: dict | None) -> None:
+    header = (f'  {"build":<10} {"runtime s":>10} {"instrs":>8} '
+              f'{"frame":>7}')
+    if baseline is not None:
+        header += f' {"runtime":>9} {"instrs":>8} {"frame":>7}  vs baseline'
+    for program, builds in results.items():
+        print(program)
+        print(header)
+        for build_name, r in builds.items():
+            line = (f'  {build_name:<10} {r["runtime"]:10.3f} '
+                    f'{r["instructions"]:8} {r["frame"]:7}')
+            old = (baseline or {}).get(program, {}).get(build_name)
+            if old is not None:
+                line += (f' {r["runtime"] / old["runtime"]:8.2f}x'
+                         f' {r["instructions"] - old["instructions"]:+8}'
+                         f' {r["frame"] - old["frame"]:+7}')
+            print(line)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--programs', nargs='+',
+                            help='names of programs in bench/programs')
+    arg_parser.add_argument('--baseline', metavar='FILE',
+                            help='compare against results saved earlier')
+    arg_parser.add_argument('--save-baseline', metavar='FILE',
+                            help='write the results as JSON')
+    args = arg_parser.parse_args()
+    names = args.programs or sorted(
+        os.path.splitext(x)[0] for x in os.listdir(PROGRAMS)
+        if x.endswith('.c'))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            results[name] = measure(name, os.path.join(PROGRAMS, f'{name}.c'),
+                                    directory, args.repeat)
+    report(results, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
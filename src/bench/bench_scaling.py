@@ -0,0 +1,113 @@
+"""Per-stage scaling of the compiler on synthetic programs.
+
+Times every stage in process for each program family over a range of
+sizes and fits the growth of each stage as a power of the size.
+A slope near 1 is linear; stages whose slope passes --threshold are
+flagged as super-linear.
+The reference line lexer, tokenize_string, is timed as lex_line, one
+call per source line, since it rescans what is left of each line.
+Run from src/ with: python -m bench.bench_scaling [--sizes N ...]
+"""
+import argparse
+import json
+import math
+import sys
+import time
+
+import lexer
+from bench import synth
+from compiler import Compilation
+from timing import PassTimer
+
+
+# Nesting of the stages, sub-passes are indented under their pass
+DEPTHS = {'lex_line': 0}
+
+
+def time_stages(source: str, repeat: int) -> dict[str, float]:
+    """Best wall time of each stage over repeat compiles"""
+    best: dict[str, float] = {}
+    for _ in range(repeat):
+        timer = PassTimer()
+        Compilation(timer=timer).compile_source(source)
+        start = time.perf_counter()
+        for line in source.splitlines():
+            for _ in lexer.tokenize_string(line):
+                pass
+        times = {r.name: r.wall for r in timer.records}
+        DEPTHS.update((r.name, r.depth) for r in timer.records)
+        times['lex_line'] = time.perf_counter() - start
+        for name, wall in times.items():
+            best[name] = min(best.get(name, math.inf), wall)
+    return best
+
+
+def slope(sizes: list[int], times: list[float]) -> float:
+    """Least squares slope of log time against log size"""
+    xs = [math.log(x) for x in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in times]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    den = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / den
+
+
+def run(name: str, sizes: list[int], repeat: int,
+        threshold: float, floor: float) -> dict:
+    generate = synth.FAMILIES[name]
+    results = [time_stages(generate(n), repeat) for n in sizes]
+    stages = list(results[0])
+    print(f'{name}')
+    print(f'  {"stage":<20}' + ''.join(f'{n:>10}' for n in sizes)
+          + '     slope')
+    report = {}
+    for stage in stages:
+        times = [r[stage] for r in results]
+        fit = slope(sizes, times)
+        # Stages too quick to time reliably are never flagged
+        flagged = fit > threshold and times[-1] > floor
+        report[stage] = {'times': times, 'slope': fit,
+                         'super_linear': flagged}
+        label = '  ' * DEPTHS[stage] + stage
+        print(f'  {label:<20}'
+              + ''.join(f'{t * 1e3:10.2f}' for t in times)
+              + f'{fit:10.2f}' + ('  SUPER-LINEAR' if flagged else ''))
+    return report
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[500, 1000, 2000, 4000])
+    arg_parser.add_argument('--families', nargs='+',
+                            choices=list(synth.FAMILIES),
+                            default=list(synth.FAMILIES))
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--threshold', type=float, default=1.25,
+                            help='slope above which a stage is flagged')
+    arg_parser.add_argument('--floor', type=float, default=0.002,
+                            help='seconds a stage must take at the '
+                            'largest size to be flagged')
+    arg_parser.add_argument('--json', metavar='FILE',
+                            help='also write the results as JSON')
+    args = arg_parser.parse_args()
+    # Nested blocks and ternaries recurse once per level in some stages
+    sys.setrecursionlimit(max(sys.getrecursionlimit(),
+                              50 * max(args.sizes)))
+    print('wall ms per stage by size, best of '
+          f'{args.repeat} runs, slope of log time against log size')
+    reports = {name: run(name, args.sizes, args.repeat,
+                         args.threshold, args.floor)
+               for name in args.families}
+    flagged = [f'{family}.{stage}'
+               for family, stages in reports.items()
+               for stage, result in stages.items()
+               if result['super_linear']]
+    print('super-linear: ' + (', '.join(flagged) if flagged else 'none'))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'sizes': args.sizes, 'families': reports}, f,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Variable resolution benchmark on deeply nested Compound blocks.
+
+Every level declares a variable and reads variables declared at the
+outermost levels, so scope walks grow with the nesting depth.
+Run from src/ with: python -m bench.bench_scopes [--depth N ...]
+"""
+import argparse
+import sys
+import time
+
+import lexer
+import parser
+from semantic import semantic
+
+
+def nested(depth: int, reads: int) -> str:
+    opening = ' '.join(f'{{ int v{i} = {i};' for i in range(depth))
+    uses = ' '.join(f'v{depth - 1} = v0 + v1 + v{i % depth};'
+                    for i in range(reads))
+    closing = ' }' * depth
+    return f'int main(void) {{ {opening} {uses}{closing} return 0; }}'
+
+
+def run(depth: int, reads: int, repeat: int) -> None:
+    tokens = lexer.tokenize_stream(nested(depth, reads))
+    ast = parser.parse_program(tokens, 0)
+    assert ast is not None
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        semantic.resolve_program(ast)
+        best = min(best, time.perf_counter() - start)
+    print(f'  depth {depth:>6} {best:8.3f}s '
+          f'{best / (4 * reads) * 1e6:8.2f} us/reference')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--depth', type=int, nargs='+',
+                            default=[10, 100, 1000, 4000])
+    arg_parser.add_argument('--reads', type=int, default=20000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    # Parsing and resolving nested blocks still recurse per level
+    sys.setrecursionlimit(max(sys.getrecursionlimit(),
+                              20 * max(args.depth)))
+    for depth in args.depth:
+        run(depth, args.reads, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Driver startup benchmark.
+
+Times whole driver invocations on a tiny file for each stop flag next to
+a bare interpreter, and lists the slowest imports of a run from
+python -X importtime.
+Run from src/ with: python -m bench.bench_startup [--runs N] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import driver
+
+SOURCE = 'int main(void) { int a = 2; return a * 3; }\n'
+
+MODES = ('--lex', '--parse', '--validate', '--tacky', '--codegen')
+
+
+def wall(command: list[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def import_times(command: list[str]) -> list[tuple[int, int, str]]:
+    """(self us, cumulative us, module) for every import of a run"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', *command],
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(own), int(cumulative), name.strip()))
+    return rows
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--runs', type=int, default=10)
+    arg_parser.add_argument('--top', type=int, default=12)
+    arg_parser.add_argument('--mode', default='--parse',
+                            help='stop flag for the import listing')
+    args = arg_parser.parse_args()
+    if sys.flags.dont_write_bytecode:
+        print('bytecode caching is off, every run compiles the sources')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'main.c')
+        with open(path, 'w') as f:
+            f.write(SOURCE)
+        baseline = wall([sys.executable, '-c', 'pass'], args.runs)
+        print(f'median of {args.runs} runs (total, over a bare interpreter)')
+        print(f'  {"python -c pass":<16} {baseline * 1e3:7.1f} ms')
+        for mode in MODES:
+            elapsed = wall([sys.executable, driver.__file__, mode, path],
+                           args.runs)
+            print(f'  {mode:<16} {elapsed * 1e3:7.1f} ms '
+                  f'{(elapsed - baseline) * 1e3:7.1f} ms')
+
+        rows = import_times([driver.__file__, args.mode, path])
+        print(f'slowest imports for {args.mode} (self, cumulative)')
+        for own, cumulative, name in sorted(rows, reverse=True)[:args.top]:
+            print(f'  {name:<32} {own / 1e3:7.1f} ms '
+                  f'{cumulative / 1e3:7.1f} ms')
+        print(f'  {"total":<32} {sum(r[0] for r in rows) / 1e3:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
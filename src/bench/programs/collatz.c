@@ -0,0 +1,22 @@
+#define LIMIT 100000
+
+int main(void) {
+    int n = 1;
+    int steps = 0;
+next:
+    {
+        int x = n;
+    step:
+        if (x == 1)
+            goto done;
+        x = x % 2 ? 3 * x + 1 : x / 2;
+        steps = (steps + 1) & 1048575;
+        goto step;
+    done:
+        ;
+    }
+    n = n + 1;
+    if (n <= LIMIT)
+        goto next;
+    return steps % 256;
+}
@@ -0,0 +1,18 @@
+#define N 10000000
+#define SCALE (3 * 7 + 1)
+#define MASK ((1 << 16) - 1)
+#define OFFSET (100 / 7 - 100 % 7)
+#define ENABLED (SCALE > 20 && MASK != 0)
+
+int main(void) {
+    int i = 0;
+    int acc = 0;
+loop:
+    if (ENABLED)
+        acc = (acc * SCALE + OFFSET + (i & (MASK >> 8))) & MASK;
+    acc = acc ^ (~0 & (1 << 3));
+    i = i + 1;
+    if (i < N)
+        goto loop;
+    return acc % 256;
+}
@@ -0,0 +1,18 @@
+#define N 20000000
+#define MOD 1000007
+
+int main(void) {
+    int a = 0;
+    int b = 1;
+    int i = 0;
+loop:
+    {
+        int c = (a + b) % MOD;
+        a = b;
+        b = c;
+    }
+    i++;
+    if (i < N)
+        goto loop;
+    return a % 256;
+}
@@ -0,0 +1,33 @@
+#define SIZE 1500
+
+int main(void) {
+    int total = 0;
+    int a = 1;
+outer:
+    {
+        int b = 1;
+    inner:
+        {
+            int x = a;
+            int y = b;
+        euclid:
+            if (y == 0)
+                goto found;
+            {
+                int t = x % y;
+                x = y;
+                y = t;
+            }
+            goto euclid;
+        found:
+            total = (total + x) & 1048575;
+        }
+        b = b + 1;
+        if (b <= SIZE)
+            goto inner;
+    }
+    a = a + 1;
+    if (a <= SIZE)
+        goto outer;
+    return total % 256;
+}
@@ -0,0 +1,22 @@
+#define N 3000000
+
+int main(void) {
+    int total = 0;
+    int i = 0;
+next:
+    {
+        int x = i;
+    bit:
+        if (!x)
+            goto counted;
+        total += x & 1;
+        x >>= 1;
+        goto bit;
+    counted:
+        ;
+    }
+    i++;
+    if (i < N)
+        goto next;
+    return total % 256;
+}
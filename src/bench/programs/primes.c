@@ -0,0 +1,25 @@
+#define LIMIT 200000
+
+int main(void) {
+    int count = 0;
+    int n = 2;
+candidate:
+    {
+        int d = 2;
+    divide:
+        if (d * d > n)
+            goto prime;
+        if (n % d == 0)
+            goto composite;
+        d = d + 1;
+        goto divide;
+    prime:
+        count = count + 1;
+    composite:
+        ;
+    }
+    n = n + 1;
+    if (n < LIMIT)
+        goto candidate;
+    return count % 256;
+}
@@ -0,0 +1,12 @@
+#define N 20000000
+
+int main(void) {
+    int i = 0;
+    int acc = 0;
+loop:
+    acc = (acc + (i & 1023) * (i & 1023)) & 65535;
+    i = i + 1;
+    if (i < N)
+        goto loop;
+    return acc % 256;
+}
@@ -0,0 +1,57 @@
+"""Generators for synthetic programs in the subset the compiler accepts.
+
+Every generator takes a size knob n and returns the source of a whole
+program whose length grows linearly with n.
+"""
+
+
+def straight_line(n: int) -> str:
+    """One long block of assignments"""
+    body = ' '.join(f'a = a * 3 + {i}; b = b ^ a - {i};' for i in range(n))
+    return f'int main(void) {{ int a = 1; int b = 2; {body} return a; }}'
+
+
+def nested_blocks(n: int) -> str:
+    """n nested Compound blocks, each declaring and shadowing"""
+    opening = ' '.join(f'{{ int v = {i}; int w{i} = v + 1;' for i in range(n))
+    closing = ' }' * n
+    return f'int main(void) {{ int v = 0; {opening} v = v + 1;{closing}' \
+        ' return v; }'
+
+
+def logical_chains(n: int) -> str:
+    """&& and || chains of n terms each"""
+    terms = [f'(a > {i})' for i in range(n)]
+    conj = ' && '.join(terms)
+    disj = ' || '.join(terms)
+    mixed = ' '.join(f'{t} {"&&" if i % 2 else "||"}'
+                     for i, t in enumerate(terms)) + ' a'
+    return (f'int main(void) {{ int a = {n}; int b = {conj};'
+            f' int c = {disj}; int d = {mixed}; return b + c + d; }}')
+
+
+def ternaries(n: int) -> str:
+    """A ternary nested n deep in its false branch"""
+    chain = ' '.join(f'a == {i} ? {i} :' for i in range(n))
+    return f'int main(void) {{ int a = {n // 2}; return {chain} 0; }}'
+
+
+def gotos(n: int) -> str:
+    """n labels, each jumped to by a goto"""
+    body = ' '.join(f'l{i}: a = a + 1; if (a > {i}) goto l{i + 1};'
+                    for i in range(n))
+    return f'int main(void) {{ int a = 0; {body} l{n}: return a; }}'
+
+
+def locals_(n: int) -> str:
+    """n locals, each read by the next declaration"""
+    body = ' '.join(f'int v{i} = v{i - 1} + {i};' for i in range(1, n))
+    return f'int main(void) {{ int v0 = 0; {body} return v{n - 1}; }}'
+
+
+FAMILIES = {'straight_line': straight_line,
+            'nested_blocks': nested_blocks,
+            'logical_chains': logical_chains,
+            'ternaries': ternaries,
+            'gotos': gotos,
+            'locals': locals_}
@@ -0,0 +1,191 @@
+"""On disk compile cache addressed by the hash of its inputs.
+
+Entries are plain files named by key and suffix. Writes go to a
+temporary file that is renamed into place, so readers only ever see
+whole entries. The modification time of an entry is its last use,
+eviction removes the least recently used entries first.
+"""
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Bumped by hand when the cache layout changes
+CACHE_FORMAT = '1'
+
+
+@functools.cache
+def compiler_version() -> str:
+    """A stamp that changes whenever any of the compiler sources do"""
+    digest = hashlib.sha256(CACHE_FORMAT.encode())
+    root = os.path.dirname(os.path.abspath(__file__))
+    for directory in (root, os.path.join(root, 'semantic')):
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py') and not name.startswith('test_'):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(name.encode() + b'\0' + f.read())
+    return digest.hexdigest()
+
+
+@functools.cache
+def assembler_version() -> str:
+    result = subprocess.run(['gcc', '--version'],
+                            capture_output=True, text=True)
+    return result.stdout
+
+
+class CompileCache:
+    """A size limited cache of compiler outputs that any number of
+       processes can share
+    """
+
+    def __init__(self, directory: str,
+                 max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.objects = os.path.join(directory, 'objects')
+        self.max_bytes = max_bytes
+        os.makedirs(self.objects, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, options: dict[str, str]) -> str:
+        """Hashes preprocessed source with everything else that
+           decides the output
+        """
+        digest = hashlib.sha256()
+        stamp = {**options, 'compiler': compiler_version()}
+        digest.update(json.dumps(stamp, sort_keys=True).encode())
+        digest.update(b'\0')
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.objects, f'{key}.{suffix}')
+
+    def get(self, key: str, suffix: str) -> str | None:
+        """Returns the path of an entry and marks it as used"""
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def copy_out(self, key: str, suffix: str, destination: str) -> bool:
+        """Copies an entry to destination, False if it is not cached.
+           The copy is renamed into place, so a concurrent eviction
+           never leaves a partial file behind
+        """
+        path = self.get(key, suffix)
+        if path is None:
+            return False
+        directory = os.path.dirname(os.path.abspath(destination))
+        with tempfile.NamedTemporaryFile(dir=directory,
+                                         delete=False) as output:
+            try:
+                with open(path, 'rb') as entry:
+                    shutil.copyfileobj(entry, output)
+                shutil.copymode(path, output.name)
+            except FileNotFoundError:
+                os.unlink(output.name)
+                return False
+        os.replace(output.name, destination)
+        return True
+
+    def put(self, key: str, suffix: str, source: str) -> None:
+        """Copies the file at source into the cache"""
+        with tempfile.NamedTemporaryFile(dir=self.objects,
+                                         delete=False) as output:
+            with open(source, 'rb') as f:
+                shutil.copyfileobj(f, output)
+        shutil.copymode(source, output.name)
+        os.replace(output.name, self.path(key, suffix))
+        self.evict()
+
+    def put_text(self, key: str, suffix: str, text: str) -> None:
+        with tempfile.NamedTemporaryFile('w', dir=self.objects,
+                                         delete=False) as output:
+            output.write(text)
+        os.replace(output.name, self.path(key, suffix))
+        self.evict()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with open(os.path.join(self.directory, 'lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def entries(self) -> list[os.DirEntry]:
+        entries = []
+        with os.scandir(self.objects) as it:
+            for entry in it:
+                if entry.name.startswith('tmp'):
+                    # Another process is still writing it
+                    continue
+                try:
+                    entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append(entry)
+        return entries
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits"""
+        with self.locked():
+            entries = self.entries()
+            total = sum(e.stat().st_size for e in entries)
+            if total <= self.max_bytes:
+                return
+            evicted = 0
+            for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+                if total <= self.max_bytes:
+                    break
+                total -= entry.stat().st_size
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    continue
+                evicted += 1
+            self.update_stats(evictions=evicted)
+
+    def stats_path(self) -> str:
+        return os.path.join(self.directory, 'stats.json')
+
+    def read_stats(self) -> dict[str, int]:
+        try:
+            with open(self.stats_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def update_stats(self, **counts: int) -> None:
+        """Adds to the shared counters, callers must hold the lock"""
+        stats = self.read_stats()
+        for name, value in counts.items():
+            stats[name] = stats.get(name, 0) + value
+        with tempfile.NamedTemporaryFile('w', dir=self.directory,
+                                         delete=False) as output:
+            json.dump(stats, output)
+        os.replace(output.name, self.stats_path())
+
+    def record(self, hit: bool) -> None:
+        with self.locked():
+            self.update_stats(**{'hits' if hit else 'misses': 1})
+
+    def stats(self) -> dict[str, int]:
+        with self.locked():
+            stats = self.read_stats()
+            entries = self.entries()
+        stats['entries'] = len(entries)
+        stats['bytes'] = sum(e.stat().st_size for e in entries)
+        return stats
@@ -0,0 +1,94 @@
+#! /bin/python
+"""Thin client for the compile server.
+
+Takes the same arguments as driver.py. Only the standard library is
+imported here, so a compile costs little more than interpreter startup
+and one round trip over the socket. When no server is running the
+driver is run in process instead.
+"""
+import json
+import os
+import socket
+import stat
+import sys
+
+SOCKET_ENV = 'STRANGE_CC_SOCKET'
+
+
+def default_socket_path() -> str:
+    """A socket in a directory only this user can write to, so no one
+       else can put a socket of their own in its place
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        directory = os.path.join(runtime, 'strange-cc')
+    else:
+        directory = os.path.join(os.environ.get('TMPDIR', '/tmp'),
+                                 f'strange-cc-{os.getuid()}')
+    return os.path.join(directory, 'server.sock')
+
+
+def private_directory(directory: str) -> bool:
+    """True if directory exists, is ours and nobody else may write it"""
+    try:
+        st = os.lstat(directory)
+    except FileNotFoundError:
+        return False
+    return (stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid()
+            and st.st_mode & 0o077 == 0)
+
+
+def send(connection: socket.socket, message: dict) -> None:
+    connection.sendall(json.dumps(message).encode() + b'\n')
+
+
+def receive(connection: socket.socket) -> dict | None:
+    """Reads one newline terminated JSON message,
+       None if the peer closed the connection first
+    """
+    with connection.makefile('rb') as stream:
+        line = stream.readline()
+    if not line.endswith(b'\n'):
+        return None
+    return json.loads(line)
+
+
+def request(argv: list[str], socket_path: str,
+            cwd: str | None = None) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        send(connection, {'argv': argv, 'cwd': cwd or os.getcwd()})
+        response = receive(connection)
+    if response is None:
+        raise ConnectionError('Compile server closed the connection')
+    return response
+
+
+def main(argv: list[str] | None = None,
+         socket_path: str | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    socket_path = socket_path or default_socket_path()
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    try:
+        # The request carries our command line and directory and the
+        # reply is trusted, so only a socket nobody else could have
+        # put there is used
+        if not private_directory(directory):
+            if os.path.exists(directory):
+                print(f'{sys.argv[0]}: not using {socket_path}, {directory} '
+                      'is writable by other users', file=sys.stderr)
+            raise FileNotFoundError(socket_path)
+        response = request(argv, socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        import driver
+        return driver.handle_args(argv)
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
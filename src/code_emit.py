@@ -1,176 +1,244 @@
+import io
 from collections.abc import Generator
+from typing import Callable, TextIO
 
 import asm
 
+# Everything an instruction is spelled with comes from these tables,
+# rendering an operand is a dictionary lookup rather than a match
+SUFFIXES = {asm.Size.B: 'b',
+            asm.Size.W: 'w',
+            asm.Size.L: 'l',
+            asm.Size.Q: 'q'}
 
-def decode_suffix(x: asm.Size) -> str:
-    match x:
-        case asm.Size.B:
-            return 'b'
-        case asm.Size.W:
-            return 'w'
-        case asm.Size.L:
-            return 'l'
-        case asm.Size.Q:
-            return 'q'
-        case _:
-            raise RuntimeError(f'Unhandled size{x}')
+REGISTERS = {
+    asm.Size.B: {asm.Register_Enum.AX: '%al',
+                 asm.Register_Enum.CX: '%cl',
+                 asm.Register_Enum.DX: '%dl',
+                 asm.Register_Enum.R10: '%r10b',
+                 asm.Register_Enum.R11: '%r11b'},
+    asm.Size.L: {asm.Register_Enum.AX: '%eax',
+                 asm.Register_Enum.CX: '%ecx',
+                 asm.Register_Enum.DX: '%edx',
+                 asm.Register_Enum.R10: '%r10d',
+                 asm.Register_Enum.R11: '%r11d'},
+}
 
+OPERATORS = {asm.Unary_Operator.NEGATION: 'neg',
+             asm.Unary_Operator.COMPLEMENT: 'not',
+             asm.Bin_Op.ADD: 'add',
+             asm.Bin_Op.SUB: 'sub',
+             asm.Bin_Op.MULT: 'imul',
+             asm.Bin_Op.LEFT_SHIFT: 'sal',
+             asm.Bin_Op.RIGHT_SHIFT: 'sar',
+             asm.Bin_Op.AND: 'and',
+             asm.Bin_Op.OR: 'or',
+             asm.Bin_Op.XOR: 'xor'}
 
-def decode_32_operand(x) -> str:
-    match x:
-        case asm.Imm(val):
-            return f'${val}'
-        case asm.Register(asm.Register_Enum.AX):
-            return '%eax'
-        case asm.Register(asm.Register_Enum.CX):
-            return '%ecx'
-        case asm.Register(asm.Register_Enum.DX):
-            return '%edx'
-        case asm.Register(asm.Register_Enum.R10):
-            return '%r10d'
-        case asm.Register(asm.Register_Enum.R11):
-            return '%r11d'
-        case asm.Stack(offset):
-            return f'-{offset}(%rbp)'
-        case _:
-            raise RuntimeError(f'Unhandled op {x}')
+COND_CODES = {asm.Cond_Code.E: 'e',
+              asm.Cond_Code.NE: 'ne',
+              asm.Cond_Code.L: 'l',
+              asm.Cond_Code.LE: 'le',
+              asm.Cond_Code.G: 'g',
+              asm.Cond_Code.GE: 'ge'}
 
+# Shifts by a register always take the count in %cl
+SHIFTS = {asm.Bin_Op.LEFT_SHIFT, asm.Bin_Op.RIGHT_SHIFT}
 
-def decode_8_operand(x) -> str:
-    match x:
-        case asm.Imm(val):
-            return f'${val}'
-        case asm.Register(asm.Register_Enum.AX):
-            return '%al'
-        case asm.Register(asm.Register_Enum.CX):
-            return '%cl'
-        case asm.Register(asm.Register_Enum.DX):
-            return '%dl'
-        case asm.Register(asm.Register_Enum.R10):
-            return '%r10b'
-        case asm.Register(asm.Register_Enum.R11):
-            return '%r11b'
-        case asm.Stack(offset):
-            return f'-{offset}(%rbp)'
-        case _:
-            raise RuntimeError(f'Unhandled op {x}')
 
+class StackOperands(dict[int, str]):
+    """Rendered stack slots by offset, each is formatted once.
+       Offsets come from the frame layout and there are only as many
+       as the largest function has slots
+    """
+
+    def __missing__(self, offset: int) -> str:
+        text = self[offset] = f'-{offset}(%rbp)'
+        return text
 
-def decode_operator(x) -> str:
-    match x:
-        case asm.Unary_Operator.NEGATION:
-            return 'neg'
-        case asm.Unary_Operator.COMPLEMENT:
-            return 'not'
-        case asm.Bin_Op.ADD:
-            return 'add'
-        case asm.Bin_Op.SUB:
-            return 'sub'
-        case asm.Bin_Op.MULT:
-            return 'imul'
-        case asm.Bin_Op.LEFT_SHIFT:
-            return 'sal'
-        case asm.Bin_Op.RIGHT_SHIFT:
-            return 'sar'
-        case asm.Bin_Op.AND:
-            return 'and'
-        case asm.Bin_Op.OR:
-            return 'or'
-        case asm.Bin_Op.XOR:
-            return 'xor'
-        case _:
-            raise RuntimeError(f'Unhandled op {x}')
+
+STACK_OPERANDS = StackOperands()
+
+
+def decode_suffix(x: asm.Size) -> str:
+    try:
+        return SUFFIXES[x]
+    except KeyError:
+        raise RuntimeError(f'Unhandled size{x}') from None
 
 
 def decode_operand(op: asm.Operand, size: asm.Size) -> str:
-    match size:
-        case asm.Size.B:
-            return decode_8_operand(op)
-        case asm.Size.L:
-            return decode_32_operand(op)
-        case _:
-            raise RuntimeError(f'Unhandled size {size}')
+    registers = REGISTERS.get(size)
+    if registers is None:
+        raise RuntimeError(f'Unhandled size {size}')
+    kind = type(op)
+    if kind is asm.Stack:
+        return STACK_OPERANDS[op.val]
+    if kind is asm.Register:
+        return registers[op.reg]
+    if kind is asm.Imm:
+        return f'${op.val}'
+    raise RuntimeError(f'Unhandled op {op}')
+
+
+def decode_32_operand(x: asm.Operand) -> str:
+    return decode_operand(x, asm.Size.L)
+
+
+def decode_8_operand(x: asm.Operand) -> str:
+    return decode_operand(x, asm.Size.B)
+
+
+def decode_operator(x: asm.Unary_Operator | asm.Bin_Op) -> str:
+    try:
+        return OPERATORS[x]
+    except KeyError:
+        raise RuntimeError(f'Unhandled op {x}') from None
 
 
 def decode_cond_code(x: asm.Cond_Code) -> str:
-    match x:
-        case asm.Cond_Code.E:
-            return 'e'
-        case asm.Cond_Code.NE:
-            return 'ne'
-        case asm.Cond_Code.L:
-            return 'l'
-        case asm.Cond_Code.LE:
-            return 'le'
-        case asm.Cond_Code.G:
-            return 'g'
-        case asm.Cond_Code.GE:
-            return 'ge'
-        case _:
-            raise RuntimeError(f'Unhandled cond_code {x}')
+    try:
+        return COND_CODES[x]
+    except KeyError:
+        raise RuntimeError(f'Unhandled cond_code {x}') from None
+
+
+# Written after the function so the stack is not marked executable
+NOTE_GNU_STACK = '.section .note.GNU-stack,"",@progbits\n'
+
+EPILOGUE = '\tmovq %rbp, %rsp\n\tpopq %rbp\n\tret\n'
+
+
+def function_prologue(name: str) -> str:
+    return (f'\t.global {name}\n'
+            f'{name}:\n'
+            '\tpushq %rbp\n'
+            '\tmovq %rsp, %rbp\n')
+
+
+def emit_mov(x: asm.Mov) -> str:
+    size = x.size
+    return (f'\tmov{decode_suffix(size)} {decode_operand(x.src, size)}, '
+            f'{decode_operand(x.dst, size)}\n')
+
+
+def emit_ret(x: asm.Ret) -> str:
+    return EPILOGUE
+
+
+def emit_unary(x: asm.Unary) -> str:
+    return (f'\t{decode_operator(x.unary_operator)} '
+            f'{decode_operand(x.operand, x.size)}\n')
+
+
+def emit_binary(x: asm.Binary) -> str:
+    size = x.size
+    operator = x.binary_operator
+    left = x.left
+    if operator in SHIFTS and left == asm.Register(asm.Register_Enum.CX):
+        count = '%cl'
+    else:
+        count = decode_operand(left, size)
+    return (f'\t{decode_operator(operator)}{decode_suffix(size)} '
+            f'{count}, {decode_operand(x.right, size)}\n')
+
+
+def emit_idiv(x: asm.Idiv) -> str:
+    size = x.size
+    return (f'\tidiv{decode_suffix(size)} '
+            f'{decode_operand(x.operand, size)}\n')
+
+
+def emit_cdq(x: asm.Cdq) -> str:
+    return '\tcdq\n'
+
+
+def emit_cmp(x: asm.Cmp) -> str:
+    size = x.size
+    return (f'\tcmp{decode_suffix(size)} {decode_operand(x.left, size)}, '
+            f'{decode_operand(x.right, size)}\n')
+
+
+def emit_jmp(x: asm.Jmp) -> str:
+    return f'\tjmp .L{x.identifier}\n'
+
+
+def emit_jmpcc(x: asm.JmpCC) -> str:
+    return f'\tj{decode_cond_code(x.cond_code)} .L{x.identifier}\n'
+
+
+def emit_setcc(x: asm.SetCC) -> str:
+    return (f'\tset{decode_cond_code(x.cond_code)} '
+            f'{decode_operand(x.operand, asm.Size.B)}\n')
+
+
+def emit_label(x: asm.Label) -> str:
+    return f'.L{x.identifier}:\n'
+
+
+def emit_allocate_stack(x: asm.Allocate_Stack) -> str:
+    if x.offset == 0:
+        return '# \t No stack allocation \n'
+    return f'\tsubq ${x.offset}, %rsp\n'
+
+
+# Instructions are rendered by the function registered for their class
+EMITTERS: dict[type, Callable[..., str]] = {
+    asm.Mov: emit_mov,
+    asm.Ret: emit_ret,
+    asm.Unary: emit_unary,
+    asm.Binary: emit_binary,
+    asm.Idiv: emit_idiv,
+    asm.Cdq: emit_cdq,
+    asm.Cmp: emit_cmp,
+    asm.Jmp: emit_jmp,
+    asm.JmpCC: emit_jmpcc,
+    asm.SetCC: emit_setcc,
+    asm.Label: emit_label,
+    asm.Allocate_Stack: emit_allocate_stack,
+}
+
+
+def instruction_text(x: asm.Instruction) -> str:
+    """The assembly text of a single instruction"""
+    emitter = EMITTERS.get(type(x))
+    if emitter is None:
+        raise RuntimeError(f'Unandled instruction {x}')
+    return emitter(x)
+
+
+def emit_program(program: asm.Program, output: TextIO) -> None:
+    """Writes the assembly for program one instruction at a time.
+       Nothing but the current instruction's text is held here, a large
+       buffered output keeps the number of real writes down
+    """
+    function = program.function_definition
+    write = output.write
+    write(function_prologue(function.name))
+    emitters = EMITTERS
+    for instruction in function.instructions:
+        emitter = emitters.get(type(instruction))
+        if emitter is None:
+            raise RuntimeError(f'Unandled instruction {instruction}')
+        write(emitter(instruction))
+    write(NOTE_GNU_STACK)
+
+
+def emit_string(program: asm.Program) -> str:
+    output = io.StringIO()
+    emit_program(program, output)
+    return output.getvalue()
 
 
 def process_node(x) -> Generator[str]:
+    """Yields the assembly text of a node an instruction at a time"""
     match x:
         case asm.Program():
             yield from process_node(x.function_definition)
-            yield '.section .note.GNU-stack,"",@progbits\n'
+            yield NOTE_GNU_STACK
         case asm.Function(name, instructions):
-            yield f'\t.global {name}\n'
-            yield f'{name}:\n'
-            yield '\tpushq %rbp\n'
-            yield '\tmovq %rsp, %rbp\n'
+            yield function_prologue(name)
             for instruction in instructions:
-                yield from process_node(instruction)
-        case asm.Mov(size, src, dst):
-            s = decode_suffix(size)
-            a = decode_operand(src, size)
-            b = decode_operand(dst, size)
-            yield f'\tmov{s} {a}, {b}\n'
-        case asm.Ret():
-            yield '\tmovq %rbp, %rsp\n'
-            yield '\tpopq %rbp\n'
-            yield '\tret\n'
-        case asm.Unary(operator, s, dst):
-            yield f'\t{decode_operator(operator)} {decode_operand(dst, s)}\n'
-        case asm.Binary(asm.Bin_Op.LEFT_SHIFT | asm.Bin_Op.RIGHT_SHIFT as op,
-                        size,
-                        asm.Register(asm.Register_Enum.CX),
-                        operand):
-            s = decode_suffix(size)
-            a = decode_operator(op)
-            b = decode_operand(operand, size)
-            yield f'\t{a}{s} %cl, {b}\n'
-        case asm.Binary(operator, size, left, right):
-            op1 = decode_operand(left, size)
-            op2 = decode_operand(right, size)
-            s = decode_suffix(size)
-            yield f'\t{decode_operator(operator)}{s} {op1}, {op2}\n'
-        case asm.Idiv(size, operand):
-            suffix = decode_suffix(size)
-            yield f'\tidiv{suffix} {decode_operand(operand, size)}\n'
-        case asm.Cdq():
-            yield '\tcdq\n'
-        case asm.Cmp(size, left, right):
-            suffix = decode_suffix(size)
-            op1 = decode_operand(left, size)
-            op2 = decode_operand(right, size)
-            yield f'\tcmp{suffix} {op1}, {op2}\n'
-        case asm.Jmp(label):
-            yield f'\tjmp .L{label}\n'
-        case asm.JmpCC(cond_code, label):
-            jcc = f'j{decode_cond_code(cond_code)}'
-            yield f'\t{jcc} .L{label}\n'
-        case asm.SetCC(cond_code, operand):
-            setcc = f'set{decode_cond_code(cond_code)}'
-            op1 = decode_operand(operand, asm.Size.B)
-            yield f'\t{setcc} {op1}\n'
-        case asm.Label(label):
-            yield f'.L{label}:\n'
-        case asm.Allocate_Stack(0):
-            yield '# \t No stack allocation \n'
-        case asm.Allocate_Stack(offset):
-            yield f'\tsubq ${offset}, %rsp\n'
+                yield instruction_text(instruction)
         case _:
-            raise RuntimeError(f'Unandled instruction {x}')
+            yield instruction_text(x)
@@ -0,0 +1,151 @@
+from dataclasses import dataclass
+from enum import Enum, auto
+from typing import TYPE_CHECKING, TextIO
+
+from timing import PassTimer, count_nodes, timed
+from utility import NameContext, name_context
+
+# Each stage is imported when a compilation first reaches it
+if TYPE_CHECKING:
+    import asm
+    import lexer
+    from passes import PassManager
+
+
+class Stage(Enum):
+    """The stages a compilation can stop after"""
+    LEX = auto()
+    PARSE = auto()
+    VALIDATE = auto()
+    TACKY = auto()
+    CODEGEN = auto()
+    EMIT = auto()
+
+
+@dataclass(frozen=True, slots=True)
+class CompileOptions:
+    stop_after: Stage = Stage.EMIT
+    opt_level: int = 0
+    disabled_passes: frozenset[str] = frozenset()
+    # Passes whose output is printed each time they run
+    print_after: frozenset[str] = frozenset()
+
+    def optimizes(self) -> bool:
+        return bool(self.opt_level or self.disabled_passes
+                    or self.print_after)
+
+
+class Compilation:
+    """Holds all of the state for compiling one translation unit.
+       Nothing is shared between compilations, so separate instances
+       can run concurrently and the same input always gives the same
+       output
+    """
+
+    def __init__(self,
+                 options: CompileOptions = CompileOptions(),
+                 timer: PassTimer | None = None,
+                 output: TextIO | None = None) -> None:
+        self.options = options
+        self.names = NameContext()
+        # Counting items costs a walk over each result,
+        # so it only happens when someone is timing the passes
+        self.timer = timer
+        # Where print_after goes, stderr when None
+        self.output = output
+
+    def stops_at(self, stage: Stage) -> bool:
+        return self.options.stop_after is stage
+
+    def pass_manager(self) -> 'PassManager | None':
+        if not self.options.optimizes():
+            return None
+        from passes import PassManager
+        options = self.options
+        return PassManager(options.opt_level, options.disabled_passes,
+                           options.print_after, self.output, self.timer)
+
+    def compile_tokens(self,
+                       tokens: 'lexer.Tokens') -> 'asm.Program | None':
+        """Runs parsing through code generation.
+           Returns None when the options stop before code generation
+        """
+        import parser
+        timer = self.timer
+        with name_context(self.names):
+            with timed(timer, 'parse') as record:
+                ast = parser.parse_program(tokens, 0)
+                if ast is None:
+                    raise ValueError('Failed to parse a program')
+            if record is not None:
+                record.counts['nodes'] = count_nodes(ast)
+            if self.stops_at(Stage.PARSE):
+                return None
+            from semantic import goto, semantic
+            with timed(timer, 'semantic'):
+                ast = semantic.resolve_program(ast, in_place=True)
+            with timed(timer, 'goto'):
+                ast = goto.resolve_program(ast)
+            if self.stops_at(Stage.VALIDATE):
+                return None
+            import tacky
+            with timed(timer, 'tacky') as record:
+                tacky_ast = tacky.emit_tack_program(ast)
+            if record is not None:
+                record.counts['instructions'] = len(
+                    tacky_ast.function_definition.body)
+            manager = self.pass_manager()
+            if manager is not None and manager.tacky_passes:
+                with timed(timer, 'tacky passes'):
+                    manager.run_tacky(tacky_ast.function_definition)
+            if self.stops_at(Stage.TACKY):
+                return None
+            import asm
+            with timed(timer, 'asm') as record:
+                asm_ast = asm.emit_asm_ast(tacky_ast)
+            if record is not None:
+                record.counts.update(asm_counts(asm_ast))
+            if manager is not None and manager.asm_passes:
+                with timed(timer, 'asm passes'):
+                    manager.run_asm(asm_ast.function_definition)
+            return asm_ast
+
+    def compile_source(self, text: str) -> str:
+        """Compiles preprocessed source text to assembly text.
+           Returns an empty string when stopping before emission
+        """
+        import lexer
+        with timed(self.timer, 'lex') as record:
+            tokens = lexer.tokenize_stream(text)
+        if record is not None:
+            record.counts['tokens'] = len(tokens)
+        if self.stops_at(Stage.LEX):
+            return ''
+        asm_ast = self.compile_tokens(tokens)
+        if asm_ast is None or self.stops_at(Stage.CODEGEN):
+            return ''
+        import code_emit
+        with timed(self.timer, 'emit') as record:
+            asm_text = code_emit.emit_string(asm_ast)
+        if record is not None:
+            record.counts['lines'] = asm_text.count('\n')
+            record.counts['bytes'] = len(asm_text)
+        return asm_text
+
+
+def asm_counts(asm_ast: 'asm.Program') -> dict[str, int]:
+    import asm
+    instructions = asm_ast.function_definition.instructions
+    counts = {'instructions': len(instructions)}
+    match instructions:
+        case [asm.Allocate_Stack(stack_bytes), *_]:
+            # Every pseudo register gets its own four byte slot
+            counts['pseudos'] = stack_bytes // 4
+            counts['stack_bytes'] = stack_bytes
+    return counts
+
+
+def compile_source(text: str,
+                   options: CompileOptions = CompileOptions()) -> str:
+    """Compiles preprocessed C source held in memory to assembly text"""
+    return Compilation(options).compile_source(text)
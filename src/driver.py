@@ -1,40 +1,55 @@
 #! /bin/python
 import argparse
 import os
-import parser as p
-import subprocess
+import sys
+from typing import TYPE_CHECKING, Callable, NamedTuple, TextIO
 
-import asm
-import code_emit
-import lexer
-import tacky
-from semantic import goto, semantic
+from timing import timed
 
+# Stages and heavier standard modules are imported where they are first
+# needed, so a --lex or --parse run never pays for the later stages.
+# bench/bench_startup.py tracks what each import costs
+if TYPE_CHECKING:
+    from cache import CompileCache
+    from compiler import CompileOptions, Stage
+    from timing import PassTimer
 
-def handle_args():
-    parser = argparse.ArgumentParser()
-    group = parser.add_mutually_exclusive_group()
 
-    group.add_argument('--lex', action='store_true')
-    group.add_argument('--parse', action='store_true')
-    group.add_argument('--codegen', action='store_true')
-    group.add_argument('--tacky', action='store_true')
-    group.add_argument('--validate', action='store_true')
+def stop_after(args: argparse.Namespace) -> 'Stage':
+    from compiler import Stage
+    if args.lex:
+        return Stage.LEX
+    if args.parse:
+        return Stage.PARSE
+    if args.validate:
+        return Stage.VALIDATE
+    if args.tacky:
+        return Stage.TACKY
+    if args.codegen:
+        return Stage.CODEGEN
+    return Stage.EMIT
 
-    parser.add_argument('filepath', type=str)
 
-    args = parser.parse_args()
+def compile_options(args: argparse.Namespace) -> 'CompileOptions':
+    from compiler import CompileOptions
+    return CompileOptions(stop_after(args),
+                          args.opt_level,
+                          frozenset(args.disabled_passes),
+                          frozenset(args.print_after))
 
-    if not os.path.isfile(args.filepath):
-        print(f'File not found {args.filepath}')
-        return
 
-    file_basename = os.path.splitext(os.path.basename(args.filepath))[0]
-    directory = os.path.dirname(args.filepath)
+def gcc_preprocess(args: argparse.Namespace,
+                   filepath: str,
+                   file_basename: str,
+                   directory: str) -> str:
+    import subprocess
     preprocessed_file = f'{file_basename}.i'
     preprocessed_output = os.path.join(directory, preprocessed_file)
 
-    gcc_command = ['gcc', '-E', '-P', args.filepath, '-o', preprocessed_output]
+    gcc_command = ['gcc', '-E', '-P',
+                   *(f'-I{x}' for x in args.include_dirs),
+                   *(f'-D{x}' for x in args.defines),
+                   filepath, '-o', preprocessed_output]
 
     result = subprocess.run(gcc_command,
                             capture_output=True,
@@ -43,35 +58,27 @@ def handle_args():
     if result.returncode != 0:
         err_msg = f'GCC failed to preprocess the file: {result.stderr}'
         raise RuntimeError(err_msg)
+    return preprocessed_output
 
-    lex_result = lexer.tokenize_file(preprocessed_output)
-    if args.lex:
-        return
-    x = p.parse_program(lex_result, 0)
-    if x is None:
-        raise ValueError('Failed to parse a program')
-    if args.parse:
-        return
-    # TODO make use of the TACKY Immediate Representation
-    resolved = semantic.resolve_program(x)
-    resolved = goto.resolve_program(resolved)
-    if args.validate:
-        return
-    tacky_ast = tacky.emit_tack_program(resolved)
-    if args.tacky:
-        return
 
-    asm_ast = asm.emit_asm_ast(tacky_ast)
-    if args.codegen:
-        return
-    blah = [x for x in code_emit.process_node(asm_ast)]
-    asm_file_output = f'{file_basename}.s'
-    asm_file_output = os.path.join(directory, f'{file_basename}.s')
-    bin_file_output = os.path.join(directory, file_basename)
+# Assembly is written through buffers this large,
+# so a big function costs a few writes rather than one per instruction
+ASM_BUFFER_SIZE = 1 << 20
+
+# Writes the assembly text to the stream it is given
+Emitter = Callable[[TextIO], object]
+
+
+def write_text(text: str) -> Emitter:
+    return lambda output: output.write(text)
+
 
-    with open(asm_file_output, 'w') as output:
-        for x in blah:
-            output.write(x)
+def assemble_file(emit: Emitter,
+                  asm_file_output: str,
+                  bin_file_output: str) -> None:
+    import subprocess
+    with open(asm_file_output, 'w', buffering=ASM_BUFFER_SIZE) as output:
+        emit(output)
 
     gcc_command = ['gcc', '-o', bin_file_output, asm_file_output]
 
@@ -84,5 +91,322 @@ def handle_args():
         raise RuntimeError(err_msg)
 
 
+def assemble_pipe(emit: Emitter, bin_file_output: str) -> None:
+    """Streams the assembly into gcc as it is emitted,
+       so the assembler starts while code is still being generated
+    """
+    import subprocess
+    import tempfile
+    gcc_command = ['gcc', '-x', 'assembler', '-', '-o', bin_file_output]
+
+    # Errors go to a file rather than a pipe, a pipe that nobody reads
+    # could fill up and block gcc while we are still writing to it
+    with tempfile.TemporaryFile('w+') as errors:
+        process = subprocess.Popen(gcc_command,
+                                   stdin=subprocess.PIPE,
+                                   stderr=errors,
+                                   bufsize=ASM_BUFFER_SIZE,
+                                   text=True)
+        assert process.stdin is not None
+        try:
+            with process.stdin as output:
+                emit(output)
+        except BrokenPipeError:
+            # gcc exited early, its error output says why
+            pass
+        if process.wait() != 0:
+            errors.seek(0)
+            err_msg = f'GCC failed to assemble: {errors.read()}'
+            raise RuntimeError(err_msg)
+
+
+class FileResult(NamedTuple):
+    error: str | None
+    # The --time-passes report, when one was asked for
+    passes: dict | None = None
+    # What --print-after printed
+    dump: str | None = None
+
+
+def compile_path(args: argparse.Namespace,
+                 filepath: str,
+                 timer: 'PassTimer | None' = None,
+                 output: TextIO | None = None) -> None:
+    import lexer
+    if not os.path.isfile(filepath):
+        raise RuntimeError('File not found')
+
+    file_basename = os.path.splitext(os.path.basename(filepath))[0]
+    directory = os.path.dirname(filepath)
+    # Caching and timing need the whole preprocessed text up front,
+    # otherwise every stage streams into the next one
+    whole_text = args.cache_dir or timer is not None
+    if args.cpp == 'gcc':
+        with timed(timer, 'preprocess'):
+            preprocessed_output = gcc_preprocess(args, filepath,
+                                                 file_basename, directory)
+        if whole_text:
+            with open(preprocessed_output) as f:
+                text = f.read()
+        elif args.lex:
+            lexer.tokenize_file(preprocessed_output)
+            return
+        else:
+            tokens = lexer.stream_file(preprocessed_output)
+    else:
+        import preprocessor
+        lines = preprocessor.preprocess_file(filepath,
+                                             args.include_dirs,
+                                             args.defines)
+        if whole_text:
+            with timed(timer, 'preprocess') as record:
+                text = ''.join(lines)
+            if record is not None:
+                record.counts['lines'] = text.count('\n')
+        elif args.lex:
+            list(lexer.tokenize_lines(lines))
+            return
+        else:
+            tokens = lexer.tokenize_lines(lines)
+    bin_file_output = os.path.join(directory, file_basename)
+    asm_file_output = os.path.join(directory, f'{file_basename}.s')
+    from compiler import Compilation, Stage
+    options = compile_options(args)
+    stage = options.stop_after
+    # Printed passes are wanted on every run, a cache hit would skip them
+    if args.cache_dir and stage is Stage.EMIT and not options.print_after:
+        compile_cached(args, text, asm_file_output, bin_file_output, timer)
+        return
+    compilation = Compilation(options, timer, output)
+    if whole_text:
+        asm_text = compilation.compile_source(text)
+        if stage is Stage.EMIT:
+            assemble(args, write_text(asm_text), asm_file_output,
+                     bin_file_output, timer)
+        return
+    # Tokens are lexed as the parser asks for them,
+    # only a small lookahead window is ever held in memory
+    asm_ast = compilation.compile_tokens(lexer.TokenWindow(tokens))
+    if asm_ast is None or args.codegen:
+        return
+    import functools
+
+    import code_emit
+    assemble(args, functools.partial(code_emit.emit_program, asm_ast),
+             asm_file_output, bin_file_output)
+
+
+def assemble(args: argparse.Namespace,
+             emit: Emitter,
+             asm_file_output: str,
+             bin_file_output: str,
+             timer: 'PassTimer | None' = None) -> None:
+    with timed(timer, 'assemble'):
+        if args.save_asm:
+            assemble_file(emit, asm_file_output, bin_file_output)
+        else:
+            assemble_pipe(emit, bin_file_output)
+
+
+def open_cache(args: argparse.Namespace) -> 'CompileCache':
+    from cache import DEFAULT_MAX_BYTES, CompileCache
+    if args.cache_size is None:
+        return CompileCache(args.cache_dir, DEFAULT_MAX_BYTES)
+    return CompileCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+
+def compile_cached(args: argparse.Namespace,
+                   text: str,
+                   asm_file_output: str,
+                   bin_file_output: str,
+                   timer: 'PassTimer | None' = None) -> None:
+    """Reuses the outputs of an earlier compile of the same
+       preprocessed text, or compiles it and stores the outputs
+    """
+    import cache
+    from compiler import Compilation
+    compile_cache = open_cache(args)
+    options = compile_options(args)
+    with timed(timer, 'cache lookup') as record:
+        key = compile_cache.key(text, {
+            'assembler': cache.assembler_version(),
+            'opt_level': str(options.opt_level),
+            'disabled_passes': ','.join(sorted(options.disabled_passes))})
+        hit = compile_cache.copy_out(key, 'bin', bin_file_output)
+        if hit and args.save_asm:
+            hit = compile_cache.copy_out(key, 's', asm_file_output)
+        compile_cache.record(hit)
+    if record is not None:
+        record.counts['hits'] = int(hit)
+    if hit:
+        return
+    asm_text = Compilation(options, timer).compile_source(text)
+    compile_cache.put_text(key, 's', asm_text)
+    assemble(args, write_text(asm_text), asm_file_output, bin_file_output,
+             timer)
+    compile_cache.put(key, 'bin', bin_file_output)
+
+
+def compile_file(args: argparse.Namespace, filepath: str) -> FileResult:
+    """Compiles one file, returning an error message if it failed.
+       Errors are returned rather than raised so that one bad file
+       does not stop the rest of a batch. Printed passes are returned
+       too, a worker's own stderr may not be where the user is looking
+    """
+    timer = None
+    if args.time_passes:
+        from timing import PassTimer
+        timer = PassTimer()
+    dump = None
+    if args.print_after:
+        import io
+        dump = io.StringIO()
+    try:
+        compile_path(args, filepath, timer, dump)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    else:
+        error = None
+    return FileResult(error, timer and timer.as_dict(),
+                      dump and dump.getvalue())
+
+
+def compile_files(args: argparse.Namespace,
+                  filepaths: list[str]) -> list[FileResult]:
+    """Compiles every file, in parallel when more than one job is allowed.
+       Results are in the order of filepaths however the work is split
+    """
+    jobs = args.jobs or os.cpu_count() or 1
+    jobs = min(jobs, len(filepaths))
+    if jobs <= 1:
+        return [compile_file(args, filepath) for filepath in filepaths]
+    import functools
+    from concurrent.futures import ProcessPoolExecutor
+    work = functools.partial(compile_file, args)
+    # Hand out files in chunks, one per task is dominated by IPC
+    # for the small programs this usually compiles
+    chunksize = max(1, len(filepaths) // (jobs * 8))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(work, filepaths, chunksize=chunksize))
+
+
+def arg_parser(prog: str | None = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog=prog)
+    group = parser.add_mutually_exclusive_group()
+
+    group.add_argument('--lex', action='store_true')
+    group.add_argument('--parse', action='store_true')
+    group.add_argument('--codegen', action='store_true')
+    group.add_argument('--tacky', action='store_true')
+    group.add_argument('--validate', action='store_true')
+
+    parser.add_argument('--cpp', choices=('builtin', 'gcc'),
+                        default='builtin',
+                        help='preprocess in process or with gcc -E')
+    parser.add_argument('-I', dest='include_dirs', action='append',
+                        default=[], metavar='DIR')
+    parser.add_argument('-D', dest='defines', action='append',
+                        default=[], metavar='NAME[=VALUE]')
+    parser.add_argument('--save-asm', action='store_true',
+                        help='write the assembly to a .s file instead of '
+                        'piping it to the assembler')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N',
+                        help='compile files in N worker processes, '
+                        '0 for one per CPU')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='reuse outputs of earlier compiles of the '
+                        'same preprocessed source')
+    parser.add_argument('--cache-size', type=int, metavar='MB',
+                        help='size limit, 256 by default')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='print cache hits, misses and size')
+    parser.add_argument('--time-passes', action='store_const', const='text',
+                        help='print time and item counts for each pass '
+                        'to stderr')
+    parser.add_argument('--time-passes-json', action='store_const',
+                        const='json', dest='time_passes',
+                        help='print the same report as JSON to stdout')
+    parser.add_argument('-O', dest='opt_level', type=int, default=0,
+                        choices=(0, 1, 2),
+                        help='optimization level, 2 repeats the passes '
+                        'until nothing changes')
+    parser.add_argument('--disable-pass', dest='disabled_passes',
+                        action='append', default=[], metavar='PASS',
+                        help='skip PASS and the passes that require it')
+    parser.add_argument('--print-after', action='append', default=[],
+                        metavar='PASS',
+                        help='print the function to stderr after each '
+                        'run of PASS')
+    parser.add_argument('filepaths', type=str, nargs='+', metavar='filepath')
+    return parser
+
+
+def parse_args(parser: argparse.ArgumentParser,
+               argv: list[str] | None = None) -> argparse.Namespace:
+    """Parses argv, reporting unknown pass names and --print-after of a
+       pass that will not run as usage errors
+    """
+    args = parser.parse_args(argv)
+    if args.disabled_passes or args.print_after:
+        import passes
+        try:
+            passes.check_names(args.disabled_passes + args.print_after)
+        except ValueError as e:
+            parser.error(str(e))
+        scheduled = passes.scheduled_names(args.opt_level,
+                                           frozenset(args.disabled_passes))
+        idle = sorted(set(args.print_after) - scheduled)
+        if idle:
+            parser.error(f'--print-after {", ".join(idle)}: '
+                         f'not run at -O{args.opt_level}')
+    return args
+
+
+def handle_args(argv: list[str] | None = None) -> int:
+    args = parse_args(arg_parser(), argv)
+    results = compile_files(args, args.filepaths)
+    report_passes(args, results, sys.stdout, sys.stderr)
+    if args.cache_stats and args.cache_dir:
+        print(cache_report(open_cache(args)))
+    return report_errors(args.filepaths, results, sys.stderr)
+
+
+def report_errors(filepaths: list[str],
+                  results: list[FileResult],
+                  output: TextIO) -> int:
+    """Prints one line per failed file and returns the exit status"""
+    for filepath, result in zip(filepaths, results):
+        if result.error is not None:
+            print(f'{filepath}: {result.error}', file=output)
+    return 1 if any(result.error is not None for result in results) else 0
+
+
+def report_passes(args: argparse.Namespace,
+                  results: list[FileResult],
+                  stdout: TextIO,
+                  stderr: TextIO) -> None:
+    for result in results:
+        if result.dump:
+            stderr.write(result.dump)
+    if args.time_passes == 'json':
+        import json
+        reports = [{'file': filepath, **(result.passes or {})}
+                   for filepath, result in zip(args.filepaths, results)]
+        print(json.dumps(reports, indent=2), file=stdout)
+    elif args.time_passes:
+        from timing import format_report
+        for filepath, result in zip(args.filepaths, results):
+            if result.passes is not None:
+                print(f'{filepath}:', file=stderr)
+                print(format_report(result.passes), file=stderr)
+
+
+def cache_report(compile_cache: 'CompileCache') -> str:
+    stats = compile_cache.stats()
+    return (f'cache: {stats["hits"]} hits, {stats["misses"]} misses, '
+            f'{stats["evictions"]} evictions, {stats["entries"]} entries, '
+            f'{stats["bytes"]} bytes')
+
+
 if __name__ == '__main__':
-    handle_args()
+    sys.exit(handle_args())
@@ -1,261 +1,250 @@
-from dataclasses import dataclass
+import mmap
+import os
+import re
+from array import array
+from collections.abc import Iterable, Sequence
 from itertools import takewhile
 from string import ascii_letters, digits, whitespace
 from typing import Generator
 
 
-@dataclass
-class TkOpenBrace:
+# Tokens are plain classes rather than dataclasses, generating dataclass
+# methods for every kind made up most of the cost of importing the lexer.
+# They compare, print and match the same way the dataclasses did
+class ValuelessToken:
+    """Base for tokens that carry no value, such as punctuators"""
+    __match_args__ = ()
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is self.__class__:
+            return True
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f'{type(self).__qualname__}()'
+
+
+class ValueToken:
+    """Base for tokens that carry their source text"""
+    __match_args__ = ('val',)
+
+    def __init__(self, val: str) -> None:
+        self.val = val
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is self.__class__:
+            return self.val == other.val  # type: ignore[attr-defined]
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f'{type(self).__qualname__}(val={self.val!r})'
+
+
+class TkOpenBrace(ValuelessToken):
     pass
 
 
-@dataclass
-class TkCloseBrace:
+class TkCloseBrace(ValuelessToken):
     pass
 
 
-@dataclass
-class TkOpenParenthesis:
+class TkOpenParenthesis(ValuelessToken):
     pass
 
 
-@dataclass
-class TkCloseParenthesis:
+class TkCloseParenthesis(ValuelessToken):
     pass
 
 
-@dataclass
-class TkSemicolon:
+class TkSemicolon(ValuelessToken):
     pass
 
 
-@dataclass
-class TkColon:
+class TkColon(ValuelessToken):
     pass
 
 
-@dataclass
-class TkSingleQuote:
+class TkSingleQuote(ValuelessToken):
     pass
 
 
-@dataclass
-class TkComma:
+class TkComma(ValuelessToken):
     pass
 
 
-@dataclass
-class TkMinus:
+class TkMinus(ValuelessToken):
     pass
 
 
-@dataclass
-class TkDecrement:
+class TkDecrement(ValuelessToken):
     pass
 
 
-@dataclass
-class TkTilde:
+class TkTilde(ValuelessToken):
     pass
 
 
-@dataclass
-class TkForwardSlash:
+class TkForwardSlash(ValuelessToken):
     pass
 
 
-@dataclass
-class TkAsterisk:
+class TkAsterisk(ValuelessToken):
     pass
 
 
-@dataclass
-class TkBackSlash:
+class TkBackSlash(ValuelessToken):
     pass
 
 
-@dataclass
-class TkConstant:
+class TkConstant(ValueToken):
     val: str
 
 
-@dataclass
-class TkInt:
+class TkInt(ValuelessToken):
     pass
 
 
-@dataclass
-class TkVoid:
+class TkVoid(ValuelessToken):
     pass
 
 
-@dataclass
-class TkReturn:
+class TkReturn(ValuelessToken):
     pass
 
 
-@dataclass
-class TkIdentifier:
+class TkIdentifier(ValueToken):
     val: str
 
 
-@dataclass
-class TkPlus:
+class TkPlus(ValuelessToken):
     pass
 
 
-@dataclass
-class TkPercent:
+class TkPercent(ValuelessToken):
     pass
 
 
-@dataclass
-class TkLessThan:
+class TkLessThan(ValuelessToken):
     pass
 
 
-@dataclass
-class TkLessEqual:
+class TkLessEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkGreaterThan:
+class TkGreaterThan(ValuelessToken):
     pass
 
 
-@dataclass
-class TkGreaterEqual:
+class TkGreaterEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkLShift:
+class TkLShift(ValuelessToken):
     pass
 
 
-@dataclass
-class TkRShift:
+class TkRShift(ValuelessToken):
     pass
 
 
-@dataclass
-class TkLAnd:
+class TkLAnd(ValuelessToken):
     pass
 
 
-@dataclass
-class TkBAnd:
+class TkBAnd(ValuelessToken):
     pass
 
 
-@dataclass
-class TkLOr:
+class TkLOr(ValuelessToken):
     pass
 
 
-@dataclass
-class TkBOr:
+class TkBOr(ValuelessToken):
     pass
 
 
-@dataclass
-class TkXor:
+class TkXor(ValuelessToken):
     pass
 
 
-@dataclass
-class TkEqual:
+class TkEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkDEqual:
+class TkDEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkNot:
+class TkNot(ValuelessToken):
     pass
 
 
-@dataclass
-class TkNotEqual:
+class TkNotEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkPlusEqual:
+class TkPlusEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkSubEqual:
+class TkSubEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkMulEqual:
+class TkMulEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkDivEqual:
+class TkDivEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkModEqual:
+class TkModEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkBAndEqual:
+class TkBAndEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkBOrEqual:
+class TkBOrEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkXorEqual:
+class TkXorEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkLSEqual:
+class TkLSEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkRSEqual:
+class TkRSEqual(ValuelessToken):
     pass
 
 
-@dataclass
-class TkIncrement:
+class TkIncrement(ValuelessToken):
     pass
 
 
-@dataclass
-class TkQuestion:
+class TkQuestion(ValuelessToken):
     pass
 
 
-@dataclass
-class TkIf:
+class TkIf(ValuelessToken):
     pass
 
 
-@dataclass
-class TkElse:
+class TkElse(ValuelessToken):
     pass
 
 
-@dataclass
-class TkGoto:
+class TkGoto(ValuelessToken):
     pass
 
 
@@ -529,8 +518,344 @@ def tokenize_string(line: str) -> Generator[Token]:
                 raise ValueError(f'Unkown token prefix {item}')
 
 
-def tokenize_file(filepath: str) -> list[Token]:
-    with open(filepath, 'r') as f:
-        result = [t for line in f for t in tokenize_string(line)]
-        # result = list(chain(*(tokenize_string(line) for line in f)))
-        return result
+# Keyword and punctuator lookup tables for the single pass scanner
+KEYWORDS: dict[str, type] = {'int': TkInt,
+                             'void': TkVoid,
+                             'return': TkReturn,
+                             'if': TkIf,
+                             'else': TkElse,
+                             'goto': TkGoto}
+
+PUNCTUATORS: dict[str, type] = {'(': TkOpenParenthesis,
+                                ')': TkCloseParenthesis,
+                                '{': TkOpenBrace,
+                                '}': TkCloseBrace,
+                                ';': TkSemicolon,
+                                ':': TkColon,
+                                ',': TkComma,
+                                '~': TkTilde,
+                                '?': TkQuestion,
+                                '\'': TkBackSlash,
+                                '+': TkPlus,
+                                '++': TkIncrement,
+                                '+=': TkPlusEqual,
+                                '-': TkMinus,
+                                '--': TkDecrement,
+                                '-=': TkSubEqual,
+                                '*': TkAsterisk,
+                                '*=': TkMulEqual,
+                                '/': TkForwardSlash,
+                                '/=': TkDivEqual,
+                                '%': TkPercent,
+                                '%=': TkModEqual,
+                                '<': TkLessThan,
+                                '<=': TkLessEqual,
+                                '<<': TkLShift,
+                                '<<=': TkLSEqual,
+                                '>': TkGreaterThan,
+                                '>=': TkGreaterEqual,
+                                '>>': TkRShift,
+                                '>>=': TkRSEqual,
+                                '&': TkBAnd,
+                                '&&': TkLAnd,
+                                '&=': TkBAndEqual,
+                                '|': TkBOr,
+                                '||': TkLOr,
+                                '|=': TkBOrEqual,
+                                '^': TkXor,
+                                '^=': TkXorEqual,
+                                '=': TkEqual,
+                                '==': TkDEqual,
+                                '!': TkNot,
+                                '!=': TkNotEqual}
+
+
+def master_pattern() -> str:
+    """Builds the single regex used to scan a whole buffer.
+       Leading whitespace is folded into every match, alternatives are
+       ordered so that comments win over '/', and punctuators are sorted
+       longest first for longest-match
+    """
+    punct = '|'.join(re.escape(p)
+                     for p in sorted(PUNCTUATORS, key=len, reverse=True))
+    return (r'[ \t\n\r\x0b\x0c]*(?:'
+            r'(?P<comment>//[^\n]*)'
+            r'|(?P<constant>[0-9]+(?![A-Za-z]))'
+            r'|(?P<bad_constant>[0-9]+[A-Za-z][A-Za-z0-9_]*)'
+            r'|(?P<word>[A-Za-z_][A-Za-z0-9_]*)'
+            f'|(?P<punct>{punct})'
+            r'|(?P<end>\Z)'
+            r'|(?P<error>.))')
+
+
+MASTER_PATTERN = re.compile(master_pattern(), re.DOTALL)
+MASTER_PATTERN_BYTES = re.compile(master_pattern().encode(), re.DOTALL)
+
+
+def tokenize_buffer(text: str) -> Generator[Token]:
+    """Scans the whole buffer once, yielding the same tokens
+       as running tokenize_string over each line
+    """
+    keywords = KEYWORDS
+    punctuators = PUNCTUATORS
+    for m in MASTER_PATTERN.finditer(text):
+        match kind := m.lastgroup:
+            case 'comment' | 'end':
+                continue
+            case 'punct':
+                yield punctuators[m.group(kind)]()
+            case 'word':
+                word = m.group(kind)
+                keyword = keywords.get(word)
+                yield TkIdentifier(word) if keyword is None else keyword()
+            case 'constant':
+                yield TkConstant(m.group(kind))
+            case 'bad_constant':
+                raise ValueError(
+                    f'Invalid constant stuffix {m.group(kind)}')
+            case _:
+                raise ValueError(f'Unkown token prefix {m.group(kind)}')
+
+
+# Small integer codes for each token kind, in the order of Token
+TOKEN_KINDS: tuple[type, ...] = Token.__args__
+KIND_CODES: dict[type, int] = {k: i for i, k in enumerate(TOKEN_KINDS)}
+CODE_IDENTIFIER = KIND_CODES[TkIdentifier]
+CODE_CONSTANT = KIND_CODES[TkConstant]
+
+# Tokens without a value carry no state, so one shared instance per kind
+# is handed out instead of allocating a new one per token
+SINGLETONS: tuple[Token | None, ...] = tuple(
+    None if k in (TkIdentifier, TkConstant) else k() for k in TOKEN_KINDS)
+
+
+class TokenStream(Sequence):
+    """Array backed token storage.
+       Kinds are stored as one byte codes with start and end offsets in
+       parallel arrays. Identifier and constant text lives in a side table
+       that values indexes into.
+    """
+
+    def __init__(self) -> None:
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.values = array('I')
+        self.text: list[str] = ['']
+        self.text_index: dict[str | bytes, int] = {'': 0}
+
+    def intern(self, raw: str | bytes) -> int:
+        """Returns the side table index of raw, adding it if needed.
+           Raw bytes are only decoded the first time they are seen
+        """
+        value = self.text_index.get(raw)
+        if value is None:
+            value = len(self.text)
+            self.text.append(raw if isinstance(raw, str)
+                             else raw.decode('ascii'))
+            self.text_index[raw] = value
+        return value
+
+    def append(self, code: int, start: int, end: int,
+               text: str | None = None) -> None:
+        self.kinds.append(code)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.values.append(0 if text is None else self.intern(text))
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index.__class__ is slice:
+            return [self[i] for i in range(*index.indices(len(self)))]
+        code = self.kinds[index]
+        token = SINGLETONS[code]
+        if token is not None:
+            return token
+        return TOKEN_KINDS[code](self.text[self.values[index]])
+
+    def kind(self, index: int) -> type:
+        return TOKEN_KINDS[self.kinds[index]]
+
+    def value(self, index: int) -> str:
+        return self.text[self.values[index]]
+
+
+def scan_into(stream: TokenStream,
+              matches,
+              keywords: dict,
+              punctuators: dict) -> TokenStream:
+    """Appends master pattern matches to stream.
+       Works for both str and bytes matches, the tables are keyed to match
+    """
+    # Bound methods hoisted out of the loop, this is the lexer hot path
+    kinds = stream.kinds.append
+    starts = stream.starts.append
+    ends = stream.ends.append
+    values = stream.values.append
+    intern = stream.intern
+    for m in matches:
+        match kind := m.lastgroup:
+            case 'comment' | 'end':
+                continue
+            case 'punct':
+                kinds(punctuators[m.group(kind)])
+                values(0)
+            case 'word':
+                word = m.group(kind)
+                code = keywords.get(word)
+                if code is None:
+                    kinds(CODE_IDENTIFIER)
+                    values(intern(word))
+                else:
+                    kinds(code)
+                    values(0)
+            case 'constant':
+                kinds(CODE_CONSTANT)
+                values(intern(m.group(kind)))
+            case 'bad_constant':
+                raise ValueError(
+                    f'Invalid constant stuffix {m.group(kind)!s}')
+            case _:
+                raise ValueError(f'Unkown token prefix {m.group(kind)!s}')
+        start, end = m.span(kind)
+        starts(start)
+        ends(end)
+    return stream
+
+
+KEYWORD_CODES = {k: KIND_CODES[v] for k, v in KEYWORDS.items()}
+PUNCTUATOR_CODES = {k: KIND_CODES[v] for k, v in PUNCTUATORS.items()}
+KEYWORD_BYTE_CODES = {k.encode(): v for k, v in KEYWORD_CODES.items()}
+PUNCTUATOR_BYTE_CODES = {k.encode(): v for k, v in PUNCTUATOR_CODES.items()}
+
+
+def tokenize_stream(text: str) -> TokenStream:
+    """Same scan as tokenize_buffer, but straight into a TokenStream"""
+    return scan_into(TokenStream(),
+                     MASTER_PATTERN.finditer(text),
+                     KEYWORD_CODES,
+                     PUNCTUATOR_CODES)
+
+
+def tokenize_bytes(buffer) -> TokenStream:
+    """Scans any bytes-like buffer without decoding it up front.
+       Only identifier and constant text is sliced out and decoded
+    """
+    return scan_into(TokenStream(),
+                     MASTER_PATTERN_BYTES.finditer(buffer),
+                     KEYWORD_BYTE_CODES,
+                     PUNCTUATOR_BYTE_CODES)
+
+
+def tokenize_mmap(filepath: str) -> TokenStream:
+    with open(filepath, 'rb') as f:
+        # mmap refuses to map an empty file
+        if os.fstat(f.fileno()).st_size == 0:
+            return TokenStream()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return tokenize_bytes(buffer)
+
+
+def tokenize_file(filepath: str, use_mmap: bool = False) -> TokenStream:
+    """Reads and scans the whole file as text. The mmap bytes scan only
+       wins on short lines and loses on long ones, see bench_lexer, so
+       it is used only when asked for
+    """
+    if use_mmap:
+        return tokenize_mmap(filepath)
+    with open(filepath) as f:
+        return tokenize_stream(f.read())
+
+
+def scan_tokens(matches,
+                keywords: dict,
+                punctuators: dict) -> Generator[Token]:
+    """Lazily turns bytes master pattern matches into tokens"""
+    for m in matches:
+        match kind := m.lastgroup:
+            case 'comment' | 'end':
+                continue
+            case 'punct':
+                yield SINGLETONS[punctuators[m.group(kind)]]
+            case 'word':
+                word = m.group(kind)
+                code = keywords.get(word)
+                if code is None:
+                    yield TkIdentifier(word.decode('ascii'))
+                else:
+                    yield SINGLETONS[code]
+            case 'constant':
+                yield TkConstant(m.group(kind).decode('ascii'))
+            case 'bad_constant':
+                raise ValueError(
+                    f'Invalid constant stuffix {m.group(kind)!s}')
+            case _:
+                raise ValueError(f'Unkown token prefix {m.group(kind)!s}')
+
+
+def stream_file(filepath: str) -> Generator[Token]:
+    """Yields the tokens of a file one at a time while it stays mapped.
+       Nothing but the current token is kept, so the caller decides
+       how much of the stream lives in memory
+    """
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            matches = MASTER_PATTERN_BYTES.finditer(buffer)
+            try:
+                yield from scan_tokens(matches,
+                                       KEYWORD_BYTE_CODES,
+                                       PUNCTUATOR_BYTE_CODES)
+            finally:
+                # The scanner holds a view of the mapping,
+                # which has to be released before it can close
+                del matches
+
+
+def tokenize_lines(lines: Iterable[str]) -> Generator[Token]:
+    """Yields the tokens of each line as soon as it is produced,
+       so a line source such as the preprocessor feeds the parser
+       without building the whole text first
+    """
+    for line in lines:
+        yield from tokenize_buffer(line)
+
+
+class LookaheadError(RuntimeError):
+    """The parser asked for a token that has left the window"""
+
+
+class TokenWindow:
+    """Indexable view over a token iterator backed by a ring buffer.
+       Tokens are pulled from the iterator on demand and only the last
+       capacity tokens are kept, which bounds how far back the parser
+       may look.
+    """
+
+    def __init__(self, tokens: Iterable[Token], capacity: int = 64) -> None:
+        self.tokens = iter(tokens)
+        self.capacity = capacity
+        self.ring: list[Token | None] = [None] * capacity
+        self.pulled = 0
+        self.exhausted = False
+
+    def __getitem__(self, index: int) -> Token:
+        while index >= self.pulled:
+            if self.exhausted:
+                raise IndexError(f'Token {index} is past the end')
+            token = next(self.tokens, None)
+            if token is None:
+                self.exhausted = True
+                raise IndexError(f'Token {index} is past the end')
+            self.ring[self.pulled % self.capacity] = token
+            self.pulled += 1
+        if index < 0 or index < self.pulled - self.capacity:
+            raise LookaheadError(f'Token {index} is no longer in the '
+                                 f'lookahead window of {self.capacity}')
+        return self.ring[index % self.capacity]
+
+
+Tokens = Sequence[Token] | TokenWindow
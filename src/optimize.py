@@ -0,0 +1,257 @@
+"""Optimizations over the instructions of one function.
+
+Each pass rewrites the list it is given in place and returns whether
+it changed anything, passes.py decides which of them run and when.
+"""
+import asm
+import tacky
+
+
+INT_MIN = -2 ** 31
+
+
+def wrap(x: int) -> int:
+    """x as a 32 bit two's complement int"""
+    return (x - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+def divide(a: int, b: int) -> int:
+    """C division, which truncates toward zero"""
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def fold_unary(operator: tacky.Unary_Operator, x: int) -> int:
+    # Literals keep whatever value was written, an int holds 32 bits
+    x = wrap(x)
+    match operator:
+        case tacky.Unary_Operator.NEGATION:
+            return wrap(-x)
+        case tacky.Unary_Operator.COMPLEMENT:
+            return wrap(~x)
+        case tacky.Unary_Operator.NOT:
+            return int(x == 0)
+        case _:
+            raise RuntimeError(f'Unhandled unary operator {operator}')
+
+
+def fold_binary(operator: tacky.Bin_Op, a: int, b: int) -> int | None:
+    """The value of a operator b, or None when it is left to run time.
+       Division by zero, INT_MIN / -1 and shifts outside 0 to 31 are
+       undefined, folding them would hide the fault
+    """
+    a, b = wrap(a), wrap(b)
+    match operator:
+        case tacky.Bin_Op.ADD:
+            return wrap(a + b)
+        case tacky.Bin_Op.SUBTRACT:
+            return wrap(a - b)
+        case tacky.Bin_Op.MULTIPLY:
+            return wrap(a * b)
+        case (tacky.Bin_Op.DIVIDE
+              | tacky.Bin_Op.REMAINDER) if b == 0 or (a, b) == (INT_MIN, -1):
+            return None
+        case tacky.Bin_Op.DIVIDE:
+            return divide(a, b)
+        case tacky.Bin_Op.REMAINDER:
+            return a - b * divide(a, b)
+        case (tacky.Bin_Op.LEFT_SHIFT
+              | tacky.Bin_Op.RIGHT_SHIFT) if not 0 <= b < 32:
+            return None
+        case tacky.Bin_Op.LEFT_SHIFT:
+            return wrap(a << b)
+        case tacky.Bin_Op.RIGHT_SHIFT:
+            # Arithmetic, like the sar it would compile to
+            return a >> b
+        case tacky.Bin_Op.BITW_AND:
+            return a & b
+        case tacky.Bin_Op.BITW_OR:
+            return a | b
+        case tacky.Bin_Op.XOR:
+            return a ^ b
+        case tacky.Bin_Op.EQUAL:
+            return int(a == b)
+        case tacky.Bin_Op.NOT_EQUAL:
+            return int(a != b)
+        case tacky.Bin_Op.LESS_THAN:
+            return int(a < b)
+        case tacky.Bin_Op.LESS_EQUAL:
+            return int(a <= b)
+        case tacky.Bin_Op.GREATER_THAN:
+            return int(a > b)
+        case tacky.Bin_Op.GREATER_EQUAL:
+            return int(a >= b)
+        case _:
+            raise RuntimeError(f'Unhandled binary operator {operator}')
+
+
+def fold_constants(instructions: list[tacky.Instruction]) -> bool:
+    """Evaluates operators whose operands are constants and turns
+       conditional jumps on constants into a Jump or nothing.
+       Variables known to hold a constant are replaced by it up to the
+       next label, where another path may join with a different value
+    """
+    known: dict[tacky.Var, tacky.Constant] = {}
+
+    def value(val: tacky.Val) -> tacky.Val:
+        """val, or the constant it holds, as a 32 bit int"""
+        match val:
+            case tacky.Var():
+                return known.get(val, val)
+            case tacky.Constant(x):
+                return tacky.Constant(wrap(x))
+        return val
+
+    def assign(dst: tacky.Val, val: tacky.Val) -> tacky.Instruction:
+        if isinstance(val, tacky.Constant):
+            known[dst] = val
+        else:
+            known.pop(dst, None)
+        return tacky.Copy(val, dst)
+
+    kept: list[tacky.Instruction] = []
+    changed = False
+    for instruction in instructions:
+        folded: tacky.Instruction | None = instruction
+        match instruction:
+            case tacky.Label():
+                known.clear()
+            case tacky.Return(val):
+                folded = tacky.Return(value(val))
+            case tacky.Copy(src, dst):
+                folded = assign(dst, value(src))
+            case tacky.Unary(operator, src, dst):
+                match value(src):
+                    case tacky.Constant(x):
+                        result = tacky.Constant(fold_unary(operator, x))
+                        folded = assign(dst, result)
+                    case operand:
+                        known.pop(dst, None)
+                        folded = tacky.Unary(operator, operand, dst)
+            case tacky.Binary(operator, src1, src2, dst):
+                src1 = value(src1)
+                match operator, value(src2):
+                    case ((tacky.Bin_Op.LEFT_SHIFT | tacky.Bin_Op.RIGHT_SHIFT),
+                          tacky.Constant(b)) if not 0 <= b < 32:
+                        # Kept in a variable, there is no immediate
+                        # form of an undefined shift count
+                        pass
+                    case _, count:
+                        src2 = count
+                result = None
+                match src1, src2:
+                    case tacky.Constant(a), tacky.Constant(b):
+                        result = fold_binary(operator, a, b)
+                if result is not None:
+                    folded = assign(dst, tacky.Constant(result))
+                else:
+                    known.pop(dst, None)
+                    folded = tacky.Binary(operator, src1, src2, dst)
+            case (tacky.JumpIfZero(condition, target)
+                  | tacky.JumpIfNotZero(condition, target)):
+                match value(condition):
+                    case tacky.Constant(x):
+                        jumps = (x == 0) == isinstance(instruction,
+                                                       tacky.JumpIfZero)
+                        folded = tacky.Jump(target) if jumps else None
+                    case operand:
+                        folded = type(instruction)(operand, target)
+        if folded != instruction:
+            changed = True
+        if folded is not None:
+            kept.append(folded)
+    if changed:
+        instructions[:] = kept
+    return changed
+
+
+def remove_dead_stores(instructions: list[tacky.Instruction]) -> bool:
+    """Drops the instructions that compute a variable nothing reads.
+       Divisions stay, removing one could remove a fault
+    """
+    read: set[tacky.Val] = set()
+    for instruction in instructions:
+        match instruction:
+            case (tacky.Return(val)
+                  | tacky.Copy(val, _)
+                  | tacky.Unary(_, val, _)
+                  | tacky.JumpIfZero(val, _)
+                  | tacky.JumpIfNotZero(val, _)):
+                read.add(val)
+            case tacky.Binary(_, src1, src2, _):
+                read.add(src1)
+                read.add(src2)
+    kept: list[tacky.Instruction] = []
+    for instruction in instructions:
+        match instruction:
+            case tacky.Binary(tacky.Bin_Op.DIVIDE | tacky.Bin_Op.REMAINDER):
+                pass
+            case (tacky.Copy(_, dst)
+                  | tacky.Unary(_, _, dst)
+                  | tacky.Binary(_, _, _, dst)) if dst not in read:
+                continue
+        kept.append(instruction)
+    if len(kept) == len(instructions):
+        return False
+    instructions[:] = kept
+    return True
+
+
+def remove_unreachable(instructions: list[tacky.Instruction]) -> bool:
+    """Drops instructions after a Jump or Return up to the next label
+       that some jump targets
+    """
+    targets = {instruction.target for instruction in instructions
+               if isinstance(instruction, (tacky.Jump, tacky.JumpIfZero,
+                                           tacky.JumpIfNotZero))}
+    kept: list[tacky.Instruction] = []
+    reachable = True
+    for instruction in instructions:
+        match instruction:
+            case tacky.Label(identifier) if identifier in targets:
+                reachable = True
+            case _ if not reachable:
+                continue
+            case tacky.Jump() | tacky.Return():
+                reachable = False
+        kept.append(instruction)
+    if len(kept) == len(instructions):
+        return False
+    instructions[:] = kept
+    return True
+
+
+def remove_jumps_to_next(instructions: list[tacky.Instruction]) -> bool:
+    """Drops jumps to the label that directly follows them"""
+    kept: list[tacky.Instruction] = []
+    for instruction, following in zip(instructions,
+                                      [*instructions[1:], None]):
+        match instruction, following:
+            case ((tacky.Jump(target)
+                   | tacky.JumpIfZero(_, target)
+                   | tacky.JumpIfNotZero(_, target)),
+                  tacky.Label(identifier)) if target == identifier:
+                # The condition is a value, checking it has no effect
+                continue
+        kept.append(instruction)
+    if len(kept) == len(instructions):
+        return False
+    instructions[:] = kept
+    return True
+
+
+def remove_store_load(instructions: list[asm.Instruction]) -> bool:
+    """Drops a Mov that copies back what the Mov before it just
+       copied, the two locations already hold the same value
+    """
+    kept: list[asm.Instruction] = []
+    for instruction in instructions:
+        match instruction:
+            case asm.Mov(size, src, dst) if (
+                    kept and kept[-1] == asm.Mov(size, dst, src)):
+                continue
+        kept.append(instruction)
+    if len(kept) == len(instructions):
+        return False
+    instructions[:] = kept
+    return True
@@ -6,12 +6,12 @@ import lexer
 from utility import Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Constant:
     val: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Var:
     identifier: Identifier
 
@@ -57,39 +57,39 @@ class Bin_Op(Enum):
     RS_ASSIGN = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Unary:
     unary_operator: Unary_Operator
     exp: 'Expression'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Binary:
     binary_operator: Bin_Op
     left: 'Expression'
     right: 'Expression'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Assignment:
     left: 'Expression'
     right: 'Expression'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CompoundAssign:
     binary_operator: Bin_Op
     left: 'Expression'
     right: 'Expression'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Postfix:
     increment: bool
     exp: 'Expression'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Conditional:
     condition: 'Expression'
     t: 'Expression'
@@ -100,12 +100,12 @@ Expression = (Constant | Var | Unary | Binary | Assignment
               | CompoundAssign | Postfix | Conditional)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Return:
     exp: Expression
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ExpNode:
     exp: Expression
 
@@ -114,36 +114,36 @@ class ExpNode:
 # Until I figure out what I did wrong, I am declaring them seperate
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class If:
     condition: Expression
     then: 'Statement'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class IfElse:
     condition: Expression
     then: 'Statement'
     otherwise: 'Statement'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Null:
     pass
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Label:
     id: Identifier
     stm: 'Statement'
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Goto:
     id: Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Compound:
     block: 'Block'
 
@@ -158,7 +158,7 @@ Statement = (Return
              | Compound)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DeclareNode:
     name: Identifier
     exp: Expression | None = None
@@ -167,12 +167,12 @@ class DeclareNode:
 type Declaration = DeclareNode
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class S:
     statement: Statement
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class D:
     declaration: Declaration
 
@@ -180,109 +180,138 @@ class D:
 Block_Item = S | D
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Block:
     block_items: list[Block_Item]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Function:
     name: Identifier
     body: Block
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Program:
     function_definition: Function
 
 
+def peek_tk(tokens: lexer.Tokens, index: int) -> lexer.Token | None:
+    """Returns the token at index, or None once past the last token.
+       Bounds are found by indexing rather than len so that streamed
+       tokens work the same as a list
+    """
+    try:
+        return tokens[index]
+    except IndexError:
+        return None
+
+
 def expect_tk(kind: Type,
-              tokens: list[lexer.Token],
+              tokens: lexer.Tokens,
               index: int, verbosity=False) -> bool:
-    if (index >= len(tokens)):
+    if isinstance(tokens, lexer.TokenStream) and not verbosity:
+        # Compare the stored kind code without building a token
+        return (index < len(tokens)
+                and issubclass(tokens.kind(index), kind))
+
+    token = peek_tk(tokens, index)
+    if token is None:
         return False
 
-    if (isinstance(tokens[index], kind)):
+    if (isinstance(token, kind)):
         return True
     if verbosity:
         print("DEBUG:")
         print(f"  Expected type: {kind} (from module: {kind.__module__})")
-        print(f"  Actual value: {tokens[index]}")
-        print(f"  Actual type: {type(tokens[index])} \
-        (from module: {type(tokens[index]).__module__})")
-        print(repr(tokens[index]))
-        print(type(tokens[index]))
+        print(f"  Actual value: {token}")
+        print(f"  Actual type: {type(token)} \
+        (from module: {type(token).__module__})")
+        print(repr(token))
+        print(type(token))
 
-        print(f"  isinstance result: {isinstance(tokens[index], kind)}")
+        print(f"  isinstance result: {isinstance(token, kind)}")
     return False
 
 
+class Op_Kind(Enum):
+    BINARY = auto()
+    ASSIGN = auto()
+    COMPOUND = auto()
+    TERNARY = auto()
+
+
+@dataclass(frozen=True, slots=True)
+class Op_Info:
+    precedence: int
+    right_assoc: bool
+    bin_op: Bin_Op | None
+    kind: Op_Kind
+
+
+def _binary(prec: int, op: Bin_Op) -> Op_Info:
+    return Op_Info(prec, False, op, Op_Kind.BINARY)
+
+
+def _compound(op: Bin_Op) -> Op_Info:
+    return Op_Info(1, True, op, Op_Kind.COMPOUND)
+
+
+# Every binary, assignment and ternary operator keyed by token kind,
+# so the expression loop needs a single lookup per operator
+OPERATORS: dict[type, Op_Info] = {
+    lexer.TkAsterisk: _binary(50, Bin_Op.MULTIPLY),
+    lexer.TkForwardSlash: _binary(50, Bin_Op.DIVIDE),
+    lexer.TkPercent: _binary(50, Bin_Op.REMAINDER),
+    lexer.TkPlus: _binary(45, Bin_Op.ADD),
+    lexer.TkMinus: _binary(45, Bin_Op.SUBTRACT),
+    lexer.TkLShift: _binary(40, Bin_Op.LEFT_SHIFT),
+    lexer.TkRShift: _binary(40, Bin_Op.RIGHT_SHIFT),
+    lexer.TkLessThan: _binary(35, Bin_Op.LESS_THAN),
+    lexer.TkLessEqual: _binary(35, Bin_Op.LESS_EQUAL),
+    lexer.TkGreaterThan: _binary(35, Bin_Op.GREATER_THAN),
+    lexer.TkGreaterEqual: _binary(35, Bin_Op.GREATER_EQUAL),
+    lexer.TkDEqual: _binary(30, Bin_Op.EQUAL),
+    lexer.TkNotEqual: _binary(30, Bin_Op.NOT_EQUAL),
+    lexer.TkBAnd: _binary(25, Bin_Op.BIT_AND),
+    lexer.TkXor: _binary(20, Bin_Op.XOR),
+    lexer.TkBOr: _binary(15, Bin_Op.BIT_OR),
+    lexer.TkLAnd: _binary(10, Bin_Op.LOG_AND),
+    lexer.TkLOr: _binary(5, Bin_Op.LOG_OR),
+    lexer.TkQuestion: Op_Info(4, True, None, Op_Kind.TERNARY),
+    lexer.TkEqual: Op_Info(1, True, Bin_Op.ASSIGN, Op_Kind.ASSIGN),
+    lexer.TkPlusEqual: _compound(Bin_Op.ADD_ASSIGN),
+    lexer.TkSubEqual: _compound(Bin_Op.SUB_ASSIGN),
+    lexer.TkMulEqual: _compound(Bin_Op.MUL_ASSIGN),
+    lexer.TkDivEqual: _compound(Bin_Op.DIV_ASSIGN),
+    lexer.TkModEqual: _compound(Bin_Op.MOD_ASSIGN),
+    lexer.TkBAndEqual: _compound(Bin_Op.BAND_ASSIGN),
+    lexer.TkBOrEqual: _compound(Bin_Op.BOR_ASSIGN),
+    lexer.TkXorEqual: _compound(Bin_Op.XOR_ASSIGN),
+    lexer.TkLSEqual: _compound(Bin_Op.LS_ASSIGN),
+    lexer.TkRSEqual: _compound(Bin_Op.RS_ASSIGN),
+}
+
+
 def precedence(operator) -> int | None:
     # This takes tokens and gives the respective precedence
     # as if these were binary or ternary operators
     # Unary operators are handled elsewhere
-    match operator:
-        case (lexer.TkAsterisk()
-              | lexer.TkForwardSlash()
-              | lexer.TkPercent()):
-            return 50
-        case (lexer.TkPlus()
-              | lexer.TkMinus()):
-            return 45
-        case (lexer.TkLShift()
-              | lexer.TkRShift()):
-            return 40
-        case (lexer.TkLessThan()
-              | lexer.TkLessEqual()
-              | lexer.TkGreaterThan()
-              | lexer.TkGreaterEqual()):
-            return 35
-        case (lexer.TkDEqual()
-              | lexer.TkNotEqual()):
-            return 30
-        case lexer.TkBAnd():
-            return 25
-        case lexer.TkXor():
-            return 20
-        case lexer.TkBOr():
-            return 15
-        case lexer.TkLAnd():
-            return 10
-        case lexer.TkLOr():
-            return 5
-        case lexer.TkQuestion():
-            return 4
-        case (lexer.TkEqual()
-              | lexer.TkPlusEqual()
-              | lexer.TkSubEqual()
-              | lexer.TkMulEqual()
-              | lexer.TkDivEqual()
-              | lexer.TkModEqual()
-              | lexer.TkBAndEqual()
-              | lexer.TkBOrEqual()
-              | lexer.TkXorEqual()
-              | lexer.TkLSEqual()
-              | lexer.TkRSEqual()):
-            return 1
-        case _:
-            return None
+    info = OPERATORS.get(type(operator))
+    return None if info is None else info.precedence
 
 
-def parse_constant(t: list[lexer.Token],
+def parse_constant(t: lexer.Tokens,
                    index: int) -> tuple[Constant, int] | None:
-    if index >= len(t):
-        return None
-    match t[index]:
+    match peek_tk(t, index):
         case lexer.TkConstant(val):
             return Constant(val), index+1
         case _:
             return None
 
 
-def parse_var(t: list[lexer.Token],
+def parse_var(t: lexer.Tokens,
               index: int) -> tuple[Var, int] | None:
-    if index >= len(t):
-        return None
     result = parse_identifier(t, index)
     if result is None:
         return None
@@ -290,18 +319,16 @@ def parse_var(t: list[lexer.Token],
     return Var(id), index
 
 
-def parse_identifier(t: list[lexer.Token],
+def parse_identifier(t: lexer.Tokens,
                      index: int) -> tuple[Identifier, int] | None:
-    if index >= len(t):
-        return None
-    match t[index]:
+    match peek_tk(t, index):
         case lexer.TkIdentifier(val):
             return Identifier(val), index+1
         case _:
             return None
 
 
-def parse_return(t: list[lexer.Token],
+def parse_return(t: lexer.Tokens,
                  index: int) -> tuple[Return, int] | None:
     if not expect_tk(lexer.TkReturn, t, index):
         return None
@@ -316,7 +343,7 @@ def parse_return(t: list[lexer.Token],
     return (Return(expr), index)
 
 
-def parse_exprNode(t: list[lexer.Token],
+def parse_exprNode(t: lexer.Tokens,
                    index: int) -> tuple[ExpNode, int] | None:
     ret = parse_expr(t, index)
     if ret is None:
@@ -328,30 +355,29 @@ def parse_exprNode(t: list[lexer.Token],
     return (ExpNode(expr), index)
 
 
-def parse_uop(t: list[lexer.Token],
+UNARY_OPERATORS: dict[type, Unary_Operator] = {
+    lexer.TkTilde: Unary_Operator.COMPLEMENT,
+    lexer.TkMinus: Unary_Operator.NEGATION,
+    lexer.TkNot: Unary_Operator.NOT,
+    lexer.TkIncrement: Unary_Operator.INCREMENT,
+    lexer.TkDecrement: Unary_Operator.DECREMENT,
+}
+
+
+def parse_uop(t: lexer.Tokens,
               index: int) -> tuple[Unary_Operator, int] | None:
-    if index >= len(t):
+    uop = UNARY_OPERATORS.get(type(peek_tk(t, index)))
+    if uop is None:
         return None
-    match t[index]:
-        case lexer.TkTilde():
-            return Unary_Operator.COMPLEMENT, index+1
-        case lexer.TkMinus():
-            return Unary_Operator.NEGATION, index+1
-        case lexer.TkNot():
-            return Unary_Operator.NOT, index+1
-        case lexer.TkIncrement():
-            return Unary_Operator.INCREMENT, index+1
-        case lexer.TkDecrement():
-            return Unary_Operator.DECREMENT, index+1
-        case _:
-            return None
+    return uop, index+1
 
 
-def parse_statement(t: list[lexer.Token],
+def parse_statement(t: lexer.Tokens,
                     index: int) -> tuple[Statement, int] | None:
-    if (index >= len(t)):
+    token = peek_tk(t, index)
+    if token is None:
         return None
-    match t[index]:
+    match token:
         case lexer.TkSemicolon():
             return Null(), index+1
         case lexer.TkReturn():
@@ -384,13 +410,10 @@ def parse_statement(t: list[lexer.Token],
                     return IfElse(exp, stm, otherwise), index
             else:
                 return If(exp, stm), index
-        case lexer.TkIdentifier(val):
-            index += 1
-            if not expect_tk(lexer.TkColon, t, index):
-                # This might be a expression instead
-                # for example val + 1;
-                return parse_exprNode(t, index-1)
-            index += 1
+        case lexer.TkIdentifier(val) if expect_tk(lexer.TkColon, t, index+1):
+            # Without the colon this is an expression such as val + 1;
+            # which is left to the default case
+            index += 2
             stm_result = parse_statement(t, index)
             if stm_result is None:
                 return None
@@ -415,7 +438,7 @@ def parse_statement(t: list[lexer.Token],
             return parse_exprNode(t, index)
 
 
-def parse_declaration(t: list[lexer.Token],
+def parse_declaration(t: lexer.Tokens,
                       index: int) -> tuple[Declaration, int] | None:
     if not expect_tk(lexer.TkInt, t, index):
         return None
@@ -424,7 +447,7 @@ def parse_declaration(t: list[lexer.Token],
     if id_result is None:
         return None
     id, index = id_result
-    match t[index]:
+    match peek_tk(t, index):
         case lexer.TkSemicolon():
             return DeclareNode(id), index+1
         case lexer.TkEqual():
@@ -440,26 +463,34 @@ def parse_declaration(t: list[lexer.Token],
             return None
 
 
-def parse_block_item(t: list[lexer.Token],
+# FIRST set of a declaration, any other token has to start a statement.
+# One token of lookahead picks the production, so nothing is re-parsed
+DECLARATION_FIRST = (lexer.TkInt,)
+
+
+def parse_block_item(t: lexer.Tokens,
                      index: int) -> tuple[Block_Item, int] | None:
+    if isinstance(peek_tk(t, index), DECLARATION_FIRST):
+        d_result = parse_declaration(t, index)
+        if d_result is None:
+            return None
+        d, index = d_result
+        return D(d), index
     s_result = parse_statement(t, index)
-    if s_result is not None:
-        s, index = s_result
-        return S(s), index
-    d_result = parse_declaration(t, index)
-    if d_result is None:
+    if s_result is None:
         return None
-    d, index = d_result
-    return D(d), index
+    s, index = s_result
+    return S(s), index
 
 
-def parse_factor(t: list[lexer.Token],
+def parse_factor(t: lexer.Tokens,
                  index: int) -> tuple[Expression, int] | None:
-    def inner(t: list[lexer.Token],
+    def inner(t: lexer.Tokens,
               index: int) -> tuple[Expression, int] | None:
-        if (index >= len(t)):
+        token = peek_tk(t, index)
+        if token is None:
             return None
-        match t[index]:
+        match token:
             case lexer.TkConstant():
                 return parse_constant(t, index)
             case (lexer.TkMinus() | lexer.TkTilde() | lexer.TkNot()
@@ -495,7 +526,7 @@ def parse_factor(t: list[lexer.Token],
         return None
     factor, index = result
     while True:
-        peek = None if index > len(t) else t[index]
+        peek = peek_tk(t, index)
         match peek:
             case lexer.TkIncrement():
                 factor, index = Postfix(True, factor), index+1
@@ -506,73 +537,14 @@ def parse_factor(t: list[lexer.Token],
     return factor, index
 
 
-def parse_binop(t: list[lexer.Token], index: int) -> tuple[Bin_Op, int] | None:
-    if index >= len(t):
+def parse_binop(t: lexer.Tokens, index: int) -> tuple[Bin_Op, int] | None:
+    info = OPERATORS.get(type(peek_tk(t, index)))
+    if info is None or info.bin_op is None:
         return None
-    match t[index]:
-        case lexer.TkPlus():
-            return Bin_Op.ADD, index+1
-        case lexer.TkMinus():
-            return Bin_Op.SUBTRACT, index+1
-        case lexer.TkForwardSlash():
-            return Bin_Op.DIVIDE, index+1
-        case lexer.TkAsterisk():
-            return Bin_Op.MULTIPLY, index+1
-        case lexer.TkPercent():
-            return Bin_Op.REMAINDER, index+1
-        case lexer.TkLShift():
-            return Bin_Op.LEFT_SHIFT, index+1
-        case lexer.TkRShift():
-            return Bin_Op.RIGHT_SHIFT, index+1
-        case lexer.TkBAnd():
-            return Bin_Op.BIT_AND, index+1
-        case lexer.TkBOr():
-            return Bin_Op.BIT_OR, index+1
-        case lexer.TkXor():
-            return Bin_Op.XOR, index+1
-        case lexer.TkLAnd():
-            return Bin_Op.LOG_AND, index+1
-        case lexer.TkLOr():
-            return Bin_Op.LOG_OR, index+1
-        case lexer.TkEqual():
-            return Bin_Op.ASSIGN, index+1
-        case lexer.TkDEqual():
-            return Bin_Op.EQUAL, index+1
-        case lexer.TkNotEqual():
-            return Bin_Op.NOT_EQUAL, index+1
-        case lexer.TkLessThan():
-            return Bin_Op.LESS_THAN, index+1
-        case lexer.TkLessEqual():
-            return Bin_Op.LESS_EQUAL, index+1
-        case lexer.TkGreaterThan():
-            return Bin_Op.GREATER_THAN, index+1
-        case lexer.TkGreaterEqual():
-            return Bin_Op.GREATER_EQUAL, index+1
-        case lexer.TkPlusEqual():
-            return Bin_Op.ADD_ASSIGN, index+1
-        case lexer.TkSubEqual():
-            return Bin_Op.SUB_ASSIGN, index+1
-        case lexer.TkMulEqual():
-            return Bin_Op.MUL_ASSIGN, index+1
-        case lexer.TkDivEqual():
-            return Bin_Op.DIV_ASSIGN, index+1
-        case lexer.TkModEqual():
-            return Bin_Op.MOD_ASSIGN, index+1
-        case lexer.TkBAndEqual():
-            return Bin_Op.BAND_ASSIGN, index+1
-        case lexer.TkBOrEqual():
-            return Bin_Op.BOR_ASSIGN, index+1
-        case lexer.TkXorEqual():
-            return Bin_Op.XOR_ASSIGN, index+1
-        case lexer.TkLSEqual():
-            return Bin_Op.LS_ASSIGN, index+1
-        case lexer.TkRSEqual():
-            return Bin_Op.RS_ASSIGN, index+1
-        case _:
-            return None
+    return info.bin_op, index+1
 
 
-def parse_cond_middle(t: list[lexer.Token],
+def parse_cond_middle(t: lexer.Tokens,
                       index: int) -> tuple[Expression, int] | None:
     if not expect_tk(lexer.TkQuestion, t, index):
         return None
@@ -586,83 +558,170 @@ def parse_cond_middle(t: list[lexer.Token],
     return exp, index+1
 
 
-def parse_expr(t: list[lexer.Token],
+# Frame tags for parse_expr's explicit stack
+_EXPR = 0
+_UNARY = 1
+_PAREN = 2
+# Marks a ternary frame that is still waiting for its middle operand
+_NO_MIDDLE = object()
+
+
+def parse_expr(t: lexer.Tokens,
                index: int,
                min_prec: int = 0) -> tuple[Expression, int] | None:
-    if (index >= len(t)):
-        return None
+    """Precedence climbing with an explicit stack in place of recursion.
+       Builds the same tree as parse_expr_recursive, but nesting depth
+       is bounded by memory rather than the interpreter recursion limit.
+       Expression frames are [_EXPR, min_prec, left, pending_op, middle]
+    """
+    operators = OPERATORS
+    unary_operators = UNARY_OPERATORS
+    stack: list = [[_EXPR, min_prec, None, None, None]]
+    while True:
+        # Prefix position, push unary operators and parentheses
+        # until an operand is found
+        token = peek_tk(t, index)
+        match token:
+            case lexer.TkConstant(val):
+                value: Expression = Constant(val)
+            case lexer.TkIdentifier(val):
+                value = Var(Identifier(val))
+            case lexer.TkOpenParenthesis():
+                stack.append((_PAREN,))
+                stack.append([_EXPR, 0, None, None, None])
+                index += 1
+                continue
+            case _:
+                uop = unary_operators.get(type(token))
+                if uop is None:
+                    return None
+                stack.append((_UNARY, uop))
+                index += 1
+                continue
+        index += 1
+        # Operand position, fold the value into the frames below it
+        # until one of them takes another operator.
+        # nxt always holds the token at index
+        nxt = peek_tk(t, index)
+        postfix = True
+        while True:
+            while postfix:
+                if type(nxt) is lexer.TkIncrement:
+                    value = Postfix(True, value)
+                elif type(nxt) is lexer.TkDecrement:
+                    value = Postfix(False, value)
+                else:
+                    break
+                index += 1
+                nxt = peek_tk(t, index)
+            frame = stack[-1]
+            if frame[0] == _UNARY:
+                stack.pop()
+                value = Unary(frame[1], value)
+                postfix = True
+                continue
+            if frame[0] == _PAREN:
+                if type(nxt) is not lexer.TkCloseParenthesis:
+                    return None
+                stack.pop()
+                index += 1
+                nxt = peek_tk(t, index)
+                postfix = True
+                continue
+            info = frame[3]
+            if info is None:
+                frame[2] = value
+            elif frame[4] is _NO_MIDDLE:
+                frame[4] = value
+                if type(nxt) is not lexer.TkColon:
+                    return None
+                stack.append([_EXPR, info.precedence, None, None, None])
+                index += 1
+                break
+            else:
+                match info.kind:
+                    case Op_Kind.BINARY:
+                        frame[2] = Binary(info.bin_op, frame[2], value)
+                    case Op_Kind.ASSIGN:
+                        frame[2] = Assignment(frame[2], value)
+                    case Op_Kind.COMPOUND:
+                        frame[2] = CompoundAssign(info.bin_op,
+                                                  frame[2], value)
+                    case Op_Kind.TERNARY:
+                        frame[2] = Conditional(frame[2], frame[4], value)
+                frame[3] = None
+            info = operators.get(type(nxt))
+            if info is not None and info.precedence >= frame[1]:
+                frame[3] = info
+                index += 1
+                if info.kind is Op_Kind.TERNARY:
+                    frame[4] = _NO_MIDDLE
+                    stack.append([_EXPR, 0, None, None, None])
+                else:
+                    prec = info.precedence
+                    stack.append([_EXPR,
+                                  prec if info.right_assoc else prec+1,
+                                  None, None, None])
+                break
+            # Nothing more binds at this level, the frame is complete
+            stack.pop()
+            value = frame[2]
+            if not stack:
+                return value, index
+            postfix = False
+
+
+def parse_expr_recursive(t: lexer.Tokens,
+                         index: int,
+                         min_prec: int = 0) -> tuple[Expression, int] | None:
     result = parse_factor(t, index)
     if result is None:
         return None
     left, index = result
-    peek = None if index > len(t) else t[index]
-    while (prec := precedence(peek)) is not None and prec >= min_prec:
-        match peek:
-            case lexer.TkEqual():
-                index = index + 1
-                right_result = parse_expr(t, index, prec)
-                if right_result is None:
-                    return None
-                right, index = right_result
+    operators = OPERATORS
+    while ((info := operators.get(type(peek_tk(t, index)))) is not None
+           and info.precedence >= min_prec):
+        if info.kind is Op_Kind.TERNARY:
+            middle_result = parse_cond_middle(t, index)
+            if middle_result is None:
+                return None
+            middle, index = middle_result
+        else:
+            index += 1
+        prec = info.precedence
+        right_result = parse_expr_recursive(
+            t, index, prec if info.right_assoc else prec+1)
+        if right_result is None:
+            return None
+        right, index = right_result
+        match info.kind:
+            case Op_Kind.BINARY:
+                left = Binary(info.bin_op, left, right)
+            case Op_Kind.ASSIGN:
                 left = Assignment(left, right)
-            case (lexer.TkPlusEqual()
-                  | lexer.TkSubEqual()
-                  | lexer.TkMulEqual()
-                  | lexer.TkDivEqual()
-                  | lexer.TkModEqual()
-                  | lexer.TkBAndEqual()
-                  | lexer.TkBOrEqual()
-                  | lexer.TkXorEqual()
-                  | lexer.TkLSEqual()
-                  | lexer.TkRSEqual()):
-                binop_result = parse_binop(t, index)
-                if binop_result is None:
-                    return None
-                binop, index = binop_result
-                right_result = parse_expr(t, index, prec)
-                if right_result is None:
-                    return None
-                right, index = right_result
-                left = CompoundAssign(binop, left, right)
-            case lexer.TkQuestion():
-                middle_result = parse_cond_middle(t, index)
-                if middle_result is None:
-                    return None
-                middle, index = middle_result
-                exp_result = parse_expr(t, index, prec)
-                if exp_result is None:
-                    return None
-                right, index = exp_result
+            case Op_Kind.COMPOUND:
+                left = CompoundAssign(info.bin_op, left, right)
+            case Op_Kind.TERNARY:
                 left = Conditional(left, middle, right)
-            case _:
-                binop_result = parse_binop(t, index)
-                if binop_result is None:
-                    return None
-                binop, index = binop_result
-                result = parse_expr(t, index, prec+1)
-                if result is None:
-                    return None
-                right, index = result
-                left = Binary(binop, left, right)
-        peek = None if index > len(t) else t[index]
     return left, index
 
 
-def parse_block(t: list[lexer.Token],
+def parse_block(t: lexer.Tokens,
                 index: int) -> tuple[Block, int] | None:
     if not expect_tk(lexer.TkOpenBrace, t, index):
         return None
     index += 1
     body: list[Block_Item] = list()
-    while (b_result := parse_block_item(t, index)) is not None:
+    while not expect_tk(lexer.TkCloseBrace, t, index):
+        b_result = parse_block_item(t, index)
+        if b_result is None:
+            return None
         item, index = b_result
         body.append(item)
-    if not expect_tk(lexer.TkCloseBrace, t, index):
-        return None
     return Block(body), index+1
 
 
-def parse_function(t: list[lexer.Token],
+def parse_function(t: lexer.Tokens,
                    index: int) -> tuple[Function, int] | None:
     if not expect_tk(lexer.TkInt, t, index):
         return None
@@ -689,12 +748,17 @@ def parse_function(t: list[lexer.Token],
     return (Function(r_ident[0], body), index)
 
 
-def parse_program(t: list[lexer.Token],
+def parse_program(t: lexer.Tokens,
                   index: int) -> Program | None:
-    ret = parse_function(t, index)
+    try:
+        ret = parse_function(t, index)
+    except lexer.LookaheadError:
+        # Backtracking further than a TokenWindow keeps only happens
+        # on input that does not parse
+        return None
     if (ret is None):
         return None
     func, num = ret
-    if num < len(t):
+    if peek_tk(t, num) is not None:
         return None
     return Program(func)
@@ -0,0 +1,125 @@
+"""The optimization passes and the manager that runs them.
+
+Passes are listed in the order they run. A pass only runs at or above
+its optimization level, and only when every pass it requires runs
+too, so disabling a pass also disables the passes built on it.
+At -O2 the whole pipeline is repeated until no pass changes anything.
+"""
+import sys
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import TextIO
+
+import asm
+import code_emit
+import optimize
+import tacky
+from timing import PassTimer, timed
+
+# Stops a pair of passes that keep undoing each other
+MAX_ITERATIONS = 16
+
+
+@dataclass(frozen=True, slots=True)
+class Pass:
+    name: str
+    # Rewrites the instructions in place, True if anything changed
+    run: Callable[[list], bool]
+    level: int = 1
+    requires: tuple[str, ...] = ()
+
+
+TACKY_PASSES = (
+    Pass('constant_folding', optimize.fold_constants),
+    Pass('unreachable', optimize.remove_unreachable),
+    Pass('jumps_to_next', optimize.remove_jumps_to_next,
+         requires=('unreachable',)),
+    Pass('dead_stores', optimize.remove_dead_stores),
+)
+
+ASM_PASSES = (
+    Pass('store_load', optimize.remove_store_load),
+)
+
+PASS_NAMES = frozenset(p.name for p in TACKY_PASSES + ASM_PASSES)
+
+
+def check_names(names: Iterable[str]) -> None:
+    unknown = sorted(set(names) - PASS_NAMES)
+    if unknown:
+        raise ValueError(f'unknown pass {", ".join(unknown)}, '
+                         f'choose from {", ".join(sorted(PASS_NAMES))}')
+
+
+def schedule(passes: Iterable[Pass],
+             level: int,
+             disabled: frozenset[str] = frozenset()) -> list[Pass]:
+    """The passes that run at level, in order"""
+    scheduled: list[Pass] = []
+    names: set[str] = set()
+    for p in passes:
+        if p.level > level or p.name in disabled:
+            continue
+        if not names.issuperset(p.requires):
+            continue
+        scheduled.append(p)
+        names.add(p.name)
+    return scheduled
+
+
+def scheduled_names(level: int,
+                    disabled: frozenset[str] = frozenset()) -> frozenset[str]:
+    """The names of every pass that runs at level"""
+    return frozenset(p.name for pipeline in (TACKY_PASSES, ASM_PASSES)
+                     for p in schedule(pipeline, level, disabled))
+
+
+def dump_tacky(instructions: list[tacky.Instruction]) -> str:
+    return ''.join(f'\t{x}\n' for x in instructions)
+
+
+def dump_asm(instructions: list[asm.Instruction]) -> str:
+    return ''.join(map(code_emit.instruction_text, instructions))
+
+
+class PassManager:
+    """Runs the passes an optimization level enables over a function"""
+
+    def __init__(self,
+                 level: int = 0,
+                 disabled: frozenset[str] = frozenset(),
+                 print_after: frozenset[str] = frozenset(),
+                 output: TextIO | None = None,
+                 timer: PassTimer | None = None) -> None:
+        check_names(disabled | print_after)
+        self.level = level
+        self.print_after = print_after
+        self.output = output
+        self.timer = timer
+        self.tacky_passes = schedule(TACKY_PASSES, level, disabled)
+        self.asm_passes = schedule(ASM_PASSES, level, disabled)
+
+    def run_tacky(self, function: tacky.Function) -> None:
+        self.run(self.tacky_passes, function.body, dump_tacky)
+
+    def run_asm(self, function: asm.Function) -> None:
+        self.run(self.asm_passes, function.instructions, dump_asm)
+
+    def run(self,
+            passes: list[Pass],
+            instructions: list,
+            dump: Callable[[list], str]) -> None:
+        iterations = MAX_ITERATIONS if self.level >= 2 else 1
+        for _ in range(iterations):
+            changed = False
+            for p in passes:
+                with timed(self.timer, p.name) as record:
+                    changed |= p.run(instructions)
+                if record is not None:
+                    record.counts['instructions'] = len(instructions)
+                if p.name in self.print_after:
+                    output = self.output or sys.stderr
+                    print(f'*** after {p.name} ***', file=output)
+                    output.write(dump(instructions))
+            if not changed:
+                break
@@ -0,0 +1,498 @@
+import os
+import re
+from typing import TYPE_CHECKING, Generator, Iterable, Iterator, NamedTuple
+
+import lexer
+
+if TYPE_CHECKING:
+    import parser
+
+# Preprocessing tokens. Punctuators are matched longest first like the
+# lexer does, so expansions never split an operator such as '<<='
+PP_TOKEN = re.compile(
+    r'[ \t\x0b\x0c\r]+'
+    r'|[A-Za-z_][A-Za-z0-9_]*'
+    r'|[0-9][A-Za-z0-9_.]*'
+    r'|##|'
+    + '|'.join(re.escape(p)
+               for p in sorted(lexer.PUNCTUATORS, key=len, reverse=True))
+    + r'|.')
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+DIRECTIVE = re.compile(r'\s*#\s*([A-Za-z_]*)(.*)', re.DOTALL)
+DEFINE = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)(\(([^)]*)\))?(.*)', re.DOTALL)
+INCLUDE = re.compile(r'\s*(?:"([^"]*)"|<([^>]*)>)\s*$')
+
+MAX_INCLUDE_DEPTH = 200
+
+PREDEFINED = {'__STDC__': '1'}
+
+
+# Named tuples rather than dataclasses keep the preprocessor, which runs
+# for every compile, from importing dataclasses before the parser does
+class Macro(NamedTuple):
+    name: str
+    # None for object-like macros
+    params: tuple[str, ...] | None
+    body: tuple[str, ...]
+
+
+class PPToken(NamedTuple):
+    text: str
+    # Names of the macros this token came out of,
+    # which must not be expanded again
+    hidden: frozenset[str] = frozenset()
+
+
+class PreprocessorError(RuntimeError):
+    """An error with the file and line it was found on"""
+
+
+class Unfinished(Exception):
+    """A function-like macro call runs past the end of the line"""
+
+
+def is_space(token: PPToken) -> bool:
+    return token.text.isspace()
+
+
+def split_tokens(text: str,
+                 hidden: frozenset[str] = frozenset()) -> list[PPToken]:
+    return [PPToken(m.group(), hidden) for m in PP_TOKEN.finditer(text)]
+
+
+def logical_lines(lines: Iterable[str]) -> Generator[tuple[int, str]]:
+    """Joins backslash continued lines and replaces comments with a space.
+       Yields each logical line with the number of its first physical line
+    """
+    in_comment = False
+    pending: list[str] = []
+    start = 1
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if line.endswith('\\'):
+            if not pending:
+                start = number
+            pending.append(line[:-1])
+            continue
+        if pending:
+            line = ''.join(pending) + line
+            pending.clear()
+        else:
+            start = number
+        out: list[str] = []
+        index = 0
+        while index < len(line):
+            if in_comment:
+                end = line.find('*/', index)
+                if end < 0:
+                    index = len(line)
+                    break
+                in_comment = False
+                out.append(' ')
+                index = end + 2
+                continue
+            block = line.find('/*', index)
+            comment = line.find('//', index)
+            if comment >= 0 and (block < 0 or comment < block):
+                out.append(line[index:comment])
+                break
+            if block < 0:
+                out.append(line[index:])
+                break
+            out.append(line[index:block])
+            in_comment = True
+            index = block + 2
+        yield start, ''.join(out)
+    if pending:
+        yield start, ''.join(pending)
+
+
+class Preprocessor:
+    """Expands directives and macros one logical line at a time,
+       so output can be lexed while the rest of the input is still
+       being read
+    """
+
+    def __init__(self,
+                 include_dirs: Iterable[str] = (),
+                 defines: Iterable[str] = ()) -> None:
+        self.include_dirs = list(include_dirs)
+        self.macros: dict[str, Macro] = {}
+        self.depth = 0
+        for name, value in PREDEFINED.items():
+            self.define(f'{name} {value}')
+        for define in defines:
+            # -DNAME means 1, -DNAME= defines it as empty
+            name, sep, value = define.partition('=')
+            self.define(f'{name} {value if sep else "1"}')
+
+    def define(self, text: str) -> None:
+        m = DEFINE.match(text.strip())
+        if m is None:
+            raise RuntimeError(f'Invalid macro definition: {text}')
+        name, has_params, params, body = m.groups()
+        if has_params is None:
+            self.macros[name] = Macro(name, None, self.body(body))
+            return
+        names = tuple(p.strip() for p in params.split(','))
+        if names == ('',):
+            names = ()
+        if not all(IDENTIFIER.fullmatch(p) for p in names):
+            raise RuntimeError(f'Invalid macro parameters: {params}')
+        self.macros[name] = Macro(name, names, self.body(body))
+
+    @staticmethod
+    def body(text: str) -> tuple[str, ...]:
+        return tuple(t.text for t in split_tokens(text.strip()))
+
+    def find_include(self, name: str, quoted: bool,
+                     current: str) -> str:
+        dirs = self.include_dirs
+        if quoted:
+            dirs = [os.path.dirname(current)] + dirs
+        for directory in dirs:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+        raise RuntimeError(f'Include file not found: {name}')
+
+    def preprocess_file(self, path: str) -> Generator[str]:
+        with open(path) as f:
+            yield from self.preprocess_lines(f, path)
+
+    def preprocess_lines(self, lines: Iterable[str],
+                         path: str = '<input>') -> Generator[str]:
+        """Yields the expanded text of every active line"""
+        # One entry per open conditional:
+        # [active, some branch taken, #else seen]
+        conditions: list[list[bool]] = []
+        active = True
+        pending = ''
+        for number, line in logical_lines(lines):
+            try:
+                directive = DIRECTIVE.match(line)
+                if directive is not None and not pending:
+                    name, rest = directive.groups()
+                    match name:
+                        case 'if' | 'ifdef' | 'ifndef':
+                            taken = active and self.condition(name, rest)
+                            conditions.append([active, taken, False])
+                            active = taken
+                        case 'elif' | 'else' | 'endif':
+                            if not conditions:
+                                raise RuntimeError(f'#{name} without #if')
+                            frame = conditions[-1]
+                            outer, taken, seen_else = frame
+                            if name == 'endif':
+                                conditions.pop()
+                                active = outer
+                                continue
+                            if seen_else:
+                                raise RuntimeError(f'#{name} after #else')
+                            frame[2] = name == 'else'
+                            active = outer and not taken and (
+                                name == 'else' or self.condition('if', rest))
+                            frame[1] = taken or active
+                        case _ if not active:
+                            pass
+                        case 'define':
+                            self.define(rest)
+                        case 'undef':
+                            self.macros.pop(rest.strip(), None)
+                        case 'include':
+                            yield from self.include(rest, path)
+                        case 'error':
+                            raise RuntimeError(f'#error{rest}')
+                        case '' | 'pragma' | 'line':
+                            pass
+                        case _:
+                            raise RuntimeError(
+                                f'Unknown preprocessor directive #{name}')
+                    continue
+                if not active:
+                    continue
+                line = f'{pending} {line}' if pending else line
+                try:
+                    tokens = self.expand(split_tokens(line))
+                except Unfinished:
+                    # Macro arguments can continue on the next line
+                    pending = line
+                    continue
+                pending = ''
+                yield ''.join(t.text for t in tokens) + '\n'
+            except PreprocessorError:
+                raise
+            except (RuntimeError, ValueError) as e:
+                # ValueError comes from lexing a #if expression
+                raise PreprocessorError(f'{path}:{number}: {e}') from None
+        if pending:
+            raise PreprocessorError(
+                f'{path}: unterminated macro arguments')
+        if conditions:
+            raise PreprocessorError(f'{path}: unterminated #if')
+
+    def include(self, rest: str, current: str) -> Iterator[str]:
+        m = INCLUDE.match(rest)
+        if m is None:
+            # The computed form, #include MACRO
+            expanded = ''.join(t.text for t in self.expand(split_tokens(rest)))
+            m = INCLUDE.match(expanded)
+        if m is None:
+            raise RuntimeError(f'Invalid #include{rest}')
+        quoted, angled = m.groups()
+        path = self.find_include(quoted if angled is None else angled,
+                                 angled is None, current)
+        if self.depth >= MAX_INCLUDE_DEPTH:
+            raise RuntimeError('#include nested too deeply')
+        self.depth += 1
+        try:
+            yield from self.preprocess_file(path)
+        finally:
+            self.depth -= 1
+
+    def condition(self, name: str, rest: str) -> bool:
+        match name:
+            case 'ifdef':
+                return rest.strip() in self.macros
+            case 'ifndef':
+                return rest.strip() not in self.macros
+        return evaluate(self.condition_tokens(rest)) != 0
+
+    def condition_tokens(self, rest: str) -> list[lexer.Token]:
+        """Replaces defined operators, expands macros and turns the
+           identifiers left over into 0 before lexing the result
+        """
+        tokens = [t for t in split_tokens(rest) if not is_space(t)]
+        replaced: list[PPToken] = []
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token.text != 'defined':
+                replaced.append(token)
+                index += 1
+                continue
+            if index + 1 < len(tokens) and tokens[index + 1].text == '(':
+                if (index + 3 >= len(tokens)
+                        or tokens[index + 3].text != ')'):
+                    raise RuntimeError('Invalid use of defined')
+                name = tokens[index + 2].text
+                index += 4
+            elif index + 1 < len(tokens):
+                name = tokens[index + 1].text
+                index += 2
+            else:
+                raise RuntimeError('Invalid use of defined')
+            replaced.append(PPToken('1' if name in self.macros else '0'))
+        expanded = self.expand(replaced)
+        text = ' '.join('0' if IDENTIFIER.fullmatch(t.text) else t.text
+                        for t in expanded if not is_space(t))
+        return list(lexer.tokenize_buffer(text))
+
+    def expand(self, tokens: list[PPToken]) -> list[PPToken]:
+        """Expands every macro in tokens, rescanning each replacement
+           together with the tokens after it
+        """
+        # The tokens left to scan, last first, so a replacement goes
+        # back in front of the rest without moving them
+        pending = tokens[::-1]
+        out: list[PPToken] = []
+        while pending:
+            token = pending.pop()
+            macro = self.macros.get(token.text)
+            if macro is None or token.text in token.hidden:
+                out.append(token)
+                continue
+            hidden = token.hidden | {macro.name}
+            if macro.params is None:
+                replacement = self.paste([PPToken(t, hidden)
+                                          for t in macro.body])
+            else:
+                start = len(pending) - 1
+                while start >= 0 and is_space(pending[start]):
+                    start -= 1
+                if start < 0 or pending[start].text != '(':
+                    out.append(token)
+                    continue
+                args, end = self.arguments(pending, start)
+                del pending[end:]
+                replacement = self.substitute(macro, args, hidden)
+            # Spaces around the replacement keep it from
+            # running into the neighbouring tokens
+            out.append(PPToken(' '))
+            pending.append(PPToken(' '))
+            pending.extend(reversed(replacement))
+        return out
+
+    @staticmethod
+    def arguments(pending: list[PPToken],
+                  start: int) -> tuple[list[list[PPToken]], int]:
+        """Splits the arguments of a call whose '(' is at start of the
+           reversed pending tokens. Returns them with the index of the
+           closing ')'
+        """
+        args: list[list[PPToken]] = [[]]
+        depth = 0
+        for index in range(start - 1, -1, -1):
+            token = pending[index]
+            match token.text:
+                case '(':
+                    depth += 1
+                case ')' if depth == 0:
+                    return args, index
+                case ')':
+                    depth -= 1
+                case ',' if depth == 0:
+                    args.append([])
+                    continue
+            args[-1].append(token)
+        raise Unfinished()
+
+    def substitute(self, macro: Macro, args: list[list[PPToken]],
+                   hidden: frozenset[str]) -> list[PPToken]:
+        assert macro.params is not None
+        if macro.params == () and args == [[]]:
+            args = []
+        if len(args) != len(macro.params):
+            raise RuntimeError(
+                f'Macro {macro.name} expects {len(macro.params)} '
+                f'arguments, got {len(args)}')
+        params = dict(zip(macro.params, args))
+        expanded: dict[str, list[PPToken]] = {}
+        body = macro.body
+        out: list[PPToken] = []
+        for index, text in enumerate(body):
+            arg = params.get(text)
+            if arg is None:
+                out.append(PPToken(text, hidden))
+                continue
+            if self.next_to_paste(body, index):
+                # Operands of ## are pasted before expansion
+                out.extend(arg)
+                continue
+            if text not in expanded:
+                expanded[text] = self.expand(list(arg))
+            out.extend(expanded[text])
+        return self.paste(out)
+
+    @staticmethod
+    def next_to_paste(body: tuple[str, ...], index: int) -> bool:
+        before = [t for t in body[:index] if not t.isspace()]
+        after = [t for t in body[index + 1:] if not t.isspace()]
+        return ((before and before[-1] == '##')
+                or (after and after[0] == '##'))
+
+    @staticmethod
+    def paste(tokens: list[PPToken]) -> list[PPToken]:
+        if not any(t.text == '##' for t in tokens):
+            return tokens
+        out: list[PPToken] = []
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token.text != '##':
+                out.append(token)
+                index += 1
+                continue
+            while out and is_space(out[-1]):
+                out.pop()
+            index += 1
+            while index < len(tokens) and is_space(tokens[index]):
+                index += 1
+            if not out or index == len(tokens):
+                raise RuntimeError("'##' cannot appear at either end "
+                                   'of a macro expansion')
+            left = out.pop()
+            out.extend(split_tokens(left.text + tokens[index].text,
+                                    left.hidden))
+            index += 1
+        return out
+
+
+def evaluate(tokens: list[lexer.Token]) -> int:
+    """Evaluates a #if expression with the parser's expression grammar"""
+    # Only files with #if need the parser before the lexer is done
+    import parser
+    result = parser.parse_expr(tokens, 0)
+    if result is None or result[1] != len(tokens):
+        raise RuntimeError('Invalid #if expression')
+    return evaluate_expr(result[0])
+
+
+def evaluate_expr(e: 'parser.Expression') -> int:
+    import parser
+    match e:
+        case parser.Constant(val):
+            return int(val)
+        case parser.Unary(parser.Unary_Operator.NEGATION, exp):
+            return -evaluate_expr(exp)
+        case parser.Unary(parser.Unary_Operator.COMPLEMENT, exp):
+            return ~evaluate_expr(exp)
+        case parser.Unary(parser.Unary_Operator.NOT, exp):
+            return int(evaluate_expr(exp) == 0)
+        case parser.Conditional(condition, t, f):
+            return evaluate_expr(t if evaluate_expr(condition) else f)
+        case parser.Binary(parser.Bin_Op.LOG_AND, left, right):
+            return int(evaluate_expr(left) != 0
+                       and evaluate_expr(right) != 0)
+        case parser.Binary(parser.Bin_Op.LOG_OR, left, right):
+            return int(evaluate_expr(left) != 0
+                       or evaluate_expr(right) != 0)
+        case parser.Binary(op, left, right):
+            return binary(op, evaluate_expr(left), evaluate_expr(right))
+    raise RuntimeError('Invalid #if expression')
+
+
+def binary(op: 'parser.Bin_Op', a: int, b: int) -> int:
+    import parser
+    match op:
+        case parser.Bin_Op.ADD:
+            return a + b
+        case parser.Bin_Op.SUBTRACT:
+            return a - b
+        case parser.Bin_Op.MULTIPLY:
+            return a * b
+        case parser.Bin_Op.DIVIDE | parser.Bin_Op.REMAINDER if b == 0:
+            raise RuntimeError('Division by zero in #if')
+        case parser.Bin_Op.DIVIDE:
+            # C division truncates toward zero
+            quotient = abs(a) // abs(b)
+            return quotient if (a < 0) == (b < 0) else -quotient
+        case parser.Bin_Op.REMAINDER:
+            return a - b * binary(parser.Bin_Op.DIVIDE, a, b)
+        case parser.Bin_Op.LEFT_SHIFT:
+            return a << b
+        case parser.Bin_Op.RIGHT_SHIFT:
+            return a >> b
+        case parser.Bin_Op.BIT_AND:
+            return a & b
+        case parser.Bin_Op.BIT_OR:
+            return a | b
+        case parser.Bin_Op.XOR:
+            return a ^ b
+        case parser.Bin_Op.LESS_THAN:
+            return int(a < b)
+        case parser.Bin_Op.LESS_EQUAL:
+            return int(a <= b)
+        case parser.Bin_Op.GREATER_THAN:
+            return int(a > b)
+        case parser.Bin_Op.GREATER_EQUAL:
+            return int(a >= b)
+        case parser.Bin_Op.EQUAL:
+            return int(a == b)
+        case parser.Bin_Op.NOT_EQUAL:
+            return int(a != b)
+    raise RuntimeError('Invalid #if expression')
+
+
+def preprocess_file(path: str,
+                    include_dirs: Iterable[str] = (),
+                    defines: Iterable[str] = ()) -> Generator[str]:
+    """Yields the preprocessed lines of a C source file"""
+    return Preprocessor(include_dirs, defines).preprocess_file(path)
+
+
+def preprocess_string(text: str,
+                      include_dirs: Iterable[str] = (),
+                      defines: Iterable[str] = ()) -> str:
+    preprocessor = Preprocessor(include_dirs, defines)
+    return ''.join(preprocessor.preprocess_lines(text.splitlines(True)))
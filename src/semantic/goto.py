@@ -0,0 +1,46 @@
+import parser
+
+from utility import Identifier
+
+
+def collect_labels(s: parser.Statement,
+                   labels: set[Identifier],
+                   gotos: list[Identifier]) -> None:
+    match s:
+        case parser.Label(id, stm):
+            if id in labels:
+                raise RuntimeError(f'Duplicate label detected: {id}')
+            labels.add(id)
+            collect_labels(stm, labels, gotos)
+        case parser.Goto(id):
+            gotos.append(id)
+        case parser.If(_, then):
+            collect_labels(then, labels, gotos)
+        case parser.IfElse(_, then, otherwise):
+            collect_labels(then, labels, gotos)
+            collect_labels(otherwise, labels, gotos)
+        case parser.Compound(block):
+            collect_block(block, labels, gotos)
+        case _:
+            pass
+
+
+def collect_block(b: parser.Block,
+                  labels: set[Identifier],
+                  gotos: list[Identifier]) -> None:
+    for item in b.block_items:
+        if isinstance(item, parser.S):
+            collect_labels(item.statement, labels, gotos)
+
+
+def resolve_program(p: parser.Program) -> parser.Program:
+    """Checks that labels are unique within the function
+       and that every goto targets one of them
+    """
+    labels: set[Identifier] = set()
+    gotos: list[Identifier] = []
+    collect_block(p.function_definition.body, labels, gotos)
+    for id in gotos:
+        if id not in labels:
+            raise RuntimeError(f'Goto to undefined label: {id}')
+    return p
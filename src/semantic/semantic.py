@@ -1,32 +1,58 @@
+import operator
 import parser
 from dataclasses import replace
 
 from utility import Identifier, make_temporary
 
-ScopeStack = list[dict[Identifier, Identifier]]
+ScopeStack = list[set[Identifier]]
 
 
 class VariableMap:
-    def __init__(self) -> None:
-        self.scope: ScopeStack = [dict()]
+    """Flat symbol table.
+       Each name maps to its shadow chain of unique names, innermost
+       last, and each scope keeps the set of names it declared so that
+       pop only has to undo those
+    """
+
+    def __init__(self, in_place: bool = False) -> None:
+        self.table: dict[Identifier, list[Identifier]] = dict()
+        self.scope: ScopeStack = [set()]
+        # One shared Var node per unique name
+        self.nodes: dict[Identifier, parser.Var] = dict()
+        # Rewrite block item lists in place instead of copying them
+        self.in_place = in_place
 
     def push(self) -> None:
-        self.scope.append(dict())
+        self.scope.append(set())
 
     def pop(self) -> None:
-        self.scope.pop()
+        table = self.table
+        for name in self.scope.pop():
+            chain = table[name]
+            chain.pop()
+            if not chain:
+                del table[name]
 
     def check_in_scope(self, val: Identifier) -> bool:
-        return val in self.scope[-1].keys()
+        return val in self.scope[-1]
 
     def lookup(self, val: Identifier) -> Identifier | None:
-        for x in reversed(self.scope):
-            if val in x.keys():
-                return x[val]
-        return None
+        chain = self.table.get(val)
+        return None if chain is None else chain[-1]
 
     def register(self, key: Identifier, val: Identifier) -> None:
-        self.scope[-1][key] = val
+        scope = self.scope[-1]
+        chain = self.table.setdefault(key, [])
+        if key in scope:
+            chain[-1] = val
+        else:
+            scope.add(key)
+            chain.append(val)
+        self.nodes[val] = parser.Var(val)
+
+    def lookup_var(self, val: Identifier) -> parser.Var | None:
+        chain = self.table.get(val)
+        return None if chain is None else self.nodes[chain[-1]]
 
 
 def resolve_declaration(d: parser.Declaration,
@@ -37,21 +63,33 @@ def resolve_declaration(d: parser.Declaration,
     v.register(d.name, unique_name)
     if d.exp is None:
         return parser.DeclareNode(unique_name, None)
-    new_exp = resolve_exp(d.exp, v)
-    return parser.DeclareNode(unique_name, new_exp)
+    return parser.DeclareNode(unique_name, resolve_exp(d.exp, v))
 
 
 def resolve_func(f: parser.Function,
                  v: VariableMap) -> parser.Function:
     """ Resolves the function contents but not the function as of yet"""
     items = resolve_block(f.body, v)
+    if items is f.body:
+        return f
     return replace(f, body=items)
 
 
 def resolve_block(b: parser.Block,
                   v: VariableMap) -> parser.Block:
-    items = [resolve_blockItem(x, v) for x in b.block_items]
-    return replace(b, block_items=items)
+    """Resolves every item of the block.
+       In place mode overwrites the item list as it goes, so each old
+       item can be freed as soon as its replacement exists
+    """
+    items = b.block_items
+    if v.in_place:
+        for i, x in enumerate(items):
+            items[i] = resolve_blockItem(x, v)
+        return b
+    new_items = [resolve_blockItem(x, v) for x in items]
+    if all(map(operator.is_, new_items, items)):
+        return b
+    return replace(b, block_items=new_items)
 
 
 def resolve_blockItem(b: parser.Block_Item,
@@ -59,7 +97,7 @@ def resolve_blockItem(b: parser.Block_Item,
     match b:
         case parser.S(statement):
             stmt = resolve_statement(statement, v)
-            return parser.S(stmt)
+            return b if stmt is statement else parser.S(stmt)
         case parser.D(declaration):
             decl = resolve_declaration(declaration, v)
             return parser.D(decl)
@@ -74,29 +112,34 @@ def resolve_statement(s: parser.Statement,
             return s
         case parser.Return(exp):
             e = resolve_exp(exp, v)
-            return parser.Return(e)
+            return s if e is exp else parser.Return(e)
         case parser.ExpNode(exp):
             e = resolve_exp(exp, v)
-            return parser.ExpNode(e)
+            return s if e is exp else parser.ExpNode(e)
         case parser.If(cond, then):
             new_cond = resolve_exp(cond, v)
             new_then = resolve_statement(then, v)
+            if new_cond is cond and new_then is then:
+                return s
             return parser.If(new_cond, new_then)
         case parser.IfElse(cond, then, otherwise):
             new_cond = resolve_exp(cond, v)
             new_then = resolve_statement(then, v)
             new_otherwise = resolve_statement(otherwise, v)
+            if (new_cond is cond and new_then is then
+                    and new_otherwise is otherwise):
+                return s
             return parser.IfElse(new_cond, new_then, new_otherwise)
         case parser.Label(id, stm):
             new_stm = resolve_statement(stm, v)
-            return parser.Label(id, new_stm)
+            return s if new_stm is stm else parser.Label(id, new_stm)
         case parser.Goto():
             return s
         case parser.Compound(block):
             v.push()
             new_block = resolve_block(block, v)
             v.pop()
-            return replace(s, block=new_block)
+            return s if new_block is block else replace(s, block=new_block)
         case _:
             raise RuntimeError('Impossible')
 
@@ -111,44 +154,60 @@ def resolve_exp(e: parser.Expression,
                 raise RuntimeError('left is an invalid lvalue')
             new_left = resolve_exp(left, v)
             new_right = resolve_exp(right, v)
+            if new_left is left and new_right is right:
+                return e
             return parser.Assignment(new_left, new_right)
         case parser.CompoundAssign(bop, left, right):
             if not isinstance(left, parser.Var):
                 raise RuntimeError('left is an invalid lvalue')
             new_left = resolve_exp(left, v)
             new_right = resolve_exp(right, v)
+            if new_left is left and new_right is right:
+                return e
             return parser.CompoundAssign(bop, new_left, new_right)
         case parser.Var(id):
-            unique_id = v.lookup(id)
-            if unique_id is None:
+            var = v.lookup_var(id)
+            if var is None:
                 raise RuntimeError(f'Id {id} is not in scope')
-            return parser.Var(unique_id)
+            return var
         case parser.Unary(up, exp):
             PREFIX = {parser.Unary_Operator.INCREMENT,
                       parser.Unary_Operator.DECREMENT}
             if up in PREFIX and not isinstance(exp, parser.Var):
                 raise RuntimeError('exp is an invalid lvalue')
             new_exp = resolve_exp(exp, v)
-            return parser.Unary(up, new_exp)
+            return e if new_exp is exp else parser.Unary(up, new_exp)
         case parser.Binary(bop, left, right):
             new_left = resolve_exp(left, v)
             new_right = resolve_exp(right, v)
+            if new_left is left and new_right is right:
+                return e
             return parser.Binary(bop, new_left, new_right)
         case parser.Postfix(b, exp):
             if not isinstance(exp, parser.Var):
                 raise RuntimeError('exp is an invalid lvalue')
             new_exp = resolve_exp(exp, v)
-            return parser.Postfix(b, new_exp)
+            return e if new_exp is exp else parser.Postfix(b, new_exp)
         case parser.Conditional(cond, t, f):
             new_cond = resolve_exp(cond, v)
             new_t = resolve_exp(t, v)
             new_f = resolve_exp(f, v)
+            if new_cond is cond and new_t is t and new_f is f:
+                return e
             return parser.Conditional(new_cond, new_t, new_f)
         case _:
             raise RuntimeError(f'Impossible {e}')
 
 
-def resolve_program(p: parser.Program) -> parser.Program:
-    var_map = VariableMap()
+def resolve_program(p: parser.Program,
+                    in_place: bool = False) -> parser.Program:
+    """Renames every variable to a unique name.
+       Subtrees without variables are shared with p rather than copied.
+       With in_place the block item lists of p are rewritten, so p must
+       not be used afterwards
+    """
+    var_map = VariableMap(in_place)
     func = resolve_func(p.function_definition, var_map)
+    if func is p.function_definition:
+        return p
     return parser.Program(func)
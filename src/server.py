@@ -0,0 +1,161 @@
+#! /bin/python
+"""Long lived compile server listening on a Unix socket.
+
+Every stage is imported once, by the process the workers fork from.
+Each request carries a driver command line and the client's working
+directory. Its files are compiled by a shared pool of worker processes,
+so concurrent requests share the CPUs instead of each starting their
+own pool.
+Start with: python server.py [--socket PATH] [--workers N]
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor
+
+import client
+import driver
+
+# Imported by the forkserver before it forks any worker. driver only
+# imports a stage when a compilation reaches it, so they are listed
+STAGES = ['lexer', 'preprocessor', 'parser', 'semantic.semantic',
+          'semantic.goto', 'tacky', 'optimize', 'passes', 'asm',
+          'code_emit', 'compiler', 'timing', 'cache', 'driver']
+
+
+class UsageError(Exception):
+
+    def __init__(self, message: str, status: int = 2) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def parse_request(argv: list[str]) -> argparse.Namespace:
+    """Parses a driver command line without letting argparse exit"""
+    parser = driver.arg_parser(prog='client.py')
+
+    def error(message: str):
+        raise UsageError(f'{parser.format_usage()}'
+                         f'{parser.prog}: error: {message}\n')
+    parser.error = error  # type: ignore[method-assign]
+    if '-h' in argv or '--help' in argv:
+        raise UsageError(parser.format_help(), 0)
+    return driver.parse_args(parser, argv)
+
+
+def in_directory(args: argparse.Namespace,
+                 cwd: str) -> argparse.Namespace:
+    """Makes the paths in args relative to the client's directory"""
+    return argparse.Namespace(**{
+        **vars(args),
+        'filepaths': [os.path.join(cwd, x) for x in args.filepaths],
+        'include_dirs': [os.path.join(cwd, x) for x in args.include_dirs],
+        'cache_dir': args.cache_dir and os.path.join(cwd, args.cache_dir)})
+
+
+def handle(message: dict, pool: Executor) -> dict:
+    """Runs one request and returns the response message"""
+    stderr = io.StringIO()
+    try:
+        args = parse_request(message['argv'])
+    except UsageError as e:
+        if e.status == 0:
+            return {'status': 0, 'stdout': str(e), 'stderr': ''}
+        return {'status': e.status, 'stdout': '', 'stderr': str(e)}
+    work = in_directory(args, message['cwd'])
+    futures = [pool.submit(driver.compile_file, work, x)
+               for x in work.filepaths]
+    results = [future.result() for future in futures]
+    # Reports name the files the way the client passed them in
+    stdout = io.StringIO()
+    driver.report_passes(args, results, stdout, stderr)
+    if args.cache_stats and args.cache_dir:
+        print(driver.cache_report(driver.open_cache(work)), file=stdout)
+    status = driver.report_errors(args.filepaths, results, stderr)
+    return {'status': status,
+            'stdout': stdout.getvalue(),
+            'stderr': stderr.getvalue()}
+
+
+class Handler(socketserver.BaseRequestHandler):
+    server: 'CompileServer'
+
+    def handle(self) -> None:
+        message = client.receive(self.request)
+        if message is None:
+            return
+        client.send(self.request, handle(message, self.server.pool))
+
+
+class CompileServer(socketserver.ThreadingMixIn,
+                    socketserver.UnixStreamServer):
+    """Accepts connections on threads, which only wait on the pool"""
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, pool: Executor) -> None:
+        self.pool = pool
+        make_private_directory(os.path.dirname(os.path.abspath(socket_path)))
+        if os.path.exists(socket_path):
+            if listening(socket_path):
+                raise RuntimeError(
+                    f'A compile server is already running on {socket_path}')
+            # A socket left behind by a server that did not shut down
+            os.unlink(socket_path)
+        super().__init__(socket_path, Handler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def make_private_directory(directory: str) -> None:
+    """Creates the socket's directory, or checks that an existing one
+       belongs to us alone
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not client.private_directory(directory):
+        raise RuntimeError(f'{directory} must be a directory owned by '
+                           'this user that nobody else can write to')
+
+
+def listening(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def worker_pool(workers: int) -> ProcessPoolExecutor:
+    """Worker processes fork from a forkserver that has already
+       imported every stage, so they never pay for the imports themselves
+    """
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(STAGES)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', default=client.default_socket_path())
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with worker_pool(args.workers) as pool, \
+            CompileServer(args.socket, pool) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
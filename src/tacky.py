@@ -31,12 +31,12 @@ class Bin_Op(Enum):
     GREATER_EQUAL = auto()
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Constant:
     x: int
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Var:
     identifier: Identifier
 
@@ -44,19 +44,19 @@ class Var:
 Val = Constant | Var
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Return:
     val: Val
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Unary:
     unary_operator: Unary_Operator
     src: Val
     dst: Val
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Binary:
     bin_op: Bin_Op
     src1: Val
@@ -64,30 +64,30 @@ class Binary:
     dst: Val
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Copy:
     src: Val
     dst: Val
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Jump:
     target: Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class JumpIfZero:
     condition: Val
     target: Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class JumpIfNotZero:
     condition: Val
     target: Identifier
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Label:
     identifier: Identifier
 
@@ -102,13 +102,13 @@ Instruction = (Return
                | Label)
 
 
-@dataclass
+@dataclass(slots=True)
 class Function:
     identifier: Identifier
     body: list[Instruction]
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Program:
     function_definition: Function
 
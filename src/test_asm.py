@@ -0,0 +1,60 @@
+import unittest
+
+import asm
+import lexer
+import parser
+import tacky
+from semantic import goto, semantic
+from utility import NameContext, name_context
+
+SOURCE = ('int main(void) { int a = 5; int b = a * 3 - 1; int c = b / 2;'
+          ' if (b > 10 && c != 3) goto big; return a % 2 >> 1;'
+          ' big: return b ? a << c : !a; }')
+
+
+def lower(source: str) -> tacky.Program:
+    with name_context(NameContext()):
+        ast = parser.parse_program(lexer.tokenize_stream(source), 0)
+        ast = goto.resolve_program(semantic.resolve_program(ast))
+        return tacky.emit_tack_program(ast)
+
+
+def operands(instruction: asm.Instruction) -> list[asm.Operand]:
+    return [getattr(instruction, name) for name in ('src', 'dst', 'left',
+                                                    'right', 'operand')
+            if hasattr(instruction, name)]
+
+
+class TestLowering(unittest.TestCase):
+
+    def test_fused_matches_passes(self):
+        program = lower(SOURCE)
+        fused = asm.emit_asm_ast(program).function_definition
+        passes = asm.emit_asm_ast(program, fused=False).function_definition
+        self.assertEqual(fused.name, passes.name)
+        self.assertEqual(fused.instructions[0], passes.instructions[0])
+        self.assertEqual([type(x) for x in fused.instructions],
+                         [type(x) for x in passes.instructions])
+
+    def test_operands_are_legal(self):
+        instructions = asm.emit_asm_ast(lower(SOURCE)).function_definition \
+            .instructions
+        for instruction in instructions:
+            found = operands(instruction)
+            self.assertFalse(any(isinstance(op, asm.Pseudo) for op in found))
+            self.assertLess(sum(isinstance(op, asm.Stack) for op in found),
+                            2, instruction)
+
+    def test_slots_are_shared(self):
+        instructions = asm.emit_asm_ast(lower(SOURCE)).function_definition \
+            .instructions
+        slots: dict[int, asm.Stack] = {}
+        for instruction in instructions:
+            for op in operands(instruction):
+                if isinstance(op, asm.Stack):
+                    self.assertIs(slots.setdefault(op.val, op), op)
+        self.assertEqual(instructions[0], asm.Allocate_Stack(4 * len(slots)))
+
+
+if __name__ == '__main__':
+    unittest.main()
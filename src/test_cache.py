@@ -0,0 +1,109 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+
+import cache
+import driver
+from cache import CompileCache
+
+
+class TestCompileCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache = CompileCache(os.path.join(self.directory, 'cache'))
+
+    def test_key(self):
+        key = CompileCache.key('int a;', {'x': '1'})
+        self.assertEqual(key, CompileCache.key('int a;', {'x': '1'}))
+        self.assertNotEqual(key, CompileCache.key('int b;', {'x': '1'}))
+        self.assertNotEqual(key, CompileCache.key('int a;', {'x': '2'}))
+
+    def test_put_and_copy_out(self):
+        output = os.path.join(self.directory, 'out.s')
+        self.assertFalse(self.cache.copy_out('k', 's', output))
+        self.cache.put_text('k', 's', 'text')
+        self.assertTrue(self.cache.copy_out('k', 's', output))
+        with open(output) as f:
+            self.assertEqual(f.read(), 'text')
+
+    def test_lru_eviction(self):
+        small = CompileCache(self.cache.directory, max_bytes=35)
+        for i, key in enumerate(('a', 'b', 'c')):
+            small.put_text(key, 's', '0123456789')
+            os.utime(small.path(key, 's'), (i, i))
+        # Using 'a' leaves 'b' as the least recently used
+        small.get('a', 's')
+        small.put_text('d', 's', '0123456789')
+        self.assertIsNone(small.get('b', 's'))
+        for key in ('a', 'c', 'd'):
+            self.assertIsNotNone(small.get(key, 's'))
+        stats = small.stats()
+        self.assertEqual((stats['entries'], stats['bytes']), (3, 30))
+        self.assertEqual(stats['evictions'], 1)
+
+    def test_stats_shared_between_instances(self):
+        self.cache.record(True)
+        other = CompileCache(self.cache.directory)
+        other.record(False)
+        other.record(False)
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_concurrent_writers(self):
+        small = CompileCache(self.cache.directory, max_bytes=500)
+
+        def work(n: int):
+            for i in range(50):
+                small.put_text(f'{n}-{i % 7}', 's', 'x' * 40)
+                small.record(small.get(f'{n}-{i % 5}', 's') is not None)
+        threads = [threading.Thread(target=work, args=(n,))
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = small.stats()
+        self.assertLessEqual(stats['bytes'], 500)
+        self.assertEqual(stats['hits'] + stats['misses'], 200)
+        self.assertEqual(os.listdir(small.objects),
+                         [x for x in os.listdir(small.objects)
+                          if not x.startswith('tmp')])
+
+    def test_version_stamp(self):
+        self.assertEqual(cache.compiler_version(), cache.compiler_version())
+
+
+@unittest.skipUnless(shutil.which('gcc'), 'gcc is not installed')
+class TestDriverCache(unittest.TestCase):
+
+    def test_hit_reuses_binary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'main.c')
+            with open(source, 'w') as f:
+                f.write('#ifndef V\n#define V 9\n#endif\n'
+                        'int main(void) { return V; }\n')
+            cache_dir = os.path.join(directory, 'cache')
+            argv = ['--cache-dir', cache_dir, '--save-asm', source]
+            binary = os.path.join(directory, 'main')
+            self.assertEqual(driver.handle_args(argv), 0)
+            os.unlink(binary)
+            os.unlink(os.path.join(directory, 'main.s'))
+            self.assertEqual(driver.handle_args(argv), 0)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'main.s')))
+            self.assertEqual(subprocess.run([binary]).returncode, 9)
+            stats = CompileCache(cache_dir).stats()
+            self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+            # A different definition is a different key
+            self.assertEqual(driver.handle_args(['-DV=3', *argv]), 0)
+            self.assertEqual(subprocess.run([binary]).returncode, 3)
+            self.assertEqual(CompileCache(cache_dir).stats()['misses'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import unittest
+
+import asm
+import code_emit
+import compiler
+import lexer
+from compiler import Stage
+
+SOURCE = ('int main(void) { int a = 5; int b = a * 3 - 1;'
+          ' if (b > 10) goto big; return a % 2 >> 1;'
+          ' big: return b ? a << 2 : !a; }')
+
+
+def codegen(source: str):
+    options = compiler.CompileOptions(Stage.CODEGEN)
+    tokens = lexer.tokenize_stream(source)
+    program = compiler.Compilation(options).compile_tokens(tokens)
+    assert program is not None
+    return program
+
+
+class TestEmit(unittest.TestCase):
+
+    def test_matches_process_node(self):
+        program = codegen(SOURCE)
+        output = io.StringIO()
+        code_emit.emit_program(program, output)
+        self.assertEqual(output.getvalue(),
+                         ''.join(code_emit.process_node(program)))
+
+    def test_layout(self):
+        lines = code_emit.emit_string(codegen(SOURCE)).splitlines()
+        self.assertEqual(lines[:4], ['\t.global main', 'main:',
+                                     '\tpushq %rbp', '\tmovq %rsp, %rbp'])
+        self.assertIn('\tsubq $40, %rsp', lines)
+        self.assertIn('\tcdq', lines)
+        self.assertEqual(lines[-4:], ['\tmovq %rbp, %rsp', '\tpopq %rbp',
+                                      '\tret',
+                                      '.section .note.GNU-stack,"",'
+                                      '@progbits'])
+
+    def test_one_write_per_instruction(self):
+        program = codegen(SOURCE)
+        writes = []
+
+        class Output:
+            def write(self, text):
+                writes.append(text)
+        code_emit.emit_program(program, Output())
+        instructions = program.function_definition.instructions
+        # The prologue and the stack note are the only extra writes
+        self.assertEqual(len(writes), len(instructions) + 2)
+
+
+class TestOperands(unittest.TestCase):
+
+    def test_registers_by_size(self):
+        dx = asm.Register(asm.Register_Enum.DX)
+        self.assertEqual(code_emit.decode_operand(dx, asm.Size.L), '%edx')
+        self.assertEqual(code_emit.decode_operand(dx, asm.Size.B), '%dl')
+        self.assertEqual(code_emit.decode_operand(asm.Imm(-3), asm.Size.B),
+                         '$-3')
+
+    def test_stack_operands_are_reused(self):
+        first = code_emit.decode_operand(asm.Stack(12), asm.Size.L)
+        self.assertEqual(first, '-12(%rbp)')
+        self.assertIs(code_emit.decode_operand(asm.Stack(12), asm.Size.B),
+                      first)
+
+    def test_shift_count_in_cl(self):
+        shift = asm.Binary(asm.Bin_Op.RIGHT_SHIFT, asm.Size.L,
+                           asm.Register(asm.Register_Enum.CX), asm.Stack(4))
+        self.assertEqual(code_emit.instruction_text(shift),
+                         '\tsarl %cl, -4(%rbp)\n')
+
+    def test_unhandled(self):
+        with self.assertRaises(RuntimeError):
+            code_emit.decode_operand(asm.Stack(4), asm.Size.Q)
+        with self.assertRaises(RuntimeError):
+            code_emit.decode_operand(asm.Pseudo('x'), asm.Size.L)
+        with self.assertRaises(RuntimeError):
+            code_emit.instruction_text(asm.Pseudo('x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
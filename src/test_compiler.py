@@ -0,0 +1,67 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+
+import compiler
+from compiler import Compilation, CompileOptions, Stage
+
+SOURCE = ('int main(void) { int a = 5; int b = a * 3 - 1;'
+          ' if (b > 10) goto big; return 1;'
+          ' big: return b ? a << 2 : 0; }')
+
+
+class TestCompileSource(unittest.TestCase):
+
+    def test_emits_assembly(self):
+        self.assertIn('main:', compiler.compile_source(SOURCE))
+
+    def test_output_is_deterministic(self):
+        first = compiler.compile_source(SOURCE)
+        compiler.compile_source('int main(void) { int x = 1; return x; }')
+        self.assertEqual(compiler.compile_source(SOURCE), first)
+
+    def test_concurrent_compilations(self):
+        expected = compiler.compile_source(SOURCE)
+        results: list[str] = []
+
+        def work():
+            for _ in range(20):
+                results.append(compiler.compile_source(SOURCE))
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 80)
+        self.assertTrue(all(result == expected for result in results))
+
+    def test_stops_early(self):
+        for stage in (Stage.LEX, Stage.PARSE, Stage.VALIDATE, Stage.TACKY,
+                      Stage.CODEGEN):
+            options = CompileOptions(stop_after=stage)
+            self.assertEqual(Compilation(options).compile_source(SOURCE), '')
+
+    def test_errors(self):
+        with self.assertRaises(RuntimeError):
+            compiler.compile_source('int main(void) { goto nowhere; }')
+        with self.assertRaises(RuntimeError):
+            compiler.compile_source('int main(void) { a: a: return 0; }')
+        with self.assertRaises(ValueError):
+            compiler.compile_source('int main(void) { return 0; ')
+
+    @unittest.skipUnless(shutil.which('gcc'), 'gcc is not installed')
+    def test_runs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            asm_file = os.path.join(directory, 'main.s')
+            binary = os.path.join(directory, 'main')
+            with open(asm_file, 'w') as output:
+                output.write(compiler.compile_source(SOURCE))
+            subprocess.run(['gcc', '-o', binary, asm_file], check=True)
+            self.assertEqual(subprocess.run([binary]).returncode, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import contextlib
+import functools
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import code_emit
+import compiler
+import driver
+import lexer
+from compiler import Stage
+
+SOURCE = 'int main(void) { int a = 6; return a * 7 - 20; }'
+
+
+def codegen(source: str) -> driver.Emitter:
+    compilation = compiler.Compilation(compiler.CompileOptions(Stage.CODEGEN))
+    result = compilation.compile_tokens(lexer.tokenize_stream(source))
+    assert result is not None
+    return functools.partial(code_emit.emit_program, result)
+
+
+@unittest.skipUnless(shutil.which('gcc'), 'gcc is not installed')
+class TestAssemble(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_pipe(self):
+        binary = os.path.join(self.directory, 'main')
+        driver.assemble_pipe(codegen(SOURCE), binary)
+        self.assertEqual(os.listdir(self.directory), ['main'])
+        self.assertEqual(subprocess.run([binary]).returncode, 22)
+
+    def test_file(self):
+        binary = os.path.join(self.directory, 'main')
+        asm_file = os.path.join(self.directory, 'main.s')
+        driver.assemble_file(codegen(SOURCE), asm_file, binary)
+        with open(asm_file) as f:
+            self.assertEqual(f.read(), compiler.compile_source(SOURCE))
+        self.assertEqual(subprocess.run([binary]).returncode, 22)
+
+    def test_pipe_errors(self):
+        binary = os.path.join(self.directory, 'missing', 'main')
+        with self.assertRaises(RuntimeError):
+            driver.assemble_pipe(codegen(SOURCE), binary)
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name: str, source: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as f:
+            f.write(source)
+        return path
+
+    def batch(self, jobs: int) -> tuple[list[str], list[str | None]]:
+        """Compiles a mix of good and bad files, returning their errors"""
+        paths = []
+        for i in range(12):
+            if i % 5 == 3:
+                source = f'int main(void) {{ goto l{i}; }}'
+            else:
+                source = f'int main(void) {{ return {i}; }}'
+            paths.append(self.write(f'p{i}.c', source))
+        paths.append(os.path.join(self.directory, 'missing.c'))
+        args = driver.arg_parser().parse_args(
+            ['--codegen', '-j', str(jobs), *paths])
+        results = driver.compile_files(args, paths)
+        return paths, [result.error for result in results]
+
+    def test_errors_per_file(self):
+        paths, errors = self.batch(1)
+        failed = [os.path.basename(p) for p, e in zip(paths, errors)
+                  if e is not None]
+        self.assertEqual(failed, ['p3.c', 'p8.c', 'missing.c'])
+        self.assertIn('undefined label', errors[3])
+        self.assertEqual(errors[-1], 'File not found')
+
+    def test_parallel_matches_sequential(self):
+        self.assertEqual(self.batch(3)[1], self.batch(1)[1])
+
+    def test_exit_status(self):
+        good = self.write('good.c', 'int main(void) { return 0; }')
+        bad = self.write('bad.c', 'int main(void) { return a; }')
+        self.assertEqual(driver.handle_args(['--codegen', good]), 0)
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            status = driver.handle_args(['--codegen', '-j', '2', good, bad])
+        self.assertEqual(status, 1)
+        self.assertEqual(stderr.getvalue().count('\n'), 1)
+        self.assertTrue(stderr.getvalue().startswith(f'{bad}: '))
+
+    def test_time_passes(self):
+        good = self.write('good.c', '#define N 3\n'
+                          'int main(void) { int a = N; return a + 1; }')
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            status = driver.handle_args(['--codegen', '--time-passes-json',
+                                         good])
+        self.assertEqual(status, 0)
+        [report] = json.loads(stdout.getvalue())
+        self.assertEqual(report['file'], good)
+        names = [p['name'] for p in report['passes']]
+        self.assertEqual(names, ['preprocess', 'lex', 'parse', 'semantic',
+                                 'goto', 'tacky', 'asm'])
+        counts = {p['name']: p['counts'] for p in report['passes']}
+        self.assertEqual(counts['preprocess'], {'lines': 1})
+        self.assertEqual(counts['lex']['tokens'], 17)
+        self.assertGreater(counts['parse']['nodes'], 5)
+        self.assertEqual(counts['asm']['pseudos'], 2)
+        top = [p['wall'] for p in report['passes'] if p['depth'] == 0]
+        self.assertAlmostEqual(report['total']['wall'], sum(top))
+
+    @unittest.skipUnless(shutil.which('gcc'), 'gcc is not installed')
+    def test_time_passes_text(self):
+        good = self.write('good.c', 'int main(void) { return 0; }')
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            status = driver.handle_args(['--time-passes', good])
+        self.assertEqual(status, 0)
+        lines = stderr.getvalue().splitlines()
+        self.assertEqual(lines[0], f'{good}:')
+        self.assertTrue(any(x.startswith('emit ') for x in lines))
+        self.assertTrue(any(x.startswith('assemble ') for x in lines))
+        self.assertTrue(lines[-1].startswith('total'))
+
+
+if __name__ == '__main__':
+    unittest.main()
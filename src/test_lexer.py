@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+
+import lexer
+
+SOURCES = ('int main(void) { return 2; }',
+           'int main(void) {\n    int a = 1;\n    a <<= 2;\n'
+           '    a >>= a >> 1 << 2;\n    return a++ + --a;\n}\n',
+           'a&&b||c&d|e^f&=g|=h^=i',
+           'x==y!=z<=w>=v<u>t=s!r',
+           'a+=1;b-=2;c*=3;d/=4;e%=5;',
+           'if (a) goto end; else return b ? c : d;\nend: ;',
+           'int x_1 = 10; // trailing comment\nreturn x_1 / 2;\n',
+           'returnx ifelse int_ _goto void2\t\x0b\x0c\r\n')
+
+
+class TestTokens(unittest.TestCase):
+
+    def test_equality(self):
+        self.assertEqual(lexer.TkPlus(), lexer.TkPlus())
+        self.assertNotEqual(lexer.TkPlus(), lexer.TkMinus())
+        self.assertEqual(lexer.TkConstant('1'), lexer.TkConstant('1'))
+        self.assertNotEqual(lexer.TkConstant('1'), lexer.TkConstant('2'))
+        self.assertNotEqual(lexer.TkConstant('1'), lexer.TkIdentifier('1'))
+
+    def test_repr(self):
+        self.assertEqual(repr(lexer.TkPlus()), 'TkPlus()')
+        self.assertEqual(repr(lexer.TkIdentifier('a')),
+                         "TkIdentifier(val='a')")
+
+    def test_match(self):
+        match lexer.TkIdentifier('a'):
+            case lexer.TkConstant(val):
+                self.fail(val)
+            case lexer.TkIdentifier(val):
+                self.assertEqual(val, 'a')
+        match lexer.TkSemicolon():
+            case lexer.TkSemicolon():
+                pass
+            case _:
+                self.fail()
+
+
+class TestBufferLexer(unittest.TestCase):
+
+    def test_matches_line_lexer(self):
+        for source in SOURCES:
+            with self.subTest(source=source):
+                by_line = [t for line in source.splitlines(keepends=True)
+                           for t in lexer.tokenize_string(line)]
+                whole = list(lexer.tokenize_buffer(source))
+                self.assertEqual(whole, by_line)
+
+    def test_longest_match(self):
+        tokens = list(lexer.tokenize_buffer('<<= << <= <'))
+        self.assertEqual(tokens, [lexer.TkLSEqual(),
+                                  lexer.TkLShift(),
+                                  lexer.TkLessEqual(),
+                                  lexer.TkLessThan()])
+
+    def test_keywords(self):
+        tokens = list(lexer.tokenize_buffer('int intx'))
+        self.assertEqual(tokens, [lexer.TkInt(), lexer.TkIdentifier('intx')])
+
+    def test_invalid_constant(self):
+        with self.assertRaises(ValueError):
+            list(lexer.tokenize_buffer('return 12abc;'))
+
+    def test_unknown_prefix(self):
+        with self.assertRaises(ValueError):
+            list(lexer.tokenize_buffer('int @;'))
+
+
+class TestTokenStream(unittest.TestCase):
+
+    def test_matches_buffer_lexer(self):
+        for source in SOURCES:
+            with self.subTest(source=source):
+                stream = lexer.tokenize_stream(source)
+                self.assertEqual(list(stream),
+                                 list(lexer.tokenize_buffer(source)))
+
+    def test_offsets_and_text(self):
+        source = 'int foo = 42;'
+        stream = lexer.tokenize_stream(source)
+        self.assertEqual(len(stream), 5)
+        self.assertIs(stream.kind(1), lexer.TkIdentifier)
+        self.assertEqual(stream.value(1), 'foo')
+        self.assertEqual(source[stream.starts[3]:stream.ends[3]], '42')
+        self.assertEqual(stream[3], lexer.TkConstant('42'))
+
+    def test_repeated_text_is_shared(self):
+        stream = lexer.tokenize_stream('a = a + a;')
+        self.assertEqual(stream.values[0], stream.values[2])
+        self.assertEqual(len(stream.text), 2)
+
+    def test_mmap_matches_text(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test.i')
+            for source in SOURCES + ('',):
+                with self.subTest(source=source):
+                    with open(path, 'w') as f:
+                        f.write(source)
+                    stream = lexer.tokenize_file(path, use_mmap=True)
+                    self.assertEqual(list(stream),
+                                     list(lexer.tokenize_file(path)))
+                    self.assertEqual(stream.text,
+                                     lexer.tokenize_stream(source).text)
+
+
+class TestTokenWindow(unittest.TestCase):
+
+    def test_stream_file_matches_stream(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test.i')
+            for source in SOURCES + ('',):
+                with self.subTest(source=source):
+                    with open(path, 'w') as f:
+                        f.write(source)
+                    self.assertEqual(list(lexer.stream_file(path)),
+                                     list(lexer.tokenize_stream(source)))
+
+    def test_stream_file_early_close(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'test.i')
+            with open(path, 'w') as f:
+                f.write(SOURCES[1])
+            tokens = lexer.stream_file(path)
+            self.assertEqual(next(tokens), lexer.TkInt())
+            tokens.close()
+
+    def test_window_bounds(self):
+        window = lexer.TokenWindow(lexer.tokenize_buffer('a b c d e f'), 2)
+        self.assertEqual(window[0], lexer.TkIdentifier('a'))
+        self.assertEqual(window[3], lexer.TkIdentifier('d'))
+        self.assertEqual(window[2], lexer.TkIdentifier('c'))
+        with self.assertRaises(RuntimeError):
+            window[1]
+        with self.assertRaises(IndexError):
+            window[6]
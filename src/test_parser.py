@@ -120,3 +120,108 @@ class TestConstantParser(unittest.TestCase):
         result, _ = parser.parse_expr(tokens, 0)
 
         self.assertEqual(result, should_be)
+
+    def test_parse_token_stream(self):
+        c_code = ('int main(void) { int a = 1; a += 2 * a;'
+                  ' if (a) return a ? 1 : 2; return 0; }')
+        from_list = parser.parse_program(
+            list(lexer.tokenize_buffer(c_code)), 0)
+        from_stream = parser.parse_program(lexer.tokenize_stream(c_code), 0)
+        self.assertIsNotNone(from_stream)
+        self.assertEqual(from_stream, from_list)
+
+    def test_parse_token_window(self):
+        body = ' '.join(f'int v{i} = v{i-1} + {i};' for i in range(1, 500))
+        c_code = f'int main(void) {{ int v0 = 0; {body} return v0; }}'
+        from_list = parser.parse_program(
+            list(lexer.tokenize_buffer(c_code)), 0)
+        window = lexer.TokenWindow(lexer.tokenize_buffer(c_code), 8)
+        from_window = parser.parse_program(window, 0)
+        self.assertIsNotNone(from_window)
+        self.assertEqual(from_window, from_list)
+
+    def test_parse_token_window_failure(self):
+        terms = ' + '.join(str(i) for i in range(50))
+        c_code = f'int main(void) {{ int b = {terms} +; return b; }}'
+        self.assertIsNone(parser.parse_program(
+            list(lexer.tokenize_buffer(c_code)), 0))
+        window = lexer.TokenWindow(lexer.tokenize_buffer(c_code), 64)
+        self.assertIsNone(parser.parse_program(window, 0))
+        # Looking back past the window is a parse failure, not a crash
+        c_code = 'int main(void) { x = 1 ? 2; }'
+        window = lexer.TokenWindow(lexer.tokenize_buffer(c_code), 1)
+        self.assertIsNone(parser.parse_program(window, 0))
+
+    def test_operator_table(self):
+        A = parser.Var(parser.Identifier('a'))
+        B = parser.Var(parser.Identifier('b'))
+        C = parser.Var(parser.Identifier('c'))
+        TABLE = (('a - b - c', parser.Binary(parser.Bin_Op.SUBTRACT,
+                                             parser.Binary(
+                                                 parser.Bin_Op.SUBTRACT,
+                                                 A, B),
+                                             C)),
+                 ('a = b += c', parser.Assignment(
+                     A, parser.CompoundAssign(parser.Bin_Op.ADD_ASSIGN,
+                                              B, C))),
+                 ('a ? b : c ? a : b', parser.Conditional(
+                     A, B, parser.Conditional(C, A, B))),
+                 ('a || b && c', parser.Binary(
+                     parser.Bin_Op.LOG_OR, A,
+                     parser.Binary(parser.Bin_Op.LOG_AND, B, C))))
+        for x, y in TABLE:
+            with self.subTest(x=x, y=y):
+                tokens = list(lexer.tokenize_buffer(x))
+                result, index = parser.parse_expr(tokens, 0)
+                self.assertEqual(result, y)
+                self.assertEqual(index, len(tokens))
+
+    def test_iterative_matches_recursive(self):
+        CODE = ('a = b += -c++ * (d - ~e) << 2 ? !f : g || h && i',
+                '++a-- + --(b) - (c ? d = e : f) % 3',
+                'a < b == c >= d & e ^ f | g != h >> i')
+        for x in CODE:
+            with self.subTest(x=x):
+                tokens = list(lexer.tokenize_buffer(x))
+                self.assertEqual(parser.parse_expr(tokens, 0),
+                                 parser.parse_expr_recursive(tokens, 0))
+
+    def test_deep_expressions(self):
+        DEPTH = 100000
+        CODE = ('(' * DEPTH + 'a' + ')' * DEPTH,
+                ' = '.join(['a'] * DEPTH),
+                ' ? '.join(['a'] * DEPTH) + ' : b' * (DEPTH - 1),
+                '- ' * DEPTH + 'a')
+        for x in CODE:
+            with self.subTest(x=x[:8]):
+                tokens = list(lexer.tokenize_buffer(x))
+                result = parser.parse_expr(tokens, 0)
+                self.assertIsNotNone(result)
+                self.assertEqual(result[1], len(tokens))
+
+    def test_block_items(self):
+        c_code = ('int main(void) { int a = 1; a = a + 1; lbl: a; int b;'
+                  ' { int a; } ; goto lbl; }')
+        tokens = list(lexer.tokenize_buffer(c_code))
+        result = parser.parse_program(tokens, 0)
+        self.assertIsNotNone(result)
+        items = result.function_definition.body.block_items
+        A = parser.Var(parser.Identifier('a'))
+        self.assertEqual(items[0],
+                         parser.D(parser.DeclareNode(parser.Identifier('a'),
+                                                     parser.Constant('1'))))
+        self.assertIsInstance(items[1].statement.exp, parser.Assignment)
+        self.assertEqual(items[2], parser.S(parser.Label(
+            parser.Identifier('lbl'), parser.ExpNode(A))))
+        self.assertIsInstance(items[3], parser.D)
+        self.assertIsInstance(items[4].statement, parser.Compound)
+        self.assertIsInstance(items[5].statement, parser.Null)
+        self.assertIsInstance(items[6].statement, parser.Goto)
+
+    def test_block_errors(self):
+        for c_code in ('int main(void) { int a = 1;',
+                       'int main(void) { int 1; }',
+                       'int main(void) { a + ; }'):
+            with self.subTest(c_code=c_code):
+                tokens = list(lexer.tokenize_buffer(c_code))
+                self.assertIsNone(parser.parse_program(tokens, 0))
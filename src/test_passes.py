@@ -0,0 +1,235 @@
+import contextlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import asm
+import compiler
+import driver
+import optimize
+import passes
+import tacky
+from compiler import CompileOptions
+from passes import Pass, PassManager
+
+SOURCE = ('int main(void) { int a = 3; int b = a; if (a) goto x;'
+          ' return 1; a = 2; x: return b; }')
+
+
+class TestSchedule(unittest.TestCase):
+
+    def test_levels(self):
+        self.assertEqual(passes.schedule(passes.TACKY_PASSES, 0), [])
+        names = [p.name for p in passes.schedule(passes.TACKY_PASSES, 1)]
+        self.assertEqual(names, ['constant_folding', 'unreachable',
+                                 'jumps_to_next', 'dead_stores'])
+
+    def test_disabling_a_requirement(self):
+        scheduled = passes.schedule(passes.TACKY_PASSES, 2,
+                                    frozenset({'unreachable'}))
+        self.assertEqual([p.name for p in scheduled],
+                         ['constant_folding', 'dead_stores'])
+
+    def test_requirements_come_first(self):
+        for pipeline in (passes.TACKY_PASSES, passes.ASM_PASSES):
+            seen: set[str] = set()
+            for p in pipeline:
+                self.assertTrue(seen.issuperset(p.requires), p.name)
+                seen.add(p.name)
+
+    def test_unknown_names(self):
+        with self.assertRaises(ValueError):
+            PassManager(1, disabled=frozenset({'nope'}))
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                driver.parse_args(driver.arg_parser(),
+                                  ['--print-after', 'nope', 'a.c'])
+
+    def test_print_after_idle_pass(self):
+        for argv in (['--print-after', 'unreachable'],
+                     ['-O1', '--disable-pass', 'unreachable',
+                      '--print-after', 'jumps_to_next']):
+            stderr = io.StringIO()
+            with self.subTest(argv=argv), contextlib.redirect_stderr(stderr):
+                with self.assertRaises(SystemExit):
+                    driver.parse_args(driver.arg_parser(), argv + ['a.c'])
+                self.assertIn('not run at', stderr.getvalue())
+        args = driver.parse_args(driver.arg_parser(),
+                                 ['-O1', '--print-after', 'store_load', 'a.c'])
+        self.assertEqual(args.print_after, ['store_load'])
+
+
+class TestFixedPoint(unittest.TestCase):
+
+    def test_repeats_until_unchanged(self):
+        runs = []
+
+        def shrink(instructions):
+            runs.append(len(instructions))
+            if len(instructions) > 2:
+                instructions.pop()
+                return True
+            return False
+        manager = PassManager(2)
+        manager.run([Pass('shrink', shrink)], [1, 2, 3, 4, 5], str)
+        self.assertEqual(runs, [5, 4, 3, 2])
+
+    def test_once_below_two(self):
+        runs = []
+
+        def changes(instructions):
+            runs.append(1)
+            return True
+        PassManager(1).run([Pass('changes', changes)], [], str)
+        self.assertEqual(runs, [1])
+
+    def test_print_after(self):
+        output = io.StringIO()
+        manager = PassManager(1, print_after=frozenset({'unreachable'}),
+                              output=output)
+        function = tacky.Function('main', [tacky.Return(tacky.Constant(0)),
+                                           tacky.Return(tacky.Constant(1))])
+        manager.run_tacky(function)
+        self.assertEqual(output.getvalue().splitlines(),
+                         ['*** after unreachable ***',
+                          '\tReturn(val=Constant(x=0))'])
+
+
+class TestOptimizations(unittest.TestCase):
+
+    def test_unreachable(self):
+        body = [tacky.Jump('x'), tacky.Return(tacky.Constant(1)),
+                tacky.Label('y'), tacky.Return(tacky.Constant(3)),
+                tacky.Label('x'), tacky.Return(tacky.Constant(2)),
+                tacky.Return(tacky.Constant(0))]
+        self.assertTrue(optimize.remove_unreachable(body))
+        self.assertEqual(body, [tacky.Jump('x'), tacky.Label('x'),
+                                tacky.Return(tacky.Constant(2))])
+        self.assertFalse(optimize.remove_unreachable(body))
+
+    def test_jumps_to_next(self):
+        body = [tacky.JumpIfZero(tacky.Var('a'), 'x'), tacky.Label('x'),
+                tacky.Jump('y'), tacky.Label('x')]
+        self.assertTrue(optimize.remove_jumps_to_next(body))
+        self.assertEqual(body, [tacky.Label('x'), tacky.Jump('y'),
+                                tacky.Label('x')])
+
+    def test_store_load(self):
+        r10 = asm.Register(asm.Register_Enum.R10)
+        slot = asm.Stack(4)
+        body = [asm.Mov(asm.Size.L, r10, slot),
+                asm.Mov(asm.Size.L, slot, r10),
+                asm.Mov(asm.Size.L, slot, asm.Register(asm.Register_Enum.AX))]
+        self.assertTrue(optimize.remove_store_load(body))
+        self.assertEqual(len(body), 2)
+
+    def test_removes_dead_code(self):
+        unoptimized = compiler.compile_source(SOURCE)
+        self.assertIn('$2,', unoptimized)
+        for level in (1, 2):
+            optimized = compiler.compile_source(
+                SOURCE, CompileOptions(opt_level=level))
+            self.assertLess(optimized.count('\n'), unoptimized.count('\n'))
+            self.assertNotIn('$1, %eax', optimized)
+            self.assertNotIn('$2,', optimized)
+
+
+class TestConstantFolding(unittest.TestCase):
+
+    def fold(self, operator: tacky.Bin_Op, a: int, b: int) -> int | None:
+        return optimize.fold_binary(operator, a, b)
+
+    def test_wraps_to_32_bits(self):
+        int_max, int_min = 2 ** 31 - 1, -2 ** 31
+        self.assertEqual(self.fold(tacky.Bin_Op.ADD, int_max, 1), int_min)
+        self.assertEqual(self.fold(tacky.Bin_Op.MULTIPLY, 65536, 65536), 0)
+        self.assertEqual(self.fold(tacky.Bin_Op.LEFT_SHIFT, 1, 31), int_min)
+        self.assertEqual(optimize.fold_unary(tacky.Unary_Operator.NEGATION,
+                                             int_min), int_min)
+
+    def test_c_semantics(self):
+        self.assertEqual(self.fold(tacky.Bin_Op.DIVIDE, -7, 2), -3)
+        self.assertEqual(self.fold(tacky.Bin_Op.REMAINDER, -7, 2), -1)
+        self.assertEqual(self.fold(tacky.Bin_Op.RIGHT_SHIFT, -8, 1), -4)
+        self.assertEqual(self.fold(tacky.Bin_Op.LESS_EQUAL, 3, 3), 1)
+
+    def test_undefined_is_left_alone(self):
+        for operator, a, b in ((tacky.Bin_Op.DIVIDE, 1, 0),
+                               (tacky.Bin_Op.REMAINDER, -2 ** 31, -1),
+                               (tacky.Bin_Op.LEFT_SHIFT, 1, 32),
+                               (tacky.Bin_Op.RIGHT_SHIFT, 1, -1)):
+            self.assertIsNone(self.fold(operator, a, b))
+
+    def test_propagates_within_a_block(self):
+        a, b, c = tacky.Var('a'), tacky.Var('b'), tacky.Var('c')
+        body = [tacky.Copy(tacky.Constant(6), a),
+                tacky.Binary(tacky.Bin_Op.ADD, a, tacky.Constant(4), b),
+                tacky.JumpIfZero(b, 'x'),
+                tacky.Label('x'),
+                tacky.Return(a),
+                tacky.Binary(tacky.Bin_Op.DIVIDE, tacky.Constant(1),
+                             tacky.Constant(0), c)]
+        self.assertTrue(optimize.fold_constants(body))
+        self.assertEqual(body[:4], [tacky.Copy(tacky.Constant(6), a),
+                                    tacky.Copy(tacky.Constant(10), b),
+                                    tacky.Label('x'),
+                                    tacky.Return(a)])
+        self.assertIsInstance(body[4], tacky.Binary)
+        self.assertFalse(optimize.fold_constants(body))
+
+    def test_folds_jumps(self):
+        body = [tacky.JumpIfNotZero(tacky.Constant(2), 'x'),
+                tacky.JumpIfNotZero(tacky.Constant(0), 'y')]
+        optimize.fold_constants(body)
+        self.assertEqual(body, [tacky.Jump('x')])
+
+    def test_dead_stores(self):
+        a, b = tacky.Var('a'), tacky.Var('b')
+        body = [tacky.Copy(tacky.Constant(1), a),
+                tacky.Copy(tacky.Constant(2), b),
+                tacky.Binary(tacky.Bin_Op.DIVIDE, b, b, a),
+                tacky.Return(b)]
+        self.assertTrue(optimize.remove_dead_stores(body))
+        self.assertEqual(body, [tacky.Copy(tacky.Constant(2), b),
+                                tacky.Binary(tacky.Bin_Op.DIVIDE, b, b, a),
+                                tacky.Return(b)])
+
+    def test_whole_expression(self):
+        assembly = compiler.compile_source(
+            'int main(void) { return 2 * 3 + 4; }',
+            CompileOptions(opt_level=1))
+        self.assertIn('\tmovl $10, %eax\n', assembly)
+        self.assertNotIn('imul', assembly)
+
+    def test_wraps_literals(self):
+        self.assertEqual(self.fold(tacky.Bin_Op.EQUAL, 2 ** 32 - 1, -1), 1)
+        self.assertEqual(self.fold(tacky.Bin_Op.GREATER_THAN, 2 ** 31, 0),
+                         0)
+        body = [tacky.JumpIfZero(tacky.Constant(2 ** 32), 'x')]
+        optimize.fold_constants(body)
+        self.assertEqual(body, [tacky.Jump('x')])
+
+    @unittest.skipUnless(shutil.which('gcc'), 'gcc is not installed')
+    def test_out_of_range_literals_agree(self):
+        sources = ('int main(void) { int a = 4294967295; return a == -1; }',
+                   'int main(void) { return 2147483648 > 0; }')
+        with tempfile.TemporaryDirectory() as directory:
+            asm_file = os.path.join(directory, 'main.s')
+            binary = os.path.join(directory, 'main')
+            for source in sources:
+                statuses = []
+                for level in (0, 1):
+                    with open(asm_file, 'w') as output:
+                        output.write(compiler.compile_source(
+                            source, CompileOptions(opt_level=level)))
+                    subprocess.run(['gcc', '-o', binary, asm_file],
+                                   check=True)
+                    statuses.append(subprocess.run([binary]).returncode)
+                self.assertEqual(statuses[0], statuses[1], source)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+
+import lexer
+import preprocessor
+from preprocessor import PreprocessorError, preprocess_string
+
+
+def tokens(text: str) -> list:
+    return list(lexer.tokenize_buffer(text))
+
+
+class TestPreprocessor(unittest.TestCase):
+
+    def assertSameTokens(self, source: str, expected: str, **kwargs):
+        self.assertEqual(tokens(preprocess_string(source, **kwargs)),
+                         tokens(expected))
+
+    def test_object_macros(self):
+        self.assertSameTokens('#define N 10\n#define M N + N\nreturn M;',
+                              'return 10 + 10;')
+
+    def test_function_macros(self):
+        source = ('#define SQ(x) ((x) * (x))\n'
+                  '#define MAX(a, b) ((a) > (b) ? (a) : (b))\n'
+                  'return MAX(SQ(2), (3, 4));')
+        self.assertSameTokens(
+            source, 'return ((((2) * (2))) > ((3, 4)) ? '
+            '(((2) * (2))) : ((3, 4)));')
+
+    def test_function_macro_without_call(self):
+        self.assertSameTokens('#define F(x) x\nint F; F(1);', 'int F; 1;')
+
+    def test_arguments_span_lines(self):
+        self.assertSameTokens('#define ADD(a, b) a + b\nADD(1,\n2);',
+                              '1 + 2;')
+
+    def test_no_recursive_expansion(self):
+        self.assertSameTokens('#define a a + b\n#define b a\na;',
+                              'a + a;')
+
+    def test_rescan_with_following_tokens(self):
+        self.assertSameTokens('#define ID(x) x\n#define G ID\nG(3);', '3;')
+
+    def test_expansion_keeps_tokens_apart(self):
+        self.assertSameTokens('#define N -1\nreturn -N;', 'return - -1;')
+
+    def test_paste(self):
+        self.assertSameTokens('#define CAT(a, b) a ## b\nint CAT(x, 1);',
+                              'int x1;')
+
+    def test_conditionals(self):
+        source = ('#define A 2\n'
+                  '#if A > 1 && defined(A)\none\n'
+                  '#elif 1\ntwo\n'
+                  '#else\nthree\n#endif\n'
+                  '#ifdef B\nfour\n#endif\n'
+                  '#ifndef B\nfive\n#endif\n'
+                  '#if 0\n#if 1\nsix\n#endif\n#error skipped\n#else\n'
+                  'seven\n#endif\n'
+                  '#if -7 / 2 == -3 && UNDEFINED == 0\neight\n#endif')
+        self.assertSameTokens(source, 'one five seven eight')
+
+    def test_line_splicing_and_comments(self):
+        source = ('#define LONG 1 + \\\n 2\n'
+                  'int a = LONG; /* a block\n comment */ int b; // x\n')
+        self.assertSameTokens(source, 'int a = 1 + 2; int b;')
+
+    def test_defines(self):
+        self.assertSameTokens('return N + M;', 'return 3 + 1;',
+                              defines=['N=3', 'M'])
+
+    def test_empty_define(self):
+        self.assertSameTokens('return FOO 1;', 'return 1;',
+                              defines=['FOO='])
+
+    def test_include(self):
+        with tempfile.TemporaryDirectory() as directory:
+            include = os.path.join(directory, 'include')
+            os.mkdir(include)
+            with open(os.path.join(include, 'value.h'), 'w') as f:
+                f.write('#ifndef VALUE_H\n#define VALUE_H\n'
+                        '#define VALUE 4\n#endif\n')
+            with open(os.path.join(directory, 'local.h'), 'w') as f:
+                f.write('#include <value.h>\nint local = VALUE;\n')
+            main = os.path.join(directory, 'main.c')
+            with open(main, 'w') as f:
+                f.write('#include "local.h"\n#include <value.h>\n'
+                        'return VALUE;\n')
+            text = ''.join(preprocessor.preprocess_file(main, [include]))
+            self.assertEqual(tokens(text),
+                             tokens('int local = 4; return 4;'))
+            with self.assertRaises(PreprocessorError):
+                ''.join(preprocessor.preprocess_file(main))
+
+    def test_errors(self):
+        for source in ('#if 1\n', '#endif\n', '#error stop\n', '#bogus\n',
+                       '#define F(a) a\nF(1, 2)\n', '#if 1 +\n#endif\n'):
+            with self.assertRaises(PreprocessorError):
+                preprocess_string(source)
+
+    def test_error_location(self):
+        with self.assertRaisesRegex(PreprocessorError, '<input>:3:'):
+            preprocess_string('\n\n#error here\n')
+
+    def test_lexer_error_location(self):
+        with self.assertRaisesRegex(PreprocessorError, '<input>:2: '):
+            preprocess_string('int a;\n#if 1 @ 2\n#endif\n')
+
+    def test_many_expansions(self):
+        source = '#define F(x) x + 1\n#define A F(2)\n' + 'A ' * 20000
+        expanded = preprocess_string(source)
+        self.assertEqual(expanded.count('2 + 1'), 20000)
+
+    def test_streams_lines(self):
+        lines = iter(['int a;\n', '#error late\n'])
+        output = preprocessor.Preprocessor().preprocess_lines(lines)
+        self.assertEqual(next(output), 'int a;\n')
+        with self.assertRaises(PreprocessorError):
+            next(output)
+
+
+if __name__ == '__main__':
+    unittest.main()
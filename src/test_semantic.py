@@ -0,0 +1,97 @@
+import parser
+import unittest
+
+import lexer
+from semantic import semantic
+from utility import NameContext, name_context
+
+
+def parse(c_code: str) -> parser.Program:
+    return parser.parse_program(list(lexer.tokenize_buffer(c_code)), 0)
+
+
+class TestResolve(unittest.TestCase):
+
+    def test_renames_variables(self):
+        program = parse('int main(void) { int a = 1; { int a = 2; a = 3; }'
+                        ' return a; }')
+        resolved = semantic.resolve_program(program)
+        items = resolved.function_definition.body.block_items
+        outer = items[0].declaration.name
+        inner_items = items[1].statement.block.block_items
+        inner = inner_items[0].declaration.name
+        self.assertNotEqual(outer, inner)
+        self.assertEqual(inner_items[1].statement.exp.left.identifier, inner)
+        self.assertEqual(items[2].statement.exp.identifier, outer)
+
+    def test_shares_unchanged_subtrees(self):
+        program = parse('int main(void) { int a = 1 + 2 * 3;'
+                        ' return (4 - 5) + a; }')
+        items = program.function_definition.body.block_items
+        resolved = semantic.resolve_program(program)
+        new_items = resolved.function_definition.body.block_items
+        self.assertIs(new_items[0].declaration.exp, items[0].declaration.exp)
+        self.assertIs(new_items[1].statement.exp.left,
+                      items[1].statement.exp.left)
+
+    def test_shares_var_nodes(self):
+        program = parse('int main(void) { int a = 1; a = a + a; return a; }')
+        resolved = semantic.resolve_program(program)
+        items = resolved.function_definition.body.block_items
+        assign = items[1].statement.exp
+        self.assertIs(assign.left, assign.right.left)
+        self.assertIs(assign.left, items[2].statement.exp)
+
+    def test_unchanged_program_is_reused(self):
+        program = parse('int main(void) { return 1 + 2; goto x; x: ; }')
+        self.assertIs(semantic.resolve_program(program), program)
+
+    def test_in_place(self):
+        c_code = 'int main(void) { int a = 1; { int b = a; } return a; }'
+        program = parse(c_code)
+        block = program.function_definition.body
+        # Each resolve counts names from zero, so both pick the same ones
+        with name_context(NameContext()):
+            copied = semantic.resolve_program(parse(c_code))
+        with name_context(NameContext()):
+            resolved = semantic.resolve_program(program, in_place=True)
+        self.assertIs(resolved.function_definition.body.block_items,
+                      block.block_items)
+        self.assertEqual(resolved, copied)
+
+    def test_errors(self):
+        for c_code in ('int main(void) { int a; int a; }',
+                       'int main(void) { return b; }',
+                       'int main(void) { 1 = 2; }',
+                       'int main(void) { { int a; } return a; }'):
+            with self.subTest(c_code=c_code):
+                with self.assertRaises(RuntimeError):
+                    semantic.resolve_program(parse(c_code))
+
+
+class TestVariableMap(unittest.TestCase):
+
+    def test_shadowing(self):
+        v = semantic.VariableMap()
+        a = parser.Identifier('a')
+        v.register(a, parser.Identifier('a.0'))
+        v.push()
+        self.assertFalse(v.check_in_scope(a))
+        v.register(a, parser.Identifier('a.1'))
+        self.assertTrue(v.check_in_scope(a))
+        self.assertEqual(v.lookup(a), 'a.1')
+        v.push()
+        self.assertEqual(v.lookup(a), 'a.1')
+        v.pop()
+        v.pop()
+        self.assertEqual(v.lookup(a), 'a.0')
+        self.assertEqual(v.lookup_var(a), parser.Var('a.0'))
+
+    def test_pop_removes_names(self):
+        v = semantic.VariableMap()
+        v.push()
+        v.register(parser.Identifier('b'), parser.Identifier('b.0'))
+        v.pop()
+        self.assertIsNone(v.lookup(parser.Identifier('b')))
+        self.assertIsNone(v.lookup_var(parser.Identifier('b')))
+        self.assertEqual(v.table, {})
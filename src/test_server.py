@@ -0,0 +1,162 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import unittest
+import unittest.mock
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import client
+import server
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.socket_path = os.path.join(self.directory, 'server.sock')
+        for name, source in (('good.c', 'int main(void) { return 1; }'),
+                             ('bad.c', 'int main(void) { return b; }')):
+            with open(os.path.join(self.directory, name), 'w') as f:
+                f.write(source)
+
+    def start(self, pool: Executor) -> None:
+        compile_server = server.CompileServer(self.socket_path, pool)
+        thread = threading.Thread(target=compile_server.serve_forever)
+        thread.start()
+
+        def stop():
+            compile_server.shutdown()
+            thread.join()
+            compile_server.server_close()
+            pool.shutdown()
+        self.addCleanup(stop)
+
+    def request(self, *argv: str) -> dict:
+        return client.request(list(argv), self.socket_path, self.directory)
+
+    def test_compiles(self):
+        self.start(ThreadPoolExecutor(2))
+        response = self.request('--codegen', 'good.c')
+        self.assertEqual(response, {'status': 0, 'stdout': '', 'stderr': ''})
+
+    def test_errors_per_file(self):
+        self.start(ThreadPoolExecutor(2))
+        response = self.request('--validate', 'bad.c', 'good.c',
+                                'missing.c')
+        self.assertEqual(response['status'], 1)
+        self.assertEqual(response['stderr'].splitlines(),
+                         ['bad.c: Id b is not in scope',
+                          'missing.c: File not found'])
+
+    def test_usage(self):
+        self.start(ThreadPoolExecutor(1))
+        response = self.request('--lex')
+        self.assertEqual(response['status'], 2)
+        self.assertIn('error:', response['stderr'])
+        response = self.request('--help')
+        self.assertEqual(response['status'], 0)
+        self.assertIn('--save-asm', response['stdout'])
+
+    def test_concurrent_requests(self):
+        self.start(ThreadPoolExecutor(2))
+        responses: list[dict] = []
+
+        def work():
+            for _ in range(5):
+                responses.append(self.request('--codegen', 'good.c',
+                                              'bad.c'))
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(responses), 20)
+        self.assertTrue(all(r == responses[0] for r in responses))
+        self.assertEqual(responses[0]['status'], 1)
+
+    def test_process_pool(self):
+        self.start(server.worker_pool(2))
+        response = self.request('--codegen', 'good.c', 'bad.c')
+        self.assertEqual(response['stderr'], 'bad.c: Id b is not in scope\n')
+
+    def test_print_after_reaches_client(self):
+        self.start(server.worker_pool(1))
+        response = self.request('-O1', '--print-after', 'unreachable',
+                                '--codegen', 'good.c')
+        self.assertEqual(response['status'], 0)
+        self.assertTrue(response['stderr'].startswith(
+            '*** after unreachable ***\n'))
+
+    def test_workers_start_with_stages_imported(self):
+        with server.worker_pool(1) as pool:
+            # Checked before the worker has run any compile
+            missing = pool.submit(
+                eval, f'set({server.STAGES}) - '
+                "set(__import__('sys').modules)").result()
+        self.assertEqual(missing, set())
+
+    def test_refuses_second_server(self):
+        self.start(ThreadPoolExecutor(1))
+        with self.assertRaises(RuntimeError):
+            server.CompileServer(self.socket_path, ThreadPoolExecutor(1))
+
+    def test_client_falls_back_without_server(self):
+        stderr = io.StringIO()
+        with contextlib.chdir(self.directory), \
+                contextlib.redirect_stderr(stderr):
+            status = client.main(['--validate', 'bad.c'], self.socket_path)
+        self.assertEqual(status, 1)
+        self.assertEqual(stderr.getvalue(), 'bad.c: Id b is not in scope\n')
+
+    def test_refuses_shared_directory(self):
+        os.chmod(self.directory, 0o777)
+        self.addCleanup(os.chmod, self.directory, 0o700)
+        with self.assertRaises(RuntimeError):
+            server.CompileServer(self.socket_path, ThreadPoolExecutor(1))
+
+    def test_client_ignores_shared_directory(self):
+        self.start(ThreadPoolExecutor(1))
+        os.chmod(self.directory, 0o777)
+        self.addCleanup(os.chmod, self.directory, 0o700)
+        stderr = io.StringIO()
+        with contextlib.chdir(self.directory), \
+                contextlib.redirect_stderr(stderr):
+            status = client.main(['--validate', 'bad.c'], self.socket_path)
+        self.assertEqual(status, 1)
+        self.assertIn('writable by other users', stderr.getvalue())
+        self.assertTrue(stderr.getvalue().endswith(
+            'bad.c: Id b is not in scope\n'))
+
+    def test_creates_private_directory(self):
+        socket_path = os.path.join(self.directory, 'run', 'server.sock')
+        compile_server = server.CompileServer(socket_path,
+                                              ThreadPoolExecutor(1))
+        self.addCleanup(compile_server.pool.shutdown)
+        self.addCleanup(compile_server.server_close)
+        self.assertTrue(client.private_directory(
+            os.path.dirname(socket_path)))
+
+
+class TestSocketPath(unittest.TestCase):
+
+    def test_runtime_directory(self):
+        environ = {'XDG_RUNTIME_DIR': '/run/user/1000'}
+        with unittest.mock.patch.dict(os.environ, environ):
+            os.environ.pop(client.SOCKET_ENV, None)
+            self.assertEqual(client.default_socket_path(),
+                             '/run/user/1000/strange-cc/server.sock')
+
+    def test_not_directly_in_tmp(self):
+        with unittest.mock.patch.dict(os.environ):
+            for name in (client.SOCKET_ENV, 'XDG_RUNTIME_DIR', 'TMPDIR'):
+                os.environ.pop(name, None)
+            self.assertEqual(client.default_socket_path(),
+                             f'/tmp/strange-cc-{os.getuid()}/server.sock')
+
+
+if __name__ == '__main__':
+    unittest.main()
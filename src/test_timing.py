@@ -0,0 +1,46 @@
+import unittest
+
+import lexer
+import parser
+import timing
+from timing import PassTimer
+
+
+class TestPassTimer(unittest.TestCase):
+
+    def test_nesting_and_totals(self):
+        timer = PassTimer()
+        with timer.time('outer') as record:
+            record.counts['items'] = 3
+            with timer.time('inner'):
+                pass
+        with timer.time('second'):
+            pass
+        report = timer.as_dict()
+        self.assertEqual([(p['name'], p['depth']) for p in report['passes']],
+                         [('outer', 0), ('inner', 1), ('second', 0)])
+        outer, inner, second = report['passes']
+        self.assertGreaterEqual(outer['wall'], inner['wall'])
+        self.assertAlmostEqual(report['total']['wall'],
+                               outer['wall'] + second['wall'])
+        lines = timer.report().splitlines()
+        self.assertTrue(lines[1].startswith('outer'))
+        self.assertTrue(lines[1].endswith('items=3'))
+        self.assertTrue(lines[2].startswith('  inner'))
+        self.assertTrue(lines[-1].startswith('total'))
+
+    def test_timed_without_timer(self):
+        with timing.timed(None, 'pass') as record:
+            self.assertIsNone(record)
+
+    def test_count_nodes(self):
+        tokens = list(lexer.tokenize_buffer(
+            'int main(void) { int a = 1; return a + 2; }'))
+        program = parser.parse_program(tokens, 0)
+        # Program, Function, Block, D, DeclareNode, Constant,
+        # S, Return, Binary, Var, Constant
+        self.assertEqual(timing.count_nodes(program), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""Wall and CPU time with item counts for each compiler pass"""
+from contextlib import contextmanager
+from enum import Enum
+from time import perf_counter, process_time
+from typing import Iterator
+
+
+class PassRecord:
+    # A plain class, the driver imports this module on every run
+    # and dataclasses are left off the startup path
+    __slots__ = ('name', 'depth', 'wall', 'cpu', 'counts')
+
+    def __init__(self, name: str, depth: int) -> None:
+        self.name = name
+        # Sub-passes sit one level below the pass that runs them
+        self.depth = depth
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.counts: dict[str, int] = {}
+
+
+class PassTimer:
+    """Collects one record per pass in the order the passes ran"""
+
+    def __init__(self) -> None:
+        self.records: list[PassRecord] = []
+        self.depth = 0
+
+    @contextmanager
+    def time(self, name: str) -> Iterator[PassRecord]:
+        record = PassRecord(name, self.depth)
+        self.records.append(record)
+        self.depth += 1
+        wall, cpu = perf_counter(), process_time()
+        try:
+            yield record
+        finally:
+            record.wall = perf_counter() - wall
+            record.cpu = process_time() - cpu
+            self.depth -= 1
+
+    def totals(self) -> tuple[float, float]:
+        top = [r for r in self.records if r.depth == 0]
+        return sum(r.wall for r in top), sum(r.cpu for r in top)
+
+    def as_dict(self) -> dict:
+        wall, cpu = self.totals()
+        return {'passes': [{'name': r.name,
+                            'depth': r.depth,
+                            'wall': r.wall,
+                            'cpu': r.cpu,
+                            'counts': r.counts} for r in self.records],
+                'total': {'wall': wall, 'cpu': cpu}}
+
+    def report(self) -> str:
+        return format_report(self.as_dict())
+
+
+def format_report(report: dict) -> str:
+    """Lays out the result of PassTimer.as_dict as a table"""
+    lines = [f'{"pass":<24} {"wall ms":>10} {"cpu ms":>10}  counts']
+    for r in report['passes']:
+        name = '  ' * r['depth'] + r['name']
+        counts = ' '.join(f'{k}={v}' for k, v in r['counts'].items())
+        lines.append(f'{name:<24} {r["wall"] * 1e3:10.3f} '
+                     f'{r["cpu"] * 1e3:10.3f}  {counts}'.rstrip())
+    total = report['total']
+    lines.append(f'{"total":<24} {total["wall"] * 1e3:10.3f} '
+                 f'{total["cpu"] * 1e3:10.3f}')
+    return '\n'.join(lines)
+
+
+@contextmanager
+def timed(timer: PassTimer | None,
+          name: str) -> Iterator[PassRecord | None]:
+    """Times a pass when timing is on, otherwise yields None"""
+    if timer is None:
+        yield None
+        return
+    with timer.time(name) as record:
+        yield record
+
+
+def count_nodes(node: object) -> int:
+    """Counts the dataclass nodes in a tree without recursing"""
+    total = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        match node:
+            case list() | tuple():
+                stack.extend(node)
+            case str() | int() | Enum() | None:
+                pass
+            case _ if hasattr(node, '__dataclass_fields__'):
+                total += 1
+                stack.extend(getattr(node, name)
+                             for name in node.__dataclass_fields__)
+    return total
@@ -1,13 +1,40 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 from itertools import count
-from typing import NewType
+from typing import Iterator, NewType
 
 Identifier = NewType('Identifier', str)
 
-# Nasty Global for use below
-counter = count()
+
+class NameContext:
+    """Fresh name generation for one compilation.
+       Each context counts from zero, so the same input always gets
+       the same names no matter what ran before it in the process
+    """
+
+    def __init__(self) -> None:
+        self.counter = count()
+
+    def make_temporary(self, prefix='tmp') -> Identifier:
+        return Identifier(f'{prefix}.{next(self.counter)}')
+
+
+# The context used by make_temporary. Every thread and asyncio task sees
+# its own value, so concurrent compilations never share a counter
+current_names: ContextVar[NameContext] = ContextVar('current_names',
+                                                    default=NameContext())
+
+
+@contextmanager
+def name_context(names: NameContext) -> Iterator[NameContext]:
+    token = current_names.set(names)
+    try:
+        yield names
+    finally:
+        current_names.reset(token)
 
 
 def make_temporary(prefix='tmp') -> Identifier:
     # this is supposed to generate an identifier to be
-    # unquie. In practice, it probably isn't
-    return Identifier(f'{prefix}.{next(counter)}')
+    # unquie within the current compilation
+    return current_names.get().make_temporary(prefix)